@@ -0,0 +1,190 @@
+"""
+Response compression
+按请求头 Accept-Encoding 协商 brotli / gzip，压缩超过阈值的文本类响应（JSON、文本）；
+未安装 brotli 包时只使用 gzip。流式响应逐块压缩，不缓冲整个响应体
+"""
+import zlib
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 压缩这些类型（及 +json / +xml 后缀）；图片、文档包等二进制内容本身已压缩或不值得压缩
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+)
+# 逐块推送的响应：压缩器缓冲会破坏实时性
+STREAMING_TYPES = ("text/event-stream",)
+# 超过该字节数的数据块在线程池中压缩，不阻塞事件循环
+THREADPOOL_MIN_SIZE = 256 * 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    选择响应编码
+
+    Args:
+        accept_encoding: 请求头 Accept-Encoding
+
+    Returns:
+        "br" | "gzip"，客户端不接受时返回 None
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+
+    def weight(encoding: str) -> float:
+        return accepted.get(encoding, accepted.get("*", 0.0))
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = max(candidates, key=weight)
+    return best if weight(best) > 0 else None
+
+
+class _Compressor:
+    """gzip / brotli 流式压缩器的统一接口"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31：gzip 格式
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """输出已缓冲的数据（流式响应每块之后调用）"""
+        if self._brotli is not None:
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+    def _chunk(self, data: bytes, last: bool) -> bytes:
+        return self.compress(data) + (self.finish() if last else self.flush())
+
+    async def chunk(self, data: bytes, last: bool) -> bytes:
+        """压缩一块响应体；last 为 True 时结束压缩流"""
+        if len(data) >= THREADPOOL_MIN_SIZE:
+            return await run_in_threadpool(self._chunk, data, last)
+        return self._chunk(data, last)
+
+
+class CompressionMiddleware:
+    """ASGI 响应压缩中间件"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 1,
+        brotli_quality: int = 4
+    ):
+        """
+        Args:
+            minimum_size: 小于该字节数的响应不压缩
+            gzip_level: gzip 压缩级别 1-9（动态响应取 1：压缩率接近 6，耗时约为其 1/6）
+            brotli_quality: brotli 压缩质量 0-11（动态响应取 4-5 兼顾速度与压缩率）
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """单个响应的压缩状态：推迟发送响应头，直到看到第一块响应体再决定是否压缩"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers or self.start_message["status"] < 200:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type.startswith(STREAMING_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(("+json", "+xml"))
+
+    async def send(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body":
+            await self._send(message)
+            return
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            # 内层中间件会把响应体分块转发，优先按 Content-Length 判断大小
+            content_length = headers.get("content-length")
+            size = int(content_length) if content_length is not None else (None if more_body else len(body))
+            if not self._compressible(headers) or (size is not None and size < self.middleware.minimum_size):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            body = await self.compressor.chunk(body, last=not more_body)
+            headers["Content-Encoding"] = self.encoding
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        body = await self.compressor.chunk(body, last=not more_body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
@@ -20,19 +20,175 @@ MINIMAX_BASE_URL = os.getenv("MINIMAX_BASE_URL", "https://api.minimax.chat/v1")
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
 DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 
+# LLM 请求：超时秒数、429/5xx 最大重试次数、退避基数/上限（秒）、准入排队最长等待（秒）
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+# 每个提供商的准入限制：最大并发、每分钟请求数、每分钟令牌数（0 表示不限）
+PROVIDER_LIMITS = {
+    "deepseek": {
+        "max_in_flight": int(os.getenv("DEEPSEEK_MAX_IN_FLIGHT", "8")),
+        "rpm": int(os.getenv("DEEPSEEK_RPM", "0")),
+        "tpm": int(os.getenv("DEEPSEEK_TPM", "0")),
+    },
+    "minimax": {
+        "max_in_flight": int(os.getenv("MINIMAX_MAX_IN_FLIGHT", "8")),
+        "rpm": int(os.getenv("MINIMAX_RPM", "0")),
+        "tpm": int(os.getenv("MINIMAX_TPM", "0")),
+    },
+}
+
+# 熔断器：连续失败次数阈值、慢调用阈值（秒，超过按失败计）、熔断持续秒数、半开探测请求数
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "45"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+# "both" 模式的路由：滚动窗口（样本数 / 秒）、判定不健康的错误率、问答对冲请求
+ROUTING_WINDOW_SIZE = int(os.getenv("ROUTING_WINDOW_SIZE", "50"))
+ROUTING_WINDOW_SECONDS = float(os.getenv("ROUTING_WINDOW_SECONDS", "300"))
+ROUTING_MAX_ERROR_RATE = float(os.getenv("ROUTING_MAX_ERROR_RATE", "0.5"))
+ROUTING_HEDGE_QA = os.getenv("ROUTING_HEDGE_QA", "false").lower() == "true"
+ROUTING_HEDGE_MIN_DELAY_MS = int(os.getenv("ROUTING_HEDGE_MIN_DELAY_MS", "500"))
+
+# 启动后在后台预热的提供商（逗号分隔），默认只预热 AI_PROVIDER
+PROVIDER_WARMUP = [p.strip() for p in os.getenv("PROVIDER_WARMUP", AI_PROVIDER).split(",") if p.strip()]
+# 按租户（请求头 X-Tenant-ID）指定提供商，如 "school-a=minimax,school-b=deepseek"
+TENANT_PROVIDERS = {
+    tenant.strip(): provider.strip()
+    for tenant, _, provider in (item.partition("=") for item in os.getenv("TENANT_PROVIDERS", "").split(","))
+    if tenant.strip() and provider.strip()
+}
+
 # Mock 模式（API 不可用时使用测试数据）
 MOCK_MODE = os.getenv("MOCK_MODE", "false").lower() == "true"
 
 # ==================== 服务器配置 ====================
+# 启动后在后台预热（加载嵌入模型、打开向量库、初始化提供商），/ready 报告进度；关闭则首次使用时初始化
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# 预热时预先建立到提供商的连接
+WARMUP_PRECONNECT = os.getenv("WARMUP_PRECONNECT", "true").lower() == "true"
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 
+# ==================== 端点准入配置 ====================
+# 每个端点组的最大同时执行数与最大排队数（0 表示不限 / 不排队），按 worker 进程计；
+# 队列已满返回 429，排队超过 ADMISSION_QUEUE_TIMEOUT 秒返回 503
+ADMISSION_LIMITS = {
+    "upload": {
+        "max_concurrent": int(os.getenv("UPLOAD_MAX_CONCURRENT", "4")),
+        "max_queue": int(os.getenv("UPLOAD_MAX_QUEUE", "16")),
+    },
+    "extract": {
+        "max_concurrent": int(os.getenv("EXTRACT_MAX_CONCURRENT", "8")),
+        "max_queue": int(os.getenv("EXTRACT_MAX_QUEUE", "32")),
+    },
+    "qa": {
+        "max_concurrent": int(os.getenv("QA_MAX_CONCURRENT", "16")),
+        "max_queue": int(os.getenv("QA_MAX_QUEUE", "64")),
+    },
+    "bulk_index": {
+        "max_concurrent": int(os.getenv("BULK_INDEX_MAX_CONCURRENT", "1")),
+        "max_queue": int(os.getenv("BULK_INDEX_MAX_QUEUE", "2")),
+    },
+    "vision": {
+        "max_concurrent": int(os.getenv("VISION_MAX_CONCURRENT", "4")),
+        "max_queue": int(os.getenv("VISION_MAX_QUEUE", "16")),
+    },
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+
+# ==================== 问答会话配置 ====================
+# WebSocket 问答会话（/api/qa/ws）：会话保留已检索的分块与对话摘要，追问时复用
+# 工作集最多保留的分块数，超出时淘汰最久未命中的分块
+QA_SESSION_WORKING_SET = int(os.getenv("QA_SESSION_WORKING_SET", "12"))
+# 原样保留的最近对话轮数，更早的对话并入摘要
+QA_SESSION_RECENT_TURNS = int(os.getenv("QA_SESSION_RECENT_TURNS", "3"))
+QA_SESSION_SUMMARY_MAX_CHARS = int(os.getenv("QA_SESSION_SUMMARY_MAX_CHARS", "1200"))
+# 追问与上次检索的问题向量余弦相似度不低于该值时直接复用工作集，不查询向量库
+QA_SESSION_REUSE_SIMILARITY = float(os.getenv("QA_SESSION_REUSE_SIMILARITY", "0.85"))
+# 断开连接后会话保留的秒数，期间可用 session_id 重连
+QA_SESSION_IDLE_TIMEOUT = float(os.getenv("QA_SESSION_IDLE_TIMEOUT", "900"))
+
 # ==================== CORS 配置 ====================
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
 
+# ==================== 响应压缩配置 ====================
+# 按 Accept-Encoding 协商 brotli（需安装 brotli 包）/ gzip；小于阈值（字节）的响应不压缩
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "1"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
 # ==================== 文件上传配置 ====================
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", "10485760"))  # 10MB
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 
 # ==================== ChromaDB 配置 ====================
 CHROMADB_PERSIST_DIR = os.getenv("CHROMADB_PERSIST_DIR", "./data/chroma")
+
+# ==================== 向量存储配置 ====================
+# 向量存储后端: "chroma" | "numpy"（进程内 float16 内存映射矩阵）
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+NUMPY_VECTOR_DIR = os.getenv("NUMPY_VECTOR_DIR", "./data/vectors")
+
+# ==================== 共享状态配置 ====================
+# 文档 / 知识点 / 当前提供商的存储后端: "memory"（仅单进程） | "sqlite"（单机多 worker） | "redis"（多节点）
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_PATH = os.getenv("STATE_PATH", "./data/state.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "studyflow")
+
+# ==================== 状态快照配置 ====================
+# 定期把文档 / 知识点 / 知识图谱写入二进制快照，正常关闭时再写一次；启动时恢复到空的存储中
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "./data/snapshot.bin")
+# 定期写入间隔（秒），0 表示只在关闭时写入
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "300"))
+
+# ==================== 嵌入模型配置 ====================
+# 嵌入运行时: "torch" (sentence-transformers) | "onnx" (int8 量化，onnxruntime)
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./data/models/all-MiniLM-L6-v2-onnx")
+# 推理线程数，0 表示由运行时自动决定
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# 模型版本号：更换模型权重后递增，使旧的缓存向量失效
+EMBEDDING_MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+
+# 嵌入缓存（按文本内容哈希）：内存 LRU 容量；磁盘层 SQLite 路径，留空则只用内存
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "50000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+
+# 批量导入：嵌入 worker 进程数（0 表示 CPU 核数），嵌入可占用的可用内存比例
+BULK_INDEX_WORKERS = int(os.getenv("BULK_INDEX_WORKERS", "0"))
+BULK_INDEX_MEMORY_FRACTION = float(os.getenv("BULK_INDEX_MEMORY_FRACTION", "0.5"))
+
+# 分块去重（SimHash）：最大汉明距离 0-3
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "true").lower() == "true"
+CHUNK_DEDUP_MAX_DISTANCE = int(os.getenv("CHUNK_DEDUP_MAX_DISTANCE", "3"))
+
+# ==================== 性能剖析配置 ====================
+# 请求头 X-Profile 与该令牌一致时剖析该请求；留空则不接受请求头触发
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+# 随机采样剖析的请求比例（0-1），0 表示关闭
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "./data/profiles")
+# 保留最近的剖析结果数
+PROFILING_KEEP = int(os.getenv("PROFILING_KEEP", "200"))
+
+# ==================== 日志配置 ====================
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 输出格式: "json" | "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# 按模块设置级别，如 "services.rag_service=DEBUG,services.deepseek_service=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING,openai=WARNING")
+# DEBUG 日志保留比例（0-1），高频调试日志开启后按比例采样
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1"))
+# 异步日志队列容量，满时丢弃新日志而不阻塞请求
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
@@ -0,0 +1,222 @@
+"""
+Logging configuration
+结构化日志：请求线程只把日志记录放入有界队列，由后台线程格式化（JSON / 文本）、脱敏并写出；
+支持按模块设置级别、DEBUG 日志采样，以及按请求关联 ID 串联同一请求的日志
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from app.config import (
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_LEVELS,
+    LOG_DEBUG_SAMPLE_RATE,
+    LOG_QUEUE_SIZE,
+    DEEPSEEK_API_KEY,
+    MINIMAX_API_KEY,
+)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_request_id = ContextVar("request_id", default=None)
+
+# LogRecord 自带的属性，其余属性视为 extra 字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_SECRET_PATTERNS = [
+    re.compile(r"sk-[A-Za-z0-9_\-]{8,}"),
+    re.compile(r"(?i)(bearer\s+)[A-Za-z0-9._\-]{8,}"),
+    re.compile(r"(?i)((?:api[_-]?key|authorization|token|secret)[\"']?\s*[:=]\s*[\"']?)[^\s\"',}]{4,}"),
+]
+
+_listener = None
+_handler = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: Optional[str]):
+    """设置当前上下文（请求）的关联 ID，返回用于恢复的 token"""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def redact(text: str) -> str:
+    """去除文本中的密钥（配置中的 API Key 及常见密钥格式）"""
+    for secret in (DEEPSEEK_API_KEY, MINIMAX_API_KEY):
+        if secret and len(secret) >= 6:
+            text = text.replace(secret, "***")
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(lambda m: (m.group(1) if m.groups() else "") + "***", text)
+    return text
+
+
+class ContextFilter(logging.Filter):
+    """在产生日志的线程上附加请求关联 ID（后台线程取不到请求上下文）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """DEBUG 级别日志按比例采样，其余级别全部保留"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志而不是阻塞请求"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只在请求线程合并参数（参数对象之后可能被修改），格式化和脱敏留给后台线程
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else redact(str(value))
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """便于本地阅读的文本格式"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id") or record.request_id is None:
+            record.request_id = "-"
+        return redact(super().format(record))
+
+
+def _parse_levels(spec: str):
+    """"services.rag_service=DEBUG,services.deepseek_service=WARNING" -> [(模块, 级别)]"""
+    levels = []
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels.append((name.strip(), level.strip().upper()))
+    return levels
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    module_levels: str = LOG_LEVELS,
+    debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE,
+    queue_size: int = LOG_QUEUE_SIZE
+):
+    """
+    配置根日志器（重复调用无副作用）
+
+    Args:
+        level: 默认级别
+        fmt: "json" | "text"
+        module_levels: 按模块设置级别，如 "services.rag_service=DEBUG"
+        debug_sample_rate: DEBUG 日志保留比例
+        queue_size: 日志队列容量，满时丢弃
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    _handler = AsyncQueueHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(DebugSampler(debug_sample_rate))
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(level.upper())
+    for name, module_level in _parse_levels(module_levels):
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    # fork 出的子进程（批量嵌入 worker）没有后台写日志线程，改为直接写出
+    os.register_at_fork(after_in_child=lambda: _use_direct_handler(stream))
+
+
+def _use_direct_handler(stream: logging.Handler):
+    global _listener, _handler
+    direct = logging.StreamHandler(sys.stdout)
+    direct.setFormatter(stream.formatter)
+    direct.addFilter(ContextFilter())
+    logging.getLogger().handlers[:] = [direct]
+    _listener = None
+    _handler = None
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    """因队列满而丢弃的日志数"""
+    return _handler.dropped if _handler is not None else 0
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import uuid
-from typing import Optional
+from typing import Optional, List
 import os
+import shutil
+import tempfile
 from services.document_service import DocumentService
-from services.ai_provider import AIServiceSelector
-from app.config import AI_PROVIDER
+from services.provider_registry import get_provider
+from services.bundle import DocumentBundle, write_bundle
+from app.services import (
+    rag_service, documents_db, knowledge_db, knowledge_by_document, knowledge_graphs, knowledge_graph,
+    resource_versions, conditional_get, resolve_provider, admission, provider_http_error
+)
+from services.ai_provider import ProviderError
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
-# In-memory storage for documents (replace with database in production)
-documents_db = {}
 document_service = DocumentService()
 
 
@@ -23,7 +31,11 @@ class DocumentResponse(BaseModel):
 
 
 @router.post("/upload", response_model=DocumentResponse)
-async def upload_document(file: UploadFile = File(...), title: Optional[str] = None):
+async def upload_document(
+    file: UploadFile = File(...),
+    title: Optional[str] = None,
+    x_priority: Optional[str] = Header(None)
+):
     """
     Upload and parse a PDF document
     """
@@ -40,8 +52,9 @@ async def upload_document(file: UploadFile = File(...), title: Optional[str] = N
     # Read file content
     content = await file.read()
 
-    # Parse PDF with PyPDF2
-    parsed = document_service.parse_pdf(content)
+    # Parse PDF with PyPDF2（CPU 密集，限制并发并放到线程池执行）
+    async with admission("upload", x_priority, "batch"):
+        parsed = await run_in_threadpool(document_service.parse_pdf, content)
 
     if parsed["status"] == "error":
         raise HTTPException(status_code=500, detail=f"PDF parsing failed: {parsed.get('error')}")
@@ -51,10 +64,12 @@ async def upload_document(file: UploadFile = File(...), title: Optional[str] = N
         "document_id": document_id,
         "title": title,
         "page_count": parsed["page_count"],
+        "page_offsets": parsed["page_offsets"],
         "text_length": parsed["text_length"],
         "content": parsed["text"],
         "status": "completed"
     }
+    resource_versions.bump("documents", f"document:{document_id}")
 
     return DocumentResponse(
         document_id=document_id,
@@ -65,26 +80,172 @@ async def upload_document(file: UploadFile = File(...), title: Optional[str] = N
     )
 
 
-@router.get("/{document_id}")
-async def get_document(document_id: str):
+class BulkIndexRequest(BaseModel):
+    document_ids: List[str] = []  # 为空时索引全部文档
+    workers: Optional[int] = None
+
+
+@router.post("/bulk-index")
+async def bulk_index_documents(request: BulkIndexRequest, x_priority: Optional[str] = Header(None)):
     """
-    Get document by ID
+    批量建立向量索引（多进程嵌入），返回吞吐统计
     """
-    if document_id not in documents_db:
+    document_ids = request.document_ids or list(documents_db.keys())
+    found = {d: documents_db.get(d) for d in document_ids}
+    missing = [d for d, document in found.items() if document is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Documents not found: {missing}")
+
+    documents = {d: document["content"] for d, document in found.items() if document.get("content")}
+    if not documents:
+        raise HTTPException(status_code=400, detail="No document content to index")
+
+    async with admission("bulk_index", x_priority, "batch"):
+        try:
+            stats = await run_in_threadpool(rag_service.bulk_add_documents, documents, workers=request.workers)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Bulk indexing failed: {str(e)}")
+
+    return {"status": "completed", **stats}
+
+
+def _export_bundle(path: str, document: dict):
+    document_id = document["document_id"]
+    knowledge_id = knowledge_by_document.get(document_id)
+    knowledge = knowledge_db.get(knowledge_id) if knowledge_id else None
+    vectors = rag_service.vector_store.export(document_id)
+    write_bundle(
+        path,
+        document,
+        chunks=vectors[0] if vectors else None,
+        embeddings=vectors[1] if vectors else None,
+        knowledge=knowledge,
+        graph=knowledge_graph(knowledge) if knowledge else None
+    )
+
+
+@router.get("/{document_id}/export")
+async def export_document(document_id: str, x_priority: Optional[str] = Header(None)):
+    """
+    导出文档包：解析文本、分页偏移、分块、嵌入向量（float16）、知识点和知识图谱，
+    可导入其他节点而无需重新处理
+    """
+    document = documents_db.get(document_id)
+    if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
-    return documents_db[document_id]
+
+    fd, path = tempfile.mkstemp(prefix="bundle-", suffix=".sfb")
+    os.close(fd)
+    async with admission("upload", x_priority, "batch"):
+        try:
+            await run_in_threadpool(_export_bundle, path, document)
+        except Exception as e:
+            os.remove(path)
+            raise HTTPException(status_code=500, detail=f"Bundle export failed: {str(e)}")
+
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"{document_id}.sfb",
+        background=BackgroundTask(os.remove, path)
+    )
+
+
+def _bundle_document_id(document: dict) -> str:
+    """文档包中的 document_id 必须是规范格式的 UUID（会拼入向量存储路径）"""
+    document_id = document["document_id"]
+    if not isinstance(document_id, str):
+        raise ValueError(f"document_id must be a string, got {type(document_id).__name__}")
+    if str(uuid.UUID(document_id)) != document_id:
+        raise ValueError(f"document_id is not a canonical UUID: {document_id!r}")
+    return document_id
+
+
+def _import_bundle(path: str) -> dict:
+    with DocumentBundle(path) as bundle:
+        document = bundle.document()
+        document_id = _bundle_document_id(document)
+
+        # 向量与当前嵌入模型一致时直接写入向量存储（替换已有向量），
+        # 否则删除已有向量，在首次提问时按新文本重新建立索引
+        chunks = bundle.chunks()
+        embeddings = bundle.embeddings()
+        indexed = chunks is not None and embeddings is not None
+        if indexed:
+            rag_service.import_vectors(document_id, chunks, embeddings)
+        else:
+            rag_service.delete_document(document_id)
+        del embeddings
+
+        knowledge = bundle.knowledge()
+        graph = bundle.graph()
+
+    documents_db[document_id] = document
+    # 替换已有文档时，旧的知识点索引和图谱不再对应新内容
+    previous = knowledge_by_document.pop(document_id, None)
+    if previous:
+        knowledge_graphs.pop(previous, None)
+    if knowledge:
+        knowledge_db[knowledge["knowledge_id"]] = knowledge
+        knowledge_by_document[document_id] = knowledge["knowledge_id"]
+        if graph:
+            knowledge_graphs[knowledge["knowledge_id"]] = graph
+    resource_versions.bump("documents", f"document:{document_id}", f"map:{document_id}")
+
+    return {
+        "document_id": document_id,
+        "title": document.get("title"),
+        "chunks": len(chunks) if indexed else 0,
+        "indexed": indexed,
+        "knowledge_id": knowledge["knowledge_id"] if knowledge else None,
+        "status": "completed"
+    }
+
+
+@router.post("/import")
+async def import_document(file: UploadFile = File(...), x_priority: Optional[str] = Header(None)):
+    """
+    导入 /export 生成的文档包（同一 document_id 已存在时覆盖）
+    """
+    fd, path = tempfile.mkstemp(prefix="bundle-", suffix=".sfb")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
+        async with admission("upload", x_priority, "batch"):
+            try:
+                return await run_in_threadpool(_import_bundle, path)
+            except (KeyError, ValueError) as e:
+                # BinFileError 为 ValueError 子类：格式、版本或校验和不符
+                raise HTTPException(status_code=400, detail=f"Invalid bundle: {str(e)}")
+    finally:
+        os.remove(path)
+
+
+@router.get("/{document_id}")
+async def get_document(document_id: str, request: Request):
+    """
+    Get document by ID（支持 If-None-Match / If-Modified-Since）
+    """
+    return conditional_get(
+        request, f"document:{document_id}", lambda: documents_db.get(document_id), "Document not found"
+    )
 
 
 @router.get("/")
-async def list_documents():
+async def list_documents(request: Request):
     """
-    List all documents
+    List all documents（支持 If-None-Match / If-Modified-Since）
     """
-    return list(documents_db.values())
+    return conditional_get(request, "documents", lambda: list(documents_db.values()))
 
 
 @router.post("/ocr")
-async def ocr_image(file: UploadFile = File(...)):
+async def ocr_image(
+    file: UploadFile = File(...),
+    x_ai_provider: Optional[str] = Header(None),
+    x_tenant_id: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None)
+):
     """
     OCR - 识别图片中的文字
     支持 PNG, JPG, JPEG 格式
@@ -104,9 +265,8 @@ async def ocr_image(file: UploadFile = File(...)):
     if len(image_data) > 10 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
 
-    # Get AI service
-    selector = AIServiceSelector(AI_PROVIDER)
-    ai_service = selector.get_service()
+    # Get AI service（注册表中已初始化的实例）
+    ai_service = get_provider(resolve_provider(x_ai_provider, x_tenant_id))
 
     # Check if OCR is supported
     if not ai_service.support_ocr():
@@ -116,22 +276,28 @@ async def ocr_image(file: UploadFile = File(...)):
         )
 
     # Perform OCR
-    try:
-        text = ai_service.ocr_image(image_data)
-        return {
-            "status": "success",
-            "text": text,
-            "provider": ai_service.provider_name,
-            "file_size": len(image_data)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
+    async with admission("vision", x_priority, "interactive"):
+        try:
+            text = await run_in_threadpool(ai_service.ocr_image, image_data)
+        except ProviderError as e:
+            raise provider_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"OCR failed: {str(e)}")
+    return {
+        "status": "success",
+        "text": text,
+        "provider": ai_service.provider_name,
+        "file_size": len(image_data)
+    }
 
 
 @router.post("/image/understand")
 async def understand_image(
     file: UploadFile = File(...),
-    prompt: Optional[str] = ""
+    prompt: Optional[str] = "",
+    x_ai_provider: Optional[str] = Header(None),
+    x_tenant_id: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None)
 ):
     """
     图片理解 - 分析图片内容
@@ -152,9 +318,8 @@ async def understand_image(
     if len(image_data) > 10 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
 
-    # Get AI service
-    selector = AIServiceSelector(AI_PROVIDER)
-    ai_service = selector.get_service()
+    # Get AI service（注册表中已初始化的实例）
+    ai_service = get_provider(resolve_provider(x_ai_provider, x_tenant_id))
 
     # Check if image understanding is supported
     if not ai_service.support_image_understanding():
@@ -164,13 +329,16 @@ async def understand_image(
         )
 
     # Perform image understanding
-    try:
-        description = ai_service.understand_image(image_data, prompt or "")
-        return {
-            "status": "success",
-            "description": description,
-            "provider": ai_service.provider_name,
-            "file_size": len(image_data)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image understanding failed: {str(e)}")
+    async with admission("vision", x_priority, "interactive"):
+        try:
+            description = await run_in_threadpool(ai_service.understand_image, image_data, prompt or "")
+        except ProviderError as e:
+            raise provider_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Image understanding failed: {str(e)}")
+    return {
+        "status": "success",
+        "description": description,
+        "provider": ai_service.provider_name,
+        "file_size": len(image_data)
+    }
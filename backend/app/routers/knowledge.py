@@ -1,14 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import uuid
-from app.routers.documents import documents_db
-from app.services import knowledge_service, rag_service, graph_service
+import base64
+from app.services import (
+    knowledge_service, graph_service, documents_db, knowledge_db, knowledge_by_document, knowledge_graph,
+    knowledge_map_index, resource_versions, conditional_get,
+    default_provider, set_default_provider, resolve_provider, admission, provider_http_error
+)
+from app.config import TENANT_PROVIDERS
+from services.ai_provider import ProviderError
+from services.circuit_breaker import all_circuit_breakers
+from services.provider_limits import get_provider_limiter
+from services.provider_registry import PROVIDERS, initialized_providers, get_provider as get_provider_instance
+from services.singleflight import singleflight_stats, get_singleflight, digest_key
 
 router = APIRouter(prefix="/api/knowledge", tags=["knowledge"])
 
-# In-memory storage for knowledge
-knowledge_db = {}
+# 同一文档、同一文本的并发抽取只生成并保存一条知识点记录
+extract_inflight = get_singleflight("knowledge.record")
 
 
 class ProviderSwitchRequest(BaseModel):
@@ -18,18 +29,16 @@ class ProviderSwitchRequest(BaseModel):
 @router.post("/provider/switch")
 async def switch_provider(request: ProviderSwitchRequest):
     """
-    切换 AI 提供商
+    切换默认 AI 提供商（所有 worker 共享；请求仍可通过 provider 字段或 X-AI-Provider 请求头单独指定）
     """
-    allowed_providers = ["minimax", "deepseek"]
-    if request.provider not in allowed_providers:
+    if request.provider not in PROVIDERS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid provider. Allowed: {allowed_providers}"
+            detail=f"Invalid provider. Allowed: {list(PROVIDERS)}"
         )
 
-    # Update services
-    knowledge_service.set_provider(request.provider)
-    rag_service.set_provider(request.provider)
+    # 只修改共享的默认值，不改动服务实例，进行中的请求不受影响
+    set_default_provider(request.provider)
 
     return {
         "status": "success",
@@ -41,17 +50,45 @@ async def switch_provider(request: ProviderSwitchRequest):
 @router.get("/provider")
 async def get_provider():
     """
-    获取当前 AI 提供商
+    获取当前默认 AI 提供商
     """
-    return {
-        "provider": knowledge_service.provider,
-        "available_providers": ["minimax", "deepseek"]
+    provider = default_provider()
+    result = {
+        "provider": provider,
+        "available_providers": list(PROVIDERS),
+        "initialized_providers": initialized_providers(),
+        "tenant_providers": TENANT_PROVIDERS
+    }
+    # "both" 模式下返回各提供商的滚动延迟/错误统计
+    ai_service = get_provider_instance(provider)
+    if hasattr(ai_service, "profile"):
+        result["routing"] = ai_service.profile()
+    return result
+
+
+@router.get("/provider/status")
+async def get_provider_status():
+    """
+    获取各提供商的熔断器、准入层和路由统计
+    """
+    names = sorted(set(["minimax", "deepseek"]) | set(all_circuit_breakers()))
+    providers = {name: get_provider_limiter(name).stats() for name in names}
+    provider = default_provider()
+    result = {
+        "provider": provider,
+        "providers": providers,
+        "coalescing": singleflight_stats()
     }
+    ai_service = get_provider_instance(provider)
+    if hasattr(ai_service, "profile"):
+        result["routing"] = ai_service.profile()
+    return result
 
 
 class ExtractRequest(BaseModel):
     document_id: str
     extraction_level: str = "chapter"
+    provider: Optional[str] = None  # 为空时按 X-AI-Provider 请求头、租户配置、默认提供商依次确定
 
 
 class KnowledgeResponse(BaseModel):
@@ -61,17 +98,48 @@ class KnowledgeResponse(BaseModel):
     status: str
 
 
+def _extract_and_store(document_id: str, text: str, extraction_level: str, provider: str) -> dict:
+    """抽取知识点并保存为新记录，返回该记录"""
+    knowledge = knowledge_service.extract_knowledge(
+        document_id=document_id,
+        text=text,
+        extraction_level=extraction_level,
+        provider=provider
+    )
+
+    knowledge_id = str(uuid.uuid4())
+
+    # Store knowledge
+    record = {
+        "knowledge_id": knowledge_id,
+        "document_id": document_id,
+        "chapters": knowledge.get("chapters", []),
+        "status": "completed"
+    }
+    knowledge_db[knowledge_id] = record
+    knowledge_by_document[document_id] = knowledge_id
+    resource_versions.bump(f"map:{document_id}")
+    return record
+
+
 @router.post("/extract", response_model=KnowledgeResponse)
-async def extract_knowledge(request: ExtractRequest):
+async def extract_knowledge(
+    request: ExtractRequest,
+    x_ai_provider: Optional[str] = Header(None),
+    x_tenant_id: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None)
+):
     """
     Extract knowledge from document using DeepSeek API
     """
+    provider = resolve_provider(request.provider or x_ai_provider, x_tenant_id)
+
     # Check if document exists
-    if request.document_id not in documents_db:
+    document = documents_db.get(request.document_id)
+    if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Get document content
-    document = documents_db[request.document_id]
     text_content = document.get("content", "")
 
     if not text_content:
@@ -82,47 +150,26 @@ async def extract_knowledge(request: ExtractRequest):
     text_to_process = text_content[:8000] if len(text_content) > 8000 else text_content
 
     # Extract knowledge using DeepSeek
-    try:
-        knowledge = knowledge_service.extract_knowledge(
-            document_id=request.document_id,
-            text=text_to_process,
-            extraction_level=request.extraction_level
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Knowledge extraction failed: {str(e)}")
+    # 在线程池中执行：同一文档的并发抽取合并为一次模型调用和一条记录，调用方拿到同一个 knowledge_id
+    async with admission("extract", x_priority, "batch"):
+        try:
+            record = await run_in_threadpool(
+                extract_inflight.do,
+                (request.document_id, provider, digest_key(text_to_process)),
+                lambda: _extract_and_store(request.document_id, text_to_process, request.extraction_level, provider)
+            )
+        except ProviderError as e:
+            raise provider_http_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Knowledge extraction failed: {str(e)}")
 
-    knowledge_id = str(uuid.uuid4())
+    return KnowledgeResponse(**record)
 
-    # Store knowledge
-    knowledge_db[knowledge_id] = {
-        "knowledge_id": knowledge_id,
-        "document_id": request.document_id,
-        "chapters": knowledge.get("chapters", []),
-        "status": "completed"
-    }
-
-    # Build knowledge graph
-    graph_service.build_graph(knowledge)
 
-    return KnowledgeResponse(
-        knowledge_id=knowledge_id,
-        document_id=request.document_id,
-        chapters=knowledge.get("chapters", []),
-        status="completed"
-    )
-
-
-@router.get("/map")
-async def get_knowledge_map(document_id: str):
-    """
-    Get knowledge map (nodes and edges) for visualization
-    """
+def _load_knowledge_map(document_id: str) -> dict:
     # Find knowledge for this document
-    knowledge = None
-    for k_id, k_data in knowledge_db.items():
-        if k_data["document_id"] == document_id:
-            knowledge = k_data
-            break
+    knowledge_id = knowledge_by_document.get(document_id)
+    knowledge = knowledge_db.get(knowledge_id) if knowledge_id else None
 
     if not knowledge:
         # Return mock data if no knowledge extracted yet
@@ -133,8 +180,89 @@ async def get_knowledge_map(document_id: str):
         edges = [{"source": "c1", "target": "t1", "label": "包含"}]
         return {"nodes": nodes, "edges": edges}
 
-    # Build graph from actual knowledge
-    graph_service.build_graph({"chapters": knowledge["chapters"]})
-    result = graph_service.get_nodes_and_edges()
+    # Build graph from actual knowledge（已构建过则直接复用）
+    return knowledge_graph(knowledge)
 
-    return result
+
+@router.get("/map")
+async def get_knowledge_map(document_id: str, request: Request):
+    """
+    Get knowledge map (nodes and edges) for visualization
+    （支持 If-None-Match / If-Modified-Since，未变化时不重新构建图）
+    """
+    return conditional_get(request, f"map:{document_id}", lambda: _load_knowledge_map(document_id))
+
+
+def _encode_cursor(knowledge_id: str, parent: Optional[str], offset: int) -> str:
+    raw = f"{knowledge_id}\n{parent or ''}\n{offset}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, knowledge_id: str, parent: Optional[str]) -> int:
+    """返回游标中的起始位置；游标属于其他知识点（已重新抽取）或其他父节点时返回 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        cursor_knowledge, cursor_parent, offset = raw.split("\n")
+        offset = int(offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_knowledge != knowledge_id or cursor_parent != (parent or "") or offset < 0:
+        raise HTTPException(status_code=400, detail="Cursor expired, restart from the first page")
+    return offset
+
+
+@router.get("/map/nodes")
+async def get_knowledge_map_nodes(
+    request: Request,
+    document_id: str,
+    parent: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    label_length: int = Query(40, ge=0, description="标签最大字符数，0 表示不截断")
+):
+    """
+    分层浏览知识地图：不指定 parent 时返回章节，指定时返回该节点的子节点；
+    按 next_cursor 翻页，完整标签与内容从 /map/nodes/{node_id} 获取
+    """
+    def load():
+        knowledge_id = knowledge_by_document.get(document_id)
+        if not knowledge_id:
+            return None
+        try:
+            index = knowledge_map_index(knowledge_id)
+        except KeyError:
+            return None
+
+        offset = _decode_cursor(cursor, knowledge_id, parent) if cursor else 0
+        try:
+            page = graph_service.get_children(index, parent, offset, limit, label_length)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Node not found")
+
+        next_offset = page.pop("next_offset")
+        return {
+            "knowledge_id": knowledge_id,
+            "parent": parent,
+            **page,
+            "next_cursor": _encode_cursor(knowledge_id, parent, next_offset) if next_offset is not None else None,
+        }
+
+    return conditional_get(request, f"map:{document_id}", load, "Knowledge not extracted yet")
+
+
+@router.get("/map/nodes/{node_id}")
+async def get_knowledge_map_node(node_id: str, document_id: str, request: Request):
+    """
+    知识地图节点详情（完整标签、父节点、子节点数及知识点条目内容）
+    """
+    def load():
+        knowledge_id = knowledge_by_document.get(document_id)
+        knowledge = knowledge_db.get(knowledge_id) if knowledge_id else None
+        if not knowledge:
+            return None
+        try:
+            return graph_service.get_node_detail(knowledge_map_index(knowledge_id), knowledge, node_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Node not found")
+
+    return conditional_get(request, f"map:{document_id}", load, "Knowledge not extracted yet")
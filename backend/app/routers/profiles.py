@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import FileResponse
+from typing import Optional
+from app.config import PROFILING_TOKEN
+from services.profiler import list_profiles, profile_path, FOLDED_SUFFIX, TRACE_SUFFIX
+
+router = APIRouter(prefix="/api/profiles", tags=["profiles"])
+
+
+def _check_token(token: Optional[str]):
+    # 配置了令牌时，查看剖析结果也需要同一令牌
+    if PROFILING_TOKEN and token != PROFILING_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@router.get("/")
+async def get_profiles(x_profile: Optional[str] = Header(None)):
+    """
+    列出已保存的请求剖析结果（新的在前）
+    """
+    _check_token(x_profile)
+    return {"profiles": list_profiles()}
+
+
+@router.get("/{profile_id}/flamegraph")
+async def get_flamegraph(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """
+    折叠栈文件（flamegraph.pl / speedscope / inferno 可直接读取）
+    """
+    _check_token(x_profile)
+    path = profile_path(profile_id, FOLDED_SUFFIX)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=profile_id + FOLDED_SUFFIX)
+
+
+@router.get("/{profile_id}/timeline")
+async def get_timeline(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """
+    阶段 span 时间线（Chrome trace 格式）
+    """
+    _check_token(x_profile)
+    path = profile_path(profile_id, TRACE_SUFFIX)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=profile_id + TRACE_SUFFIX)
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List
-import traceback
-from app.routers.documents import documents_db
-from app.services import rag_service
+from typing import List, Optional
+import asyncio
+import json
+import logging
+from app.services import rag_service, documents_db, resolve_provider, admission, qa_sessions, provider_http_error
+from services.ai_provider import ProviderError
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/qa", tags=["qa"])
 
@@ -12,6 +17,7 @@ class AskRequest(BaseModel):
     question: str
     document_id: str
     top_k: int = 3
+    provider: Optional[str] = None  # 为空时按 X-AI-Provider 请求头、租户配置、默认提供商依次确定
 
 
 class AskResponse(BaseModel):
@@ -23,56 +29,166 @@ class AskResponse(BaseModel):
 
 
 @router.post("/ask", response_model=AskResponse)
-async def ask_question(request: AskRequest):
+async def ask_question(
+    request: AskRequest,
+    x_ai_provider: Optional[str] = Header(None),
+    x_tenant_id: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None)
+):
     """
     RAG-based question answering using DeepSeek
     """
+    provider = resolve_provider(request.provider or x_ai_provider, x_tenant_id)
+
     # Check if document exists
-    if request.document_id not in documents_db:
+    document = documents_db.get(request.document_id)
+    if document is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Get document content
-    document = documents_db[request.document_id]
     text_content = document.get("content", "")
 
     if not text_content:
         raise HTTPException(status_code=400, detail="Document has no content for Q&A")
 
-    # Add document to vector store if not already
+    # 问答默认为交互类请求，排队时优先于批量上传 / 抽取
+    async with admission("qa", x_priority, "interactive"):
+        # Add document to vector store if not already
+        try:
+            # Add to vector store only if not indexed yet (e.g. by bulk indexing)
+            # 在线程池中执行，阻塞调用不占用事件循环，并发请求才能合并
+            await run_in_threadpool(rag_service.ensure_document, request.document_id, text_content)
+
+            # Get answer using RAG
+            result = await run_in_threadpool(
+                rag_service.answer_question,
+                question=request.question,
+                document_id=request.document_id,
+                top_k=request.top_k,
+                provider=provider
+            )
+
+            # Extract related topics from sources
+            related_topics = []
+            for source in result.get("sources", [])[:3]:
+                # Simple extraction - in production, use NLP
+                content = source.get("content", "")
+                if len(content) > 50:
+                    related_topics.append(content[:50] + "...")
+
+            return AskResponse(
+                answer=result["answer"],
+                sources=result["sources"],
+                related_topics=related_topics if related_topics else ["相关知识点"],
+                provider=result.get("provider", provider),
+                source_type=result.get("source_type", "knowledge_base")
+            )
+
+        except ProviderError as e:
+            raise provider_http_error(e)
+        except Exception as e:
+            # Fallback to mock response if RAG fails
+            logger.exception("QA failed for document %s", request.document_id)
+            return AskResponse(
+                answer=f"抱歉，处理您的问题时遇到了一些问题: {str(e)[:50]}",
+                sources=[],
+                related_topics=[]
+            )
+
+
+@router.websocket("/ws")
+async def qa_session(
+    websocket: WebSocket,
+    document_id: str,
+    provider: Optional[str] = None,
+    session_id: Optional[str] = None,
+    tenant_id: Optional[str] = None
+):
+    """
+    多轮问答会话
+
+    连接后服务端发送 {"type": "ready", "session_id"}；断线后带 session_id 重连可继续会话。
+    客户端消息：
+        {"type": "ask", "question": "...", "top_k": 3}
+        {"type": "reset"}  清空工作集与对话历史
+    服务端回复 {"type": "answer", ...} 或 {"type": "error", "detail", "status_code"}
+    """
+    await websocket.accept()
+
+    async def send_error(status_code: int, detail: str):
+        await websocket.send_json({"type": "error", "status_code": status_code, "detail": detail})
+
+    try:
+        provider = resolve_provider(provider or websocket.headers.get("x-ai-provider"), tenant_id)
+    except HTTPException as e:
+        await send_error(e.status_code, e.detail)
+        await websocket.close(code=1008)
+        return
+
+    document = documents_db.get(document_id)
+    if document is None or not document.get("content"):
+        await send_error(404, "Document not found" if document is None else "Document has no content for Q&A")
+        await websocket.close(code=1008)
+        return
+
+    session = qa_sessions.open(document_id, rag_service, provider, session_id)
+    # 进行中的后台压缩任务（保持引用，避免任务被回收）
+    compactions = set()
+    await websocket.send_json({
+        "type": "ready",
+        "session_id": session.session_id,
+        "document_id": document_id,
+        "provider": provider,
+        "turn": session.turn,
+    })
+
     try:
-        # Check if document is already in vector store
-        # For simplicity, we'll add it each time
-        rag_service.add_document(request.document_id, text_content)
-
-        # Get answer using RAG
-        result = rag_service.answer_question(
-            question=request.question,
-            document_id=request.document_id,
-            top_k=request.top_k
-        )
-
-        # Extract related topics from sources
-        related_topics = []
-        for source in result.get("sources", [])[:3]:
-            # Simple extraction - in production, use NLP
-            content = source.get("content", "")
-            if len(content) > 50:
-                related_topics.append(content[:50] + "...")
-
-        return AskResponse(
-            answer=result["answer"],
-            sources=result["sources"],
-            related_topics=related_topics if related_topics else ["相关知识点"],
-            provider=result.get("provider", "deepseek"),
-            source_type=result.get("source_type", "knowledge_base")
-        )
-
-    except Exception as e:
-        # Fallback to mock response if RAG fails
-        print(f"[QA Error] {str(e)}")
-        traceback.print_exc()
-        return AskResponse(
-            answer=f"抱歉，处理您的问题时遇到了一些问题: {str(e)[:50]}",
-            sources=[],
-            related_topics=[]
-        )
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await send_error(400, "Messages must be JSON objects")
+                continue
+            message_type = message.get("type")
+
+            if message_type == "reset":
+                session.reset()
+                await websocket.send_json({"type": "reset", "session_id": session.session_id})
+                continue
+            question = (message.get("question") or "").strip() if message_type == "ask" else ""
+            if not question:
+                await send_error(400, "Expected {\"type\": \"ask\", \"question\": ...} or {\"type\": \"reset\"}")
+                continue
+
+            top_k = message.get("top_k", 3)
+            if not isinstance(top_k, int) or not 1 <= top_k <= 20:
+                await send_error(400, "top_k must be an integer between 1 and 20")
+                continue
+
+            try:
+                # 每个问题单独准入，长连接不长期占用名额
+                async with admission("qa", message.get("priority"), "interactive"):
+                    await run_in_threadpool(rag_service.ensure_document, document_id, document["content"])
+                    result = await run_in_threadpool(session.ask, question, top_k)
+            except HTTPException as e:
+                await send_error(e.status_code, e.detail)
+                continue
+            except ProviderError as e:
+                error = provider_http_error(e)
+                await send_error(error.status_code, error.detail)
+                continue
+            except Exception as e:
+                logger.exception("QA session %s failed for document %s", session.session_id, document_id)
+                await send_error(500, f"抱歉，处理您的问题时遇到了一些问题: {str(e)[:50]}")
+                continue
+
+            await websocket.send_json({"type": "answer", "session_id": session.session_id, **result})
+            # 旧对话在后台压缩，不阻塞接收下一个问题
+            if session.needs_compaction():
+                task = asyncio.create_task(run_in_threadpool(session.compact))
+                compactions.add(task)
+                task.add_done_callback(compactions.discard)
+    except WebSocketDisconnect:
+        logger.debug("QA session %s disconnected", session.session_id)
@@ -2,11 +2,206 @@
 Shared service instances
 用于避免循环导入
 """
+import math
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from app.config import (
+    AI_PROVIDER, PROVIDER_WARMUP, TENANT_PROVIDERS, WARMUP_PRECONNECT, SNAPSHOT_PATH, SNAPSHOT_INTERVAL,
+    LLM_BACKOFF_MAX
+)
 from services.knowledge_service import KnowledgeService
 from services.rag_service import RAGService
 from services.graph_service import GraphService
+from services.provider_registry import PROVIDERS, warm_providers
+from services.ai_provider import ProviderError, ProviderUnavailableError
+from services.admission import AdmissionRejected, get_admission_pool, priority_of
+from services.state_store import get_state_store
+from services.embedding_service import get_embedding_service
+from services.warmup import Warmup
+from services.snapshot import Snapshotter
+from services.versions import ResourceVersions, is_not_modified, validators
+from services.qa_session import QASessionRegistry
 
 # Create singleton service instances
 knowledge_service = KnowledgeService()
 rag_service = RAGService()
 graph_service = GraphService()
+
+# 跨 worker / 节点共享的应用状态
+documents_db = get_state_store("documents")
+knowledge_db = get_state_store("knowledge")
+# document_id -> 最近一次抽取的 knowledge_id
+knowledge_by_document = get_state_store("knowledge_by_document")
+settings_db = get_state_store("settings")
+# knowledge_id -> 知识图谱的节点与边（知识点抽取后不再变化，构建一次即可复用）
+knowledge_graphs = get_state_store("graphs")
+# 资源版本（ETag / Last-Modified），数据写入后调用 resource_versions.bump
+resource_versions = ResourceVersions(get_state_store("versions"))
+
+# WebSocket 问答会话（进程内，不跨 worker 共享；多 worker 部署需按连接保持会话粘性）
+qa_sessions = QASessionRegistry()
+
+# 定期快照上述状态，重启后从快照恢复
+snapshotter = Snapshotter(
+    {
+        "documents": documents_db,
+        "knowledge": knowledge_db,
+        "knowledge_by_document": knowledge_by_document,
+        "graphs": knowledge_graphs,
+        "settings": settings_db,
+        "versions": resource_versions.store,
+    },
+    SNAPSHOT_PATH,
+    SNAPSHOT_INTERVAL
+)
+
+
+def _warm_providers():
+    ready = warm_providers(PROVIDER_WARMUP, preconnect=WARMUP_PRECONNECT)
+    failed = [name for name in PROVIDER_WARMUP if name not in ready]
+    if failed:
+        raise RuntimeError(f"Providers failed to initialize: {failed}")
+
+
+# 启动后在后台预热，首个请求不再承担模型加载、初始化和建连开销
+warmup = Warmup()
+warmup.add("providers", _warm_providers)
+warmup.add("embedding_model", lambda: get_embedding_service().embed_texts(["warm up"]))
+warmup.add("vector_store", rag_service.vector_store.warm_up)
+warmup.add("graph", lambda: graph_service.build_graph({}))
+
+
+def knowledge_graph(knowledge: dict) -> dict:
+    """
+    知识点记录对应的知识图谱（节点与边），首次使用时构建并缓存
+
+    Args:
+        knowledge: knowledge_db 中的记录
+    """
+    knowledge_id = knowledge["knowledge_id"]
+    result = knowledge_graphs.get(knowledge_id)
+    if result is None:
+        graph = graph_service.build_graph({"chapters": knowledge["chapters"]})
+        result = graph_service.get_nodes_and_edges(graph)
+        knowledge_graphs[knowledge_id] = result
+    return result
+
+
+@lru_cache(maxsize=32)
+def knowledge_map_index(knowledge_id: str) -> dict:
+    """
+    知识图谱的分层索引（见 GraphService.build_index）；同一 knowledge_id 的内容不会变化，在进程内缓存
+
+    Raises:
+        KeyError: 知识点不存在
+    """
+    knowledge = knowledge_db.get(knowledge_id)
+    if knowledge is None:
+        raise KeyError(knowledge_id)
+    return graph_service.build_index(knowledge_graph(knowledge))
+
+
+def default_provider() -> str:
+    """未指定提供商的请求使用的默认提供商（共享状态，可通过 /provider/switch 修改）"""
+    return settings_db.get("provider", AI_PROVIDER)
+
+
+def set_default_provider(provider: str):
+    """修改默认提供商；只影响之后开始的请求，进行中的请求不受影响"""
+    settings_db["provider"] = provider
+
+
+def resolve_provider(requested: Optional[str] = None, tenant: Optional[str] = None) -> str:
+    """
+    确定本次请求使用的提供商：请求指定 > 租户配置 > 默认提供商
+
+    Args:
+        requested: 请求体或请求头 X-AI-Provider 指定的提供商
+        tenant: 请求头 X-Tenant-ID
+
+    Returns:
+        提供商名称
+    """
+    provider = requested or TENANT_PROVIDERS.get(tenant or "") or default_provider()
+    if provider not in PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"Invalid provider. Allowed: {list(PROVIDERS)}")
+    return provider
+
+
+def provider_http_error(error: ProviderError) -> HTTPException:
+    """
+    提供商错误对应的 HTTP 错误
+
+    暂时不可用（限流、重试耗尽、熔断）为 503 并附带 Retry-After；提供商拒绝了请求内容为 400；
+    其他不可重试的错误（余额不足、鉴权失败、返回格式错误等）为 503
+
+    Args:
+        error: 提供商调用抛出的异常
+    """
+    if isinstance(error, ProviderUnavailableError):
+        return HTTPException(
+            status_code=503,
+            detail=f"AI provider unavailable: {str(error)}",
+            headers={"Retry-After": str(max(1, int(getattr(error, "retry_after", LLM_BACKOFF_MAX))))}
+        )
+    if error.status_code in (400, 413, 422):
+        return HTTPException(status_code=400, detail=f"AI provider rejected the request: {str(error)}")
+    return HTTPException(status_code=503, detail=f"AI provider error: {str(error)}")
+
+
+@asynccontextmanager
+async def admission(pool_name: str, priority: Optional[str] = None, default_priority: str = "batch"):
+    """
+    端点准入：获得执行名额后进入，退出时归还；未获准入时返回 429 / 503 并附带 Retry-After
+
+    Args:
+        pool_name: 端点组，见 ADMISSION_LIMITS
+        priority: 请求头 X-Priority（"interactive" | "batch"）
+        default_priority: 请求未指定时的优先级
+    """
+    pool = get_admission_pool(pool_name)
+    try:
+        await pool.acquire(priority_of(priority, default_priority))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Server busy ({e.reason}), please retry later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        pool.release(time.monotonic() - started)
+
+
+def conditional_get(request: Request, resource: str, load: Callable[[], Any], not_found: str = "Not found") -> Response:
+    """
+    支持条件请求的 GET：客户端持有当前版本时直接返回 304，不读取、构建或序列化内容
+
+    Args:
+        request: 请求
+        resource: 资源名（见 ResourceVersions）
+        load: 读取内容，资源不存在时返回 None
+        not_found: 404 的错误信息
+
+    Returns:
+        304 或带 ETag / Last-Modified 的 JSON 响应
+    """
+    # 先读版本再读内容：返回的内容不会比 ETag 更旧
+    version = resource_versions.peek(resource)
+    if version is not None and is_not_modified(request.headers, version):
+        return Response(status_code=304, headers=validators(version))
+
+    content = load()
+    if content is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    if version is None:
+        # 首次访问尚无版本的资源：创建版本，本次不返回校验器（内容可能早于新版本）
+        resource_versions.ensure(resource)
+        return ORJSONResponse(content)
+    return ORJSONResponse(content, headers=validators(version))
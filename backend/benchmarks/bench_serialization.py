@@ -0,0 +1,117 @@
+"""
+Response serialization benchmark
+对比标准 json（JSONResponse）与 orjson（ORJSONResponse）序列化大响应的耗时，
+以及 gzip / brotli 压缩后的字节数与压缩耗时。负载：整本教材的 get_document、
+list_documents、大型知识图谱的 get_knowledge_map
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --pages 200 --nodes 10000 --output benchmarks/results/serialization.json
+"""
+import argparse
+import json
+import statistics
+import time
+import zlib
+from typing import Any, Callable, Dict
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.compression import brotli
+from app.config import COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+from benchmarks.microbench import synthetic_text, synthetic_knowledge
+from services.graph_service import GraphService
+
+
+def _median_ms(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def _gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def build_payloads(pages: int, documents: int, nodes: int) -> Dict[str, Any]:
+    text = synthetic_text(pages)
+    document = {
+        "document_id": "bench",
+        "title": "Bench textbook",
+        "page_count": pages,
+        "text_length": len(text),
+        "content": text,
+        "status": "completed",
+    }
+    listing = [
+        {**document, "document_id": f"doc-{i}", "content": synthetic_text(max(1, pages // 10), seed=i)}
+        for i in range(documents)
+    ]
+    graph_service = GraphService()
+    graph = graph_service.get_nodes_and_edges(graph_service.build_graph(synthetic_knowledge(nodes)))
+    return {
+        f"get_document[{pages} pages]": document,
+        f"list_documents[{documents} docs]": listing,
+        f"knowledge_map[{nodes} nodes]": graph,
+    }
+
+
+def bench_payload(payload: Any, repeat: int) -> Dict[str, Any]:
+    """
+    测试单个负载
+
+    Returns:
+        两种编码器的耗时，原始 / 压缩后的字节数与压缩耗时
+    """
+    body = ORJSONResponse(payload).body
+    stdlib_body = JSONResponse(payload).body
+    result = {
+        "json_ms": _median_ms(lambda: JSONResponse(payload), repeat),
+        "orjson_ms": _median_ms(lambda: ORJSONResponse(payload), repeat),
+        "json_bytes": len(stdlib_body),
+        "bytes": len(body),
+        "gzip_bytes": len(_gzip(body)),
+        "gzip_ms": _median_ms(lambda: _gzip(body), repeat),
+    }
+    result["speedup"] = round(result["json_ms"] / max(result["orjson_ms"], 1e-6), 1)
+    result["gzip_saved"] = round(1 - result["gzip_bytes"] / result["bytes"], 3)
+    if brotli is not None:
+        result["br_bytes"] = len(brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY))
+        result["br_ms"] = _median_ms(lambda: brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY), repeat)
+        result["br_saved"] = round(1 - result["br_bytes"] / result["bytes"], 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization benchmark")
+    parser.add_argument("--pages", type=int, default=1000, help="get_document 的文档页数")
+    parser.add_argument("--documents", type=int, default=100, help="list_documents 的文档数（每个 pages/10 页）")
+    parser.add_argument("--nodes", type=int, default=50000, help="知识图谱节点数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = {}
+    for name, payload in build_payloads(args.pages, args.documents, args.nodes).items():
+        result = bench_payload(payload, args.repeat)
+        results[name] = result
+        line = (
+            f"[Bench] {name}: json={result['json_ms']}ms orjson={result['orjson_ms']}ms ({result['speedup']}x) "
+            f"size={result['bytes'] / 1024:.0f}KB gzip={result['gzip_bytes'] / 1024:.0f}KB "
+            f"(-{result['gzip_saved']:.0%}, {result['gzip_ms']}ms)"
+        )
+        if "br_bytes" in result:
+            line += f" br={result['br_bytes'] / 1024:.0f}KB (-{result['br_saved']:.0%}, {result['br_ms']}ms)"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Vector store benchmark
+对比 ChromaDB 与 NumPy 内存映射后端在不同分块规模下的写入与检索延迟
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.bench_vector_store
+    python -m benchmarks.bench_vector_store --sizes 1000,100000 --backends numpy
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from services.vector_store import get_vector_store
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+
+def _synthetic_data(n: int, dim: int, seed: int = 42):
+    """生成单位化的随机向量和对应的分块文本"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = [f"chunk {i} " + "x" * 480 for i in range(n)]
+    return chunks, vectors
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def bench_backend(backend: str, n: int, dim: int, queries: int, top_k: int) -> dict:
+    """
+    测试单个后端
+
+    Args:
+        backend: "chroma" | "numpy"
+        n: 分块数量
+        dim: 向量维度
+        queries: 查询次数
+        top_k: 每次查询返回数量
+
+    Returns:
+        测试结果
+    """
+    chunks, vectors = _synthetic_data(n, dim)
+    query_vectors = _synthetic_data(queries, dim, seed=7)[1]
+    workdir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        store = get_vector_store(backend, workdir)
+
+        start = time.perf_counter()
+        store.add("bench", chunks, vectors)
+        add_seconds = time.perf_counter() - start
+
+        # 预热一次（建立内存映射 / 加载索引）
+        store.query("bench", [query_vectors[0]], top_k)
+
+        latencies = []
+        for q in query_vectors:
+            start = time.perf_counter()
+            store.query("bench", [q], top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        start = time.perf_counter()
+        store.query("bench", query_vectors, top_k)
+        batch_ms = (time.perf_counter() - start) * 1000
+
+        return {
+            "backend": backend,
+            "chunks": n,
+            "add_seconds": round(add_seconds, 3),
+            "query_p50_ms": round(statistics.median(latencies), 3),
+            "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+            "batch_query_ms": round(batch_ms, 3),
+            "batch_size": queries,
+            "disk_bytes": _dir_size(workdir),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store benchmark")
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        for backend in args.backends.split(","):
+            print(f"[Bench] backend={backend} chunks={n} ...")
+            try:
+                result = bench_backend(backend, n, args.dim, args.queries, args.top_k)
+            except ImportError as e:
+                print(f"[Bench] skip {backend}: {e}")
+                continue
+            print(
+                f"[Bench]   add={result['add_seconds']}s "
+                f"p50={result['query_p50_ms']}ms p95={result['query_p95_ms']}ms "
+                f"batch({args.queries})={result['batch_query_ms']}ms"
+            )
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Import-time budget check
+检查 `import main` 的耗时与导入的模块：重量级依赖（LLM SDK、图库、向量库、模型运行时）
+必须推迟到首次使用或后台预热时导入，进程才能在一秒内开始接受连接
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.check_import_time
+    python -m benchmarks.check_import_time --budget-ms 800 --serve
+
+任一检查不通过时以非零状态退出：
+  - import main 的累计耗时（取多次运行的最小值）超过 --budget-ms
+  - import main 时导入了 DEFERRED_MODULES 中的模块
+  - 指定 --serve 时，uvicorn 启动到 /health 返回 200 的时间超过 --serve-budget-ms
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动时不应导入的模块
+DEFERRED_MODULES = [
+    "openai",
+    "networkx",
+    "chromadb",
+    "sentence_transformers",
+    "torch",
+    "onnxruntime",
+    "tokenizers",
+    "PyPDF2",
+]
+
+
+def _env(workdir: str) -> dict:
+    return dict(
+        os.environ,
+        DEEPSEEK_API_KEY=os.environ.get("DEEPSEEK_API_KEY", "check"),
+        MOCK_MODE="true",
+        WARMUP_ENABLED="false",
+        STATE_PATH=os.path.join(workdir, "state.sqlite3"),
+        LOG_LEVEL="WARNING",
+    )
+
+
+def measure_import(env: dict):
+    """
+    在子进程中执行 python -X importtime -c "import main"
+
+    Returns:
+        (main 的累计耗时 ms, {模块名: 累计耗时 ms})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        try:
+            modules[name.strip()] = int(cumulative) / 1000
+        except ValueError:
+            continue  # 表头行
+    return modules.get("main", 0.0), modules
+
+
+def measure_serve(env: dict, port: int, timeout: float = 30.0) -> float:
+    """启动 uvicorn，返回从启动进程到 /health 返回 200 的毫秒数"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server not healthy after {timeout:.0f}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="import main 的耗时上限")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="列出耗时最多的应用模块数")
+    parser.add_argument("--serve", action="store_true", help="同时测量 uvicorn 启动到可接受连接的时间")
+    # 含解释器与 uvicorn 自身的启动时间
+    parser.add_argument("--serve-budget-ms", type=float, default=3000.0)
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="import-check-") as workdir:
+        env = _env(workdir)
+        runs = [measure_import(env) for _ in range(args.runs)]
+        total, modules = min(runs, key=lambda r: r[0])
+
+        print(f"import main: {total:.0f}ms (min of {args.runs}, budget {args.budget_ms:.0f}ms)")
+        own = sorted(
+            ((ms, name) for name, ms in modules.items() if name.split(".")[0] in ("app", "services", "main")),
+            reverse=True
+        )
+        for ms, name in own[:args.top]:
+            print(f"  {ms:8.1f}ms  {name}")
+        if total > args.budget_ms:
+            failures.append(f"import main took {total:.0f}ms > {args.budget_ms:.0f}ms")
+
+        eager = [m for m in DEFERRED_MODULES if m in modules]
+        if eager:
+            failures.append(f"imported at startup (should be deferred): {', '.join(eager)}")
+
+        if args.serve:
+            serve_ms = measure_serve(env, args.port)
+            print(f"uvicorn start -> /health 200: {serve_ms:.0f}ms (budget {args.serve_budget_ms:.0f}ms)")
+            if serve_ms > args.serve_budget_ms:
+                failures.append(f"startup took {serve_ms:.0f}ms > {args.serve_budget_ms:.0f}ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Embedding runtime quality check
+在固定语料和查询集上对比 ONNX int8 与 PyTorch 两种运行时的 top-k 检索结果
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.embedding_quality
+    python -m benchmarks.embedding_quality --top-k 5 --min-overlap 0.9
+
+top-k 重合率低于 --min-overlap 时以非零状态退出。
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from services.embedding_service import EmbeddingService, OnnxEmbeddingService
+
+CORPUS = [
+    "函数是一种特殊的对应关系，对于定义域中的每一个 x，都有唯一的 y 与之对应。",
+    "一次函数的图像是一条直线，斜率 k 决定直线的倾斜程度。",
+    "二次函数 y = ax^2 + bx + c 的图像是一条抛物线，a 决定开口方向。",
+    "求函数 f(x) = 2x + 1 在 x = 3 时的值：f(3) = 7。",
+    "等差数列的通项公式为 a_n = a_1 + (n - 1)d。",
+    "等比数列前 n 项和公式为 S_n = a_1(1 - q^n) / (1 - q)，其中 q 不等于 1。",
+    "勾股定理：直角三角形两条直角边的平方和等于斜边的平方。",
+    "正弦定理：在任意三角形中，各边与其对角正弦值之比相等。",
+    "余弦定理可以用来在已知两边及其夹角时求第三边。",
+    "导数描述了函数在某一点处的瞬时变化率。",
+    "利用导数可以判断函数的单调性：导数大于零时函数递增。",
+    "定积分的几何意义是曲边梯形的面积。",
+    "牛顿第一定律：物体在不受外力时保持静止或匀速直线运动状态。",
+    "牛顿第二定律 F = ma 描述了力、质量与加速度之间的关系。",
+    "动能定理：合外力对物体所做的功等于物体动能的变化量。",
+    "机械能守恒的条件是只有重力或弹力做功。",
+    "欧姆定律 I = U / R 描述了电流、电压与电阻之间的关系。",
+    "化学反应速率受温度、浓度和催化剂的影响。",
+    "酸碱中和反应生成盐和水。",
+    "氧化还原反应的本质是电子的转移。",
+    "细胞是生物体结构和功能的基本单位。",
+    "光合作用将光能转化为化学能，储存在有机物中。",
+    "DNA 的双螺旋结构由沃森和克里克提出。",
+    "The derivative of sin(x) is cos(x).",
+    "Probability of two independent events both occurring is the product of their probabilities.",
+    "A vector has both magnitude and direction.",
+    "The area of a circle is pi times the radius squared.",
+    "Photosynthesis takes place in the chloroplasts of plant cells.",
+    "Newton's third law: for every action there is an equal and opposite reaction.",
+    "Logarithms are the inverse of exponential functions.",
+]
+
+QUERIES = [
+    "什么是函数？",
+    "抛物线的开口方向由什么决定？",
+    "等比数列求和公式",
+    "直角三角形三边关系",
+    "怎么判断函数单调递增",
+    "力和加速度的关系",
+    "电流电压电阻的公式",
+    "什么是氧化还原反应",
+    "What is the derivative of sine?",
+    "How do you compute the area of a circle?",
+    "where does photosynthesis happen",
+    "inverse of exponential function",
+]
+
+
+def _top_k(service: EmbeddingService, top_k: int):
+    corpus = np.asarray(service.embed_texts(CORPUS), dtype=np.float32)
+    start = time.perf_counter()
+    queries = np.asarray(service.embed_texts(QUERIES), dtype=np.float32)
+    query_ms = (time.perf_counter() - start) * 1000
+    scores = queries @ corpus.T
+    ranking = np.argsort(-scores, axis=1)[:, :top_k]
+    return corpus, queries, ranking, query_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX and PyTorch embedding runtimes")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    args = parser.parse_args()
+
+    results = {}
+    for name, factory in (("torch", EmbeddingService), ("onnx", OnnxEmbeddingService)):
+        start = time.perf_counter()
+        service = factory()
+        load_s = time.perf_counter() - start
+        results[name] = _top_k(service, args.top_k) + (load_s, service.stats())
+
+    torch_corpus, torch_queries, torch_rank = results["torch"][:3]
+    onnx_corpus, onnx_queries, onnx_rank = results["onnx"][:3]
+
+    overlaps = [
+        len(set(t) & set(o)) / args.top_k
+        for t, o in zip(torch_rank.tolist(), onnx_rank.tolist())
+    ]
+    top1_agree = float(np.mean(torch_rank[:, 0] == onnx_rank[:, 0]))
+    cosine = np.sum(torch_corpus * onnx_corpus, axis=1) / (
+        np.linalg.norm(torch_corpus, axis=1) * np.linalg.norm(onnx_corpus, axis=1)
+    )
+
+    for name in ("torch", "onnx"):
+        load_s, stats = results[name][4], results[name][5]
+        print(f"[Quality] {name}: load={load_s:.2f}s queries={results[name][3]:.1f}ms batches={stats}")
+    print(f"[Quality] top-{args.top_k} overlap: mean={np.mean(overlaps):.3f} min={min(overlaps):.3f}")
+    print(f"[Quality] top-1 agreement: {top1_agree:.3f}")
+    print(f"[Quality] corpus embedding cosine(torch, onnx): mean={cosine.mean():.4f} min={cosine.min():.4f}")
+
+    if np.mean(overlaps) < args.min_overlap:
+        print(f"[Quality] FAIL: mean overlap below {args.min_overlap}")
+        sys.exit(1)
+    print("[Quality] OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+End-to-end load test
+对 FastAPI 应用执行 上传 → 知识抽取 → 知识图谱 → 问答 的完整流程压测，AI 提供商使用本地 stub 服务
+
+用法（在 backend 目录下运行）:
+    # 自动启动 stub 服务和应用（临时数据目录），跑完后关闭
+    python -m benchmarks.load_test
+
+    # 调整规模
+    python -m benchmarks.load_test --documents 20 --pages 30 --concurrency 16 --questions 200
+
+    # 压测已在运行的应用（应用需自行配置指向 stub 或真实提供商）
+    python -m benchmarks.load_test --app-url http://127.0.0.1:8000
+
+    # 对比两次结果（p95 退化超过 --max-regression 时以非零状态退出）
+    python -m benchmarks.load_test --compare benchmarks/results/base.json benchmarks/results/new.json
+
+结果写入 benchmarks/results/<时间>-<commit>.json，包含各接口的吞吐量与 p50/p95/p99 延迟。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+WORDS = (
+    "function derivative integral limit vector matrix equation theorem proof example "
+    "velocity acceleration force energy momentum circuit voltage current resistance "
+    "reaction molecule element compound cell protein energy population sequence series"
+).split()
+
+QUESTIONS = [
+    "What is the definition of a derivative?",
+    "How do I compute the integral in example 2?",
+    "Explain the relationship between force and acceleration.",
+    "What does the theorem in chapter 1 state?",
+    "How is the sequence sum formula derived?",
+]
+
+
+# ==================== 样例 PDF ====================
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """
+    生成可被 PyPDF2 解析出文本的多页 PDF（Helvetica，ASCII 文本）
+
+    Args:
+        pages: 页数
+        lines_per_page: 每页行数
+        seed: 随机种子，不同种子生成不同内容
+
+    Returns:
+        PDF 字节
+    """
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for p in range(pages):
+        lines = [f"Chapter {p // 5 + 1} Section {p + 1}"]
+        lines += [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page - 1)]
+        stream = "BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# ==================== 统计 ====================
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+class EndpointStats:
+    """单个接口的延迟样本与状态码计数"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.started = None
+        self.finished = None
+
+    def record(self, started: float, latency: float, status: int):
+        self.started = started if self.started is None else min(self.started, started)
+        self.finished = max(self.finished or 0.0, started + latency)
+        self.latencies.append(latency)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        values = sorted(self.latencies)
+        wall = (self.finished - self.started) if self.latencies else 0.0
+        errors = sum(n for status, n in self.statuses.items() if not status.startswith("2"))
+        return {
+            "requests": len(values),
+            "errors": errors,
+            "statuses": self.statuses,
+            "throughput_rps": round(len(values) / wall, 2) if wall else None,
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "p99_ms": percentile(values, 0.99),
+            "max_ms": round(values[-1] * 1000, 2) if values else None,
+        }
+
+
+class LoadTest:
+    """按阶段并发发送请求"""
+
+    def __init__(self, client: httpx.AsyncClient, concurrency: int):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = {}
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                print(f"[LoadTest] {name} failed: {type(e).__name__}: {e}")
+                response, status = None, 0
+            self.stats.setdefault(name, EndpointStats()).record(started, time.perf_counter() - started, status)
+            return response
+
+    async def upload(self, documents: int, pages: int) -> List[str]:
+        async def one(i):
+            pdf = make_pdf(pages, seed=i)
+            response = await self.request(
+                "upload", "POST", "/api/documents/upload",
+                files={"file": (f"sample-{i}.pdf", pdf, "application/pdf")}
+            )
+            if response is not None and response.status_code == 200:
+                return response.json()["document_id"]
+            return None
+
+        ids = await asyncio.gather(*(one(i) for i in range(documents)))
+        return [i for i in ids if i]
+
+    async def extract(self, document_ids: List[str], repeats: int):
+        # 同一文档重复请求模拟全班同时打开同一份讲义
+        jobs = [doc for doc in document_ids for _ in range(repeats)]
+        random.shuffle(jobs)
+        await asyncio.gather(*(
+            self.request("extract", "POST", "/api/knowledge/extract", json={"document_id": doc})
+            for doc in jobs
+        ))
+
+    async def knowledge_map(self, document_ids: List[str], repeats: int):
+        await asyncio.gather(*(
+            self.request("map", "GET", "/api/knowledge/map", params={"document_id": doc})
+            for doc in document_ids for _ in range(repeats)
+        ))
+
+    async def ask(self, document_ids: List[str], questions: int):
+        await asyncio.gather(*(
+            self.request("ask", "POST", "/api/qa/ask", json={
+                "question": random.choice(QUESTIONS),
+                "document_id": random.choice(document_ids),
+            })
+            for _ in range(questions)
+        ))
+
+
+# ==================== 进程管理 ====================
+
+def _wait_ready(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def start_processes(args, workdir: str):
+    """启动 stub 服务和应用，返回 (进程列表, 应用地址)"""
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_server", "--port", str(args.stub_port),
+         "--latency", args.stub_latency, "--tokens-per-second", str(args.stub_tps),
+         "--error-rate", str(args.stub_error_rate), "--seed", str(args.seed)],
+        cwd=BACKEND_DIR
+    )
+    _wait_ready(f"{stub_url}/stub/stats")
+
+    env = dict(
+        os.environ,
+        DEEPSEEK_BASE_URL=stub_url,
+        MINIMAX_BASE_URL=f"{stub_url}/v1",
+        DEEPSEEK_API_KEY="stub",
+        MINIMAX_API_KEY="stub",
+        AI_PROVIDER=args.provider,
+        MOCK_MODE="false",
+        VECTOR_BACKEND=os.environ.get("VECTOR_BACKEND", "numpy"),
+        NUMPY_VECTOR_DIR=os.path.join(workdir, "vectors"),
+        CHROMADB_PERSIST_DIR=os.path.join(workdir, "chroma"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "embedding_cache.sqlite3"),
+        STATE_BACKEND=os.environ.get("STATE_BACKEND", "sqlite"),
+        STATE_PATH=os.path.join(workdir, "state.sqlite3"),
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+    )
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port),
+         "--workers", str(args.app_workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    _wait_ready(f"{app_url}/health")
+    return [app, stub], app_url
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, app_url: str) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, args.concurrency)
+        phases = {}
+
+        started = time.perf_counter()
+        document_ids = await test.upload(args.documents, args.pages)
+        phases["upload"] = time.perf_counter() - started
+        if not document_ids:
+            raise RuntimeError("No document uploaded successfully")
+
+        started = time.perf_counter()
+        await test.extract(document_ids, args.extract_repeats)
+        phases["extract"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await test.knowledge_map(document_ids, args.map_repeats)
+        phases["map"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await test.ask(document_ids, args.questions)
+        phases["ask"] = time.perf_counter() - started
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            key: getattr(args, key) for key in (
+                "documents", "pages", "concurrency", "extract_repeats", "map_repeats", "questions",
+                "provider", "stub_latency", "stub_tps", "stub_error_rate", "app_workers", "seed"
+            )
+        },
+        "phases_seconds": {name: round(seconds, 3) for name, seconds in phases.items()},
+        "endpoints": {name: stats.summary() for name, stats in test.stats.items()},
+    }
+
+
+def print_summary(result: Dict[str, Any]):
+    print(f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in result["endpoints"].items():
+        print(
+            f"{name:<10}{s['requests']:>10}{s['errors']:>8}{str(s['throughput_rps']):>10}"
+            f"{str(s['p50_ms']):>10}{str(s['p95_ms']):>10}{str(s['p99_ms']):>10}"
+        )
+
+
+def compare(base_path: str, new_path: str, max_regression: float) -> int:
+    """对比两次结果，p95 退化超过阈值的接口返回非零"""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"base: {base.get('commit')} {base.get('timestamp')}  new: {new.get('commit')} {new.get('timestamp')}")
+    print(f"{'endpoint':<10}{'metric':<16}{'base':>12}{'new':>12}{'change':>10}")
+    failed = []
+    for name in sorted(set(base["endpoints"]) | set(new["endpoints"])):
+        b, n = base["endpoints"].get(name), new["endpoints"].get(name)
+        if not b or not n:
+            print(f"{name:<10}(only in {'new' if n else 'base'})")
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors"):
+            old_value, new_value = b.get(metric), n.get(metric)
+            change = ""
+            if old_value and new_value is not None:
+                change = f"{(new_value - old_value) / old_value:+.1%}"
+            print(f"{name:<10}{metric:<16}{str(old_value):>12}{str(new_value):>12}{change:>10}")
+        if b.get("p95_ms") and n.get("p95_ms") and n["p95_ms"] > b["p95_ms"] * (1 + max_regression):
+            failed.append(name)
+
+    if failed:
+        print(f"p95 regression > {max_regression:.0%}: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test")
+    parser.add_argument("--app-url", help="压测已运行的应用；不指定时自动启动 stub 服务和应用")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--extract-repeats", type=int, default=5, help="每个文档的并发抽取请求数")
+    parser.add_argument("--map-repeats", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--provider", default="deepseek")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-latency", default="lognormal:600,0.4")
+    parser.add_argument("--stub-tps", type=float, default=80.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/<时间>-<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="对比两份结果")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(args.compare[0], args.compare[1], args.max_regression))
+
+    random.seed(args.seed)
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        try:
+            if args.app_url:
+                app_url = args.app_url
+            else:
+                processes, app_url = start_processes(args, workdir)
+            result = asyncio.run(run(args, app_url))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    print_summary(result)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{result['commit'] or 'unknown'}.json"
+        output = os.path.join(RESULTS_DIR, name)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Service hot-path microbenchmarks
+在固定的合成输入（10~1000 页、10~50k 图节点）上测量核心服务函数的耗时与峰值内存，完全离线运行
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.microbench
+    python -m benchmarks.microbench --only graph --quick
+    python -m benchmarks.microbench --save benchmarks/results/micro-base.json
+    python -m benchmarks.microbench --baseline benchmarks/results/micro-base.json --tolerance 0.25
+
+指定 --baseline 时，任一用例的中位耗时或峰值内存超过基线 (1 + tolerance) 倍则以非零状态退出。
+嵌入模型未在本地缓存（或未安装 sentence-transformers / onnxruntime）时，依赖模型的用例标记为 skipped。
+"""
+import os
+
+# 基准测试不访问网络：提供商保持 mock，模型只从本地缓存加载
+os.environ.setdefault("MOCK_MODE", "true")
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import gc
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.load_test import make_pdf, WORDS
+from services.document_service import DocumentService
+from services.graph_service import GraphService
+
+PAGE_SIZES = [10, 100, 1000]
+NODE_SIZES = [10, 1000, 10000, 50000]
+NORMALIZE_SIZES = [10, 1000, 10000]
+EMBED_SIZES = [10, 100, 1000]
+SEARCH_PAGES = [10, 100, 1000]
+CHUNKS_PER_PAGE = 5
+EMBEDDING_DIM = 384
+
+
+class Skip(Exception):
+    """用例在当前环境下无法运行（如模型不可用）"""
+
+
+class Case:
+    """一个基准用例：setup 准备输入（不计时），run 为被测函数"""
+
+    def __init__(self, group: str, size: int, setup: Callable[[], Any], run: Callable[[Any], Any]):
+        self.group = group
+        self.size = size
+        self.setup = setup
+        self.run = run
+
+    @property
+    def name(self) -> str:
+        return f"{self.group}[{self.size}]"
+
+
+# ==================== 合成输入 ====================
+
+def synthetic_text(pages: int, seed: int = 0) -> str:
+    """与 make_pdf 同分布的纯文本（每页约 40 行）"""
+    rng = random.Random(seed)
+    lines = []
+    for p in range(pages):
+        lines.append(f"Chapter {p // 5 + 1} Section {p + 1}")
+        lines += [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(39)]
+    return "\n".join(lines)
+
+
+def synthetic_knowledge(nodes: int) -> Dict[str, Any]:
+    """生成约 nodes 个图节点的知识结构（每章 10 个主题，每个主题 2 个公式 + 2 个例题）"""
+    chapters, count = [], 0
+    while count < nodes:
+        c = len(chapters) + 1
+        chapter = {"id": f"c{c}", "title": f"Chapter {c}", "content": "", "topics": []}
+        chapters.append(chapter)
+        count += 1
+        for t in range(1, 11):
+            if count >= nodes:
+                break
+            prefix = f"c{c}t{t}"
+            chapter["topics"].append({
+                "id": prefix,
+                "title": f"Topic {c}.{t}",
+                "content": "topic content " * 5,
+                "formulas": [{"id": f"{prefix}f{i}", "content": f"y = {i}x + {t}"} for i in range(2)],
+                "examples": [{"id": f"{prefix}e{i}", "content": f"example {i}"} for i in range(2)],
+            })
+            count += 5
+    return {"chapters": chapters}
+
+
+def synthetic_provider_payloads(items: int) -> List[Any]:
+    """覆盖 _normalize_knowledge_format 各分支的模型输出"""
+    return [
+        [{"id": f"c{i}", "title": f"Chapter {i}", "content": "x" * 50} for i in range(items)],
+        {"knowledge_structure": [{"title": f"Chapter {i}", "content": "x" * 50} for i in range(items)]},
+        {
+            "course": "Math",
+            "unit": "Unit 1",
+            "sections": [{"title": f"Section {i}", "definition": "d" * 50, "types": ["a", "b"]} for i in range(items)],
+        },
+    ]
+
+
+# ==================== 用例 ====================
+
+_embedding_service = None
+
+
+def _embedding():
+    """加载嵌入模型（仅一次）；不可用时跳过"""
+    global _embedding_service
+    if _embedding_service is None:
+        from services.embedding_service import get_embedding_service
+        try:
+            _embedding_service = get_embedding_service()
+        except Exception as e:
+            _embedding_service = e
+    if isinstance(_embedding_service, Exception):
+        raise Skip(f"embedding model unavailable: {type(_embedding_service).__name__}: {_embedding_service}")
+    return _embedding_service
+
+
+def _provider(name: str):
+    """不经过 __init__ 构造提供商实例（_normalize_knowledge_format 不依赖客户端）"""
+    if name == "deepseek":
+        from services.deepseek_service import DeepSeekService
+        return object.__new__(DeepSeekService)
+    from services.minimax_service import MiniMaxService
+    return object.__new__(MiniMaxService)
+
+
+def _search_setup(pages: int, workdir: str):
+    from services.rag_service import RAGService
+    from services.vector_store import NumpyVectorStore
+
+    service = _embedding()
+    service.cache = None  # 每次查询都走模型，与首次提问一致
+    rag = RAGService()
+    rag.vector_store = NumpyVectorStore(workdir)
+
+    # 检索耗时与向量内容无关：用随机单位向量建索引，只有查询嵌入走真实模型
+    n = pages * CHUNKS_PER_PAGE
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    rag.vector_store.add(f"doc-{pages}", [f"chunk {i} " + "x" * 480 for i in range(n)], vectors.tolist())
+    return rag, pages
+
+
+def build_cases(workdir: str) -> List[Case]:
+    documents = DocumentService()
+    cases = []
+
+    for pages in PAGE_SIZES:
+        cases.append(Case("parse_pdf", pages, lambda p=pages: make_pdf(p, seed=p), documents.parse_pdf))
+        cases.append(Case("chunk_text", pages, lambda p=pages: synthetic_text(p, seed=p), documents.chunk_text))
+
+    for n in EMBED_SIZES:
+        def embed_setup(n=n):
+            service = _embedding()
+            service.cache = None  # 测量模型本身，不命中缓存
+            return service, [f"sample text {i} " + " ".join(WORDS[i % len(WORDS):]) for i in range(n)]
+        cases.append(Case("embed_texts", n, embed_setup, lambda args: args[0].embed_texts(args[1])))
+
+    for pages in SEARCH_PAGES:
+        cases.append(Case(
+            "rag_search", pages,
+            lambda p=pages: _search_setup(p, os.path.join(workdir, f"search-{p}")),
+            lambda args: args[0].search(f"doc-{args[1]}", "What is the derivative of a function?", top_k=5)
+        ))
+
+    for nodes in NODE_SIZES:
+        cases.append(Case(
+            "build_graph", nodes,
+            lambda n=nodes: (GraphService(), synthetic_knowledge(n)),
+            lambda args: args[0].build_graph(args[1])
+        ))
+
+        def edges_setup(n=nodes):
+            service = GraphService()
+            return service, service.build_graph(synthetic_knowledge(n))
+        cases.append(Case(
+            "get_nodes_and_edges", nodes, edges_setup,
+            lambda args: args[0].get_nodes_and_edges(args[1])
+        ))
+
+    for provider in ("deepseek", "minimax"):
+        for items in NORMALIZE_SIZES:
+            cases.append(Case(
+                f"normalize_{provider}", items,
+                lambda p=provider, n=items: (_provider(p), synthetic_provider_payloads(n)),
+                lambda args: [args[0]._normalize_knowledge_format(payload) for payload in args[1]]
+            ))
+
+    return cases
+
+
+# ==================== 测量 ====================
+
+def measure(case: Case, repeat: int, max_seconds: float) -> Dict[str, Any]:
+    """
+    运行一个用例
+
+    Returns:
+        耗时（最小 / 中位，毫秒）、运行次数、tracemalloc 峰值内存（MB）
+    """
+    args = case.setup()
+    case.run(args)  # 预热
+
+    timings = []
+    budget_end = time.perf_counter() + max_seconds
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        case.run(args)
+        timings.append(time.perf_counter() - started)
+        if time.perf_counter() > budget_end:
+            break
+
+    # 单独一轮测峰值内存（tracemalloc 本身有开销，不计入耗时）
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    case.run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "runs": len(timings),
+        "peak_mb": round(peak / 1024 / 1024, 3),
+    }
+
+
+def gate(results: Dict[str, Any], baseline_path: str, tolerance: float) -> List[str]:
+    """与基线对比，返回超出容差的用例"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["cases"]
+
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "skipped" in base or "skipped" in result:
+            continue
+        for metric in ("median_ms", "peak_mb"):
+            # 极小值受噪声影响大，设下限
+            floor = 1.0 if metric == "median_ms" else 0.5
+            limit = max(base[metric], floor) * (1 + tolerance)
+            if result[metric] > limit:
+                failures.append(f"{name} {metric}: {base[metric]} -> {result[metric]} (limit {limit:.3f})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service hot-path microbenchmarks")
+    parser.add_argument("--only", help="只运行名称包含该字符串的用例（逗号分隔多个）")
+    parser.add_argument("--quick", action="store_true", help="每组只运行最小规模")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="单个用例计时阶段的时间上限")
+    parser.add_argument("--save", help="结果 JSON 路径")
+    parser.add_argument("--baseline", help="基线结果 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="microbench-")
+    try:
+        cases = build_cases(workdir)
+        if args.only:
+            patterns = args.only.split(",")
+            cases = [c for c in cases if any(p in c.name for p in patterns)]
+        if args.quick:
+            smallest = {}
+            for case in cases:
+                smallest[case.group] = min(smallest.get(case.group, case.size), case.size)
+            cases = [c for c in cases if c.size == smallest[c.group]]
+
+        results = {}
+        print(f"{'case':<32}{'median ms':>12}{'min ms':>12}{'runs':>6}{'peak MB':>10}")
+        for case in cases:
+            try:
+                result = measure(case, args.repeat, args.max_seconds)
+            except Skip as e:
+                result = {"skipped": str(e)}
+                print(f"{case.name:<32}skipped ({e})")
+            else:
+                print(
+                    f"{case.name:<32}{result['median_ms']:>12}{result['min_ms']:>12}"
+                    f"{result['runs']:>6}{result['peak_mb']:>10}"
+                )
+            results[case.name] = result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "cases": results}, f, indent=2)
+        print(f"Results written to {args.save}")
+
+    if args.baseline:
+        failures = gate(results, args.baseline, args.tolerance)
+        if failures:
+            print("Regressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+LLM provider stub server
+本地模拟 DeepSeek（OpenAI chat completions，含流式）与 MiniMax text/chatcompletion_v2 协议，
+用于无外网环境下的端到端压测：请求经过真实的 HTTP 客户端、连接池、准入层和 JSON 解析
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.stub_server --port 9100
+    python -m benchmarks.stub_server --latency lognormal:800,0.5 --tokens-per-second 60 --error-rate 0.05
+
+然后让后端指向它:
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9100 MINIMAX_BASE_URL=http://127.0.0.1:9100/v1 \\
+        DEEPSEEK_API_KEY=stub MINIMAX_API_KEY=stub uvicorn main:app
+
+延迟分布:
+    fixed:MS               固定首字延迟
+    uniform:LO,HI          均匀分布（毫秒）
+    lognormal:MEDIAN,SIGMA 对数正态分布（中位数毫秒，形状参数），模拟长尾
+
+运行中可通过 POST /stub/config 修改参数（JSON，字段同命令行参数），GET /stub/stats 查看请求计数。
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# MiniMax 限流在 base_resp 中返回（HTTP 200）
+MINIMAX_RATE_LIMIT_CODE = 1002
+
+# 用于判断请求是否为知识抽取（返回 JSON 而不是自然语言回答）
+KNOWLEDGE_MARKERS = ("知识归纳", "knowledge")
+
+ANSWER_SENTENCES = [
+    "根据教材内容，这个问题可以从定义出发理解。",
+    "首先明确题目给出的已知条件，再选择合适的公式。",
+    "函数的单调性可以通过导数的符号来判断。",
+    "代入数值计算即可得到结果，注意单位换算。",
+    "这一知识点在后续章节中还会反复用到。",
+]
+
+
+def default_knowledge(chapters: int = 4, topics: int = 3) -> Dict[str, Any]:
+    """生成层级完整的知识结构（章节 / 主题 / 公式 / 例题）"""
+    result = []
+    for c in range(1, chapters + 1):
+        chapter_topics = []
+        for t in range(1, topics + 1):
+            chapter_topics.append({
+                "id": f"c{c}t{t}",
+                "title": f"第{c}章 主题{t}",
+                "content": f"第{c}章第{t}个主题的要点概述。" * 3,
+                "formulas": [
+                    {"id": f"c{c}t{t}f1", "content": f"y = {c}x + {t}", "description": "线性关系"},
+                ],
+                "examples": [
+                    {"id": f"c{c}t{t}e1", "content": f"求 x={t} 时 y 的值", "solution": f"y = {c * t + t}"},
+                ],
+            })
+        result.append({
+            "id": f"c{c}",
+            "title": f"第{c}章",
+            "content": f"第{c}章的内容概述。",
+            "topics": chapter_topics,
+        })
+    return {"chapters": result}
+
+
+class StubConfig:
+    """可在运行中修改的模拟参数"""
+
+    def __init__(
+        self,
+        latency: str = "lognormal:600,0.4",
+        tokens_per_second: float = 80.0,
+        answer_tokens: int = 200,
+        error_rate: float = 0.0,
+        error_statuses: str = "429,500,503",
+        knowledge: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.knowledge = knowledge or default_knowledge()
+        self.random = random.Random(seed)
+
+    def update(self, values: Dict[str, Any]):
+        for key in ("latency", "tokens_per_second", "answer_tokens", "error_rate", "error_statuses", "knowledge"):
+            if key in values:
+                setattr(self, key, values[key])
+        # 提前校验，避免错误的分布字符串在请求路径上才报错
+        self.sample_latency()
+
+    def sample_latency(self) -> float:
+        """按配置的分布采样首字延迟（秒）"""
+        kind, _, params = self.latency.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed":
+            ms = values[0]
+        elif kind == "uniform":
+            ms = self.random.uniform(values[0], values[1])
+        elif kind == "lognormal":
+            ms = self.random.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.latency}")
+        return ms / 1000
+
+    def sample_error(self) -> Optional[int]:
+        """按错误率返回要注入的 HTTP 状态码，不注入时返回 None"""
+        if self.error_rate <= 0 or self.random.random() >= self.error_rate:
+            return None
+        statuses = [int(s) for s in str(self.error_statuses).split(",") if s]
+        return self.random.choice(statuses)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "tokens_per_second": self.tokens_per_second,
+            "answer_tokens": self.answer_tokens,
+            "error_rate": self.error_rate,
+            "error_statuses": self.error_statuses,
+        }
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 2)
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _completion_text(config: StubConfig, prompt: str) -> str:
+    """知识抽取请求返回知识 JSON，其余返回长度约为 answer_tokens 的回答"""
+    if any(marker in prompt for marker in KNOWLEDGE_MARKERS):
+        return json.dumps(config.knowledge, ensure_ascii=False)
+    sentences = []
+    while _count_tokens("".join(sentences)) < config.answer_tokens:
+        sentences.append(config.random.choice(ANSWER_SENTENCES))
+    return "".join(sentences)
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="LLM provider stub")
+    stats = {"requests": 0, "errors": 0, "streams": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def simulate(prompt: str):
+        """等待首字延迟，返回 (注入的错误状态码, 回答文本)"""
+        await asyncio.sleep(config.sample_latency())
+        return config.sample_error(), _completion_text(config, prompt)
+
+    def generation_seconds(text: str) -> float:
+        if config.tokens_per_second <= 0:
+            return 0.0
+        return _count_tokens(text) / config.tokens_per_second
+
+    def usage(prompt: str, text: str) -> Dict[str, int]:
+        prompt_tokens, completion_tokens = _count_tokens(prompt), _count_tokens(text)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    @app.middleware("http")
+    async def track(request: Request, call_next):
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            return await call_next(request)
+        finally:
+            stats["in_flight"] -= 1
+
+    async def openai_chat(request: Request):
+        body = await request.json()
+        prompt = _prompt_text(body.get("messages", []))
+        error, text = await simulate(prompt)
+        if error is not None:
+            stats["errors"] += 1
+            headers = {"Retry-After": "1"} if error == 429 else {}
+            return JSONResponse(
+                status_code=error,
+                content={"error": {"message": f"stub injected {error}", "type": "stub_error"}},
+                headers=headers
+            )
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "deepseek-chat")
+        created = int(time.time())
+
+        if body.get("stream"):
+            stats["streams"] += 1
+
+            async def events():
+                pieces = [text[i:i + 8] for i in range(0, len(text), 8)]
+                delay = generation_seconds(text) / max(1, len(pieces))
+                for i, piece in enumerate(pieces):
+                    delta = {"content": piece}
+                    if i == 0:
+                        delta["role"] = "assistant"
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(delay)
+                final = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "usage": usage(prompt, text),
+                }
+                yield f"data: {json.dumps(final, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(generation_seconds(text))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(prompt, text),
+        }
+
+    async def minimax_chat(request: Request):
+        body = await request.json()
+        prompt = _prompt_text(body.get("messages", []))
+        error, text = await simulate(prompt)
+        if error == 429:
+            stats["errors"] += 1
+            return {"base_resp": {"status_code": MINIMAX_RATE_LIMIT_CODE, "status_msg": "rate limit exceeded"}}
+        if error is not None:
+            stats["errors"] += 1
+            return JSONResponse(status_code=error, content={"base_resp": {"status_code": error, "status_msg": "stub error"}})
+
+        await asyncio.sleep(generation_seconds(text))
+        return {
+            "id": uuid.uuid4().hex,
+            "created": int(time.time()),
+            "model": body.get("model", "abab5.5-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": usage(prompt, text),
+            "base_resp": {"status_code": 0, "status_msg": "success"},
+        }
+
+    # DeepSeek 客户端请求 {base}/chat/completions，MiniMax 请求 {base}/text/chatcompletion_v2，
+    # base_url 带不带 /v1 都能对上
+    for prefix in ("", "/v1"):
+        app.add_api_route(f"{prefix}/chat/completions", openai_chat, methods=["POST"])
+        app.add_api_route(f"{prefix}/text/chatcompletion_v2", minimax_chat, methods=["POST"])
+
+    @app.get("/stub/stats")
+    async def get_stats():
+        return {**stats, "config": config.as_dict()}
+
+    @app.post("/stub/config")
+    async def set_config(request: Request):
+        try:
+            config.update(await request.json())
+        except (ValueError, IndexError) as e:
+            return JSONResponse(status_code=400, content={"detail": str(e)})
+        return config.as_dict()
+
+    @app.post("/stub/reset")
+    async def reset_stats():
+        for key in ("requests", "errors", "streams", "max_in_flight"):
+            stats[key] = 0
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM provider stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:600,0.4", help="首字延迟分布")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="输出速率，0 表示不模拟")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="问答回答的大致令牌数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的比例")
+    parser.add_argument("--error-statuses", default="429,500,503", help="注入错误的状态码，逗号分隔")
+    parser.add_argument("--knowledge-file", help="知识抽取返回的 JSON 文件，默认使用内置结构")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    knowledge = None
+    if args.knowledge_file:
+        with open(args.knowledge_file, encoding="utf-8") as f:
+            knowledge = json.load(f)
+
+    config = StubConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        knowledge=knowledge,
+        seed=args.seed,
+    )
+    config.sample_latency()
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,37 @@
 """
 StudyFlow AI Backend - Main Application
 """
-from fastapi import FastAPI
+import random
+import re
+import time
+from app.logging_config import (
+    setup_logging, shutdown_logging, new_request_id, set_request_id, reset_request_id, REQUEST_ID_HEADER
+)
+
+# 在导入各服务之前配置日志，服务初始化时的日志也走异步队列
+setup_logging()
+
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._\-]{1,64}")
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import documents, knowledge, qa
+from fastapi.responses import Response, ORJSONResponse
+from app.routers import documents, knowledge, qa, profiles
+from app.compression import CompressionMiddleware
+from app.config import (
+    PROFILING_TOKEN, PROFILING_SAMPLE_RATE, WARMUP_ENABLED, SNAPSHOT_ENABLED,
+    COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+)
+from app.services import warmup, snapshotter
+from services import metrics
+from services.profiler import profile_request
 
 app = FastAPI(
     title="StudyFlow AI API",
     description="智能助学系统后端 API",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson 序列化：大文档正文、知识图谱等响应比标准 json 编码器快数倍
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -20,10 +43,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """按路由模板（而非实际路径）记录请求延迟，避免文档 ID 造成标签爆炸"""
+    metrics.HTTP_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+        metrics.HTTP_IN_FLIGHT.dec()
+
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """
+    按需剖析请求：请求头 X-Profile 与 PROFILING_TOKEN 一致，或按 PROFILING_SAMPLE_RATE 随机采样；
+    结果 ID 通过响应头 X-Profile-Id 返回，可从 /api/profiles 获取
+    """
+    path = request.url.path
+    requested = bool(PROFILING_TOKEN) and request.headers.get("x-profile") == PROFILING_TOKEN
+    sampled = PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+    if not (requested or sampled) or not path.startswith("/api/") or path.startswith("/api/profiles"):
+        return await call_next(request)
+
+    async with profile_request(request.method, path) as profile:
+        response = await call_next(request)
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """为每个请求绑定关联 ID（沿用调用方传入的 X-Request-ID），该请求的所有日志都带上它"""
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")
+    if not _REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = new_request_id()
+    token = set_request_id(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        reset_request_id(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+# 最后添加、位于最外层：压缩最终的响应体
+if COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=COMPRESSION_GZIP_LEVEL,
+        brotli_quality=COMPRESSION_BROTLI_QUALITY
+    )
+
+
 # Include routers
 app.include_router(documents.router)
 app.include_router(knowledge.router)
 app.include_router(qa.router)
+app.include_router(profiles.router)
+
+
+@app.on_event("startup")
+def restore_snapshot():
+    # 在接受连接之前恢复，避免请求看到空的状态
+    if SNAPSHOT_ENABLED:
+        snapshotter.restore()
+        snapshotter.start()
+
+
+@app.on_event("startup")
+def start_warmup():
+    # 不等待预热完成即开始接受连接，进度见 /ready
+    warmup.start(WARMUP_ENABLED)
+
+
+@app.on_event("shutdown")
+def flush_snapshot():
+    if SNAPSHOT_ENABLED:
+        snapshotter.stop(flush=True)
+
+
+@app.on_event("shutdown")
+def flush_logs():
+    shutdown_logging()
 
 
 @app.get("/")
@@ -36,12 +150,28 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 指标"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    就绪检查：后台预热全部完成后返回 200，否则返回 503 及各步骤进度
+    （/health 只表示进程存活）
+    """
+    status = warmup.status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
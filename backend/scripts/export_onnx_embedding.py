@@ -0,0 +1,86 @@
+"""
+Export the embedding model to an int8-quantized ONNX graph
+导出 ONNX 嵌入模型（需要 torch + transformers + onnxruntime，仅在构建机上运行一次）
+
+用法（在 backend 目录下运行）:
+    python -m scripts.export_onnx_embedding
+    python -m scripts.export_onnx_embedding --output ./data/models/all-MiniLM-L6-v2-onnx
+"""
+import argparse
+import json
+import os
+
+from app.config import EMBEDDING_ONNX_DIR
+from services.embedding_service import (
+    EMBEDDING_MODEL,
+    MAX_SEQ_LENGTH,
+    ONNX_MODEL_FILE,
+)
+
+
+def export(output_dir: str, opset: int = 14):
+    """
+    导出并量化模型
+
+    Args:
+        output_dir: 输出目录
+        opset: ONNX opset 版本
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+
+    print(f"[Export] Loading {EMBEDDING_MODEL}...")
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL)
+    model.eval()
+
+    sample = tokenizer(
+        ["导出样例 export sample"],
+        padding="max_length",
+        truncation=True,
+        max_length=MAX_SEQ_LENGTH,
+        return_tensors="pt"
+    )
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"[Export] Writing {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    print(f"[Export] Quantizing to int8: {int8_path}...")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+    # tokenizer.json 供 tokenizers 库直接加载
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "export_info.json"), "w") as f:
+        json.dump({"source_model": EMBEDDING_MODEL, "opset": opset, "quantization": "dynamic-int8"}, f, indent=2)
+
+    print(f"[Export] Done: {os.path.getsize(int8_path) / 1e6:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export int8 ONNX embedding model")
+    parser.add_argument("--output", default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export(args.output, args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Endpoint admission control
+按端点分组的准入池：限制同时执行的请求数，超出时在有界队列中等待；
+队列已满返回 429，等待超时返回 503，均附带建议的重试秒数。
+等待中的交互类请求（问答）优先于批量类请求（上传、抽取、批量索引）获得执行名额
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Dict, Optional
+
+from app.config import ADMISSION_LIMITS, ADMISSION_QUEUE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 优先级：数值越小越先执行
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    """请求未获准入"""
+
+    def __init__(self, pool: str, status_code: int, retry_after: float, reason: str):
+        super().__init__(f"{pool}: {reason}")
+        self.pool = pool
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionPool:
+    """
+    单个端点组的准入池
+
+    只在事件循环线程中使用（无需加锁）；多 worker 部署时每个进程各自限流。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT
+    ):
+        """
+        Args:
+            name: 端点组名称
+            max_concurrent: 最大同时执行数，0 表示不限
+            max_queue: 最大排队数，0 表示不排队（满即拒绝）
+            queue_timeout: 排队最长等待秒数
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # (优先级, 序号, future)
+        self._waiters = []
+        self._sequence = itertools.count()
+        # 平均占用时长（指数滑动平均，秒），用于估算 Retry-After
+        self._avg_hold = 1.0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+    def retry_after(self) -> float:
+        """按排队长度和平均占用时长估算的重试等待秒数"""
+        slots = max(1, self.max_concurrent)
+        return max(1.0, self._avg_hold * (self.queued + slots) / slots)
+
+    def _reject(self, reason: str, status_code: int) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        logger.warning(
+            "Admission rejected for %s (%s): active=%d queued=%d", self.name, reason, self.active, self.queued
+        )
+        return AdmissionRejected(self.name, status_code, self.retry_after(), reason)
+
+    async def acquire(self, priority: int = PRIORITIES["batch"]):
+        """
+        获取执行名额，必要时排队
+
+        Raises:
+            AdmissionRejected: 队列已满（429）或等待超时（503）
+        """
+        if self.max_concurrent <= 0 or (self.active < self.max_concurrent and not self.queued):
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full", 429)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # 超时与获得名额同时发生：已经拿到名额，照常执行
+                self.admitted += 1
+                return
+            future.cancel()
+            raise self._reject("timeout", 503)
+        except asyncio.CancelledError:
+            # 客户端断开：若名额已转交给本请求，归还名额
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        self.admitted += 1
+
+    def release(self, held_seconds: Optional[float] = None):
+        """
+        归还名额，并转交给优先级最高的等待者
+
+        Args:
+            held_seconds: 本次占用时长，用于估算 Retry-After
+        """
+        if held_seconds is not None:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_seconds
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # 名额直接转交，active 不变
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_hold_seconds": round(self._avg_hold, 3),
+        }
+
+
+_pools: Dict[str, AdmissionPool] = {}
+
+
+def get_admission_pool(name: str) -> AdmissionPool:
+    """按端点组名称获取准入池（限额来自 ADMISSION_LIMITS，未配置的组不限流）"""
+    pool = _pools.get(name)
+    if pool is None:
+        limits = ADMISSION_LIMITS.get(name, {"max_concurrent": 0, "max_queue": 0})
+        pool = _pools[name] = AdmissionPool(name, limits["max_concurrent"], limits["max_queue"])
+    return pool
+
+
+def all_admission_pools() -> Dict[str, AdmissionPool]:
+    return dict(_pools)
+
+
+def priority_of(value: Optional[str], default: str) -> int:
+    """请求头 X-Priority 的值 -> 优先级数值；无效值使用端点默认类别"""
+    return PRIORITIES.get((value or "").strip().lower(), PRIORITIES[default])
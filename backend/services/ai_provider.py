@@ -6,6 +6,20 @@ from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional
 
 
+class ProviderError(Exception):
+    """AI 提供商调用失败"""
+
+    def __init__(self, provider: str, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+
+
+class ProviderUnavailableError(ProviderError):
+    """AI 提供商暂时不可用（限流、重试耗尽等），稍后重试可能成功"""
+    pass
+
+
 class AIProvider(ABC):
     """AI 提供商抽象基类"""
 
@@ -29,6 +43,27 @@ class AIProvider(ABC):
         """
         pass
 
+    def chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> str:
+        """
+        多轮对话
+
+        默认把除最后一条外的消息并入系统提示词后调用 generate_text；
+        支持消息列表的提供商应覆盖本方法，以便命中提供商侧的前缀缓存
+
+        Args:
+            messages: OpenAI 格式的消息列表（role / content），最后一条为用户消息
+            **kwargs: 其他参数
+
+        Returns:
+            生成的文本
+        """
+        history = "\n\n".join(f"[{m['role']}]\n{m['content']}" for m in messages[:-1])
+        return self.generate_text(history, messages[-1]["content"], **kwargs)
+
     @abstractmethod
     def extract_knowledge(
         self,
@@ -125,6 +160,12 @@ class AIProvider(ABC):
         """
         pass
 
+    def preconnect(self):
+        """
+        预先建立到提供商的连接（预热连接池），默认不做任何事
+        """
+        pass
+
     @property
     @abstractmethod
     def provider_name(self) -> str:
@@ -145,10 +186,9 @@ class AIServiceSelector:
         初始化选择器
 
         Args AI:
-            provider: 提供商 "minimax" | "deepseek"
+            provider: 提供商 "minimax" | "deepseek" | "both"
         """
         self.provider = provider
-        self._service = None
 
     def get_service(self) -> AIProvider:
         """
@@ -157,28 +197,16 @@ class AIServiceSelector:
         Returns:
             AIProvider 实现类
         """
-        if self._service is not None:
-            return self._service
-
-        if self.provider == "minimax":
-            from services.minimax_service import MiniMaxService
-            self._service = MiniMaxService()
-        elif self.provider == "deepseek":
-            from services.deepseek_service import DeepSeekService
-            self._service = DeepSeekService()
-        else:
-            # 默认使用 DeepSeek
-            from services.deepseek_service import DeepSeekService
-            self._service = DeepSeekService()
-
-        return self._service
+        # 实例由注册表统一持有，切换提供商不会丢弃已初始化的客户端
+        from services.provider_registry import get_provider, PROVIDERS
+        # 未知提供商默认使用 DeepSeek
+        return get_provider(self.provider if self.provider in PROVIDERS else "deepseek")
 
     def switch_provider(self, provider: str):
         """
         切换 AI 提供商
 
         Args:
-            provider: 新提供商 "minimax" | "deepseek"
+            provider: 新提供商 "minimax" | "deepseek" | "both"
         """
         self.provider = provider
-        self._service = None  # 清除缓存，，下次获取时重新创建
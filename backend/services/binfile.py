@@ -0,0 +1,180 @@
+"""
+Sectioned binary files
+带版本号和校验和的分段二进制文件，供状态快照、文档包等使用。
+读取时内存映射整个文件，各段以 memoryview 返回，不复制数据
+
+文件布局（小端）:
+    header   magic(8s) version(u16) section_count(u16) reserved(u32)
+    table    每段一项: name(32s) offset(u64) length(u64) crc32(u32) padding(4)
+    data     各段数据，起始偏移按 8 字节对齐（可直接 np.frombuffer）
+"""
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+HEADER = struct.Struct("<8sHHI")
+SECTION = struct.Struct("<32sQQI4x")
+RECORD = struct.Struct("<II")
+ALIGNMENT = 8
+
+
+class BinFileError(ValueError):
+    """文件格式、版本或校验和不符"""
+    pass
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_sections(path: str, magic: bytes, version: int, sections: Dict[str, bytes]):
+    """
+    写入分段文件：先写临时文件并 fsync，再原子替换，读者不会看到半写入的文件
+
+    Args:
+        path: 目标路径
+        magic: 8 字节文件类型标识
+        version: 格式版本号
+        sections: 段名 -> 数据（bytes / bytearray / memoryview / 连续的 numpy 数组）
+    """
+    if len(magic) != 8:
+        raise ValueError("magic must be 8 bytes")
+
+    views = {name: memoryview(data).cast("B") for name, data in sections.items()}
+    offset = _align(HEADER.size + SECTION.size * len(views))
+    table = []
+    for name, view in views.items():
+        encoded = name.encode("utf-8")
+        if len(encoded) > 32:
+            raise ValueError(f"Section name too long: {name}")
+        table.append(SECTION.pack(encoded, offset, view.nbytes, zlib.crc32(view)))
+        offset = _align(offset + view.nbytes)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(magic, version, len(views), 0))
+            f.write(b"".join(table))
+            for view in views.values():
+                f.write(b"\0" * (_align(f.tell()) - f.tell()))
+                f.write(view)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class SectionFile:
+    """
+    以只读方式内存映射的分段文件
+
+    段数据在首次访问时校验 CRC32；使用完毕后调用 close()（或 with 语句），
+    关闭前需先释放取得的 memoryview。
+    """
+
+    def __init__(self, path: str, magic: bytes, versions: Iterable[int]):
+        """
+        Args:
+            path: 文件路径
+            magic: 期望的文件类型标识
+            versions: 支持读取的格式版本
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse(magic, set(versions))
+        except Exception:
+            self._mmap.close()
+            raise
+        self._verified = set()
+
+    def _parse(self, magic: bytes, versions: set):
+        size = len(self._mmap)
+        if size < HEADER.size:
+            raise BinFileError(f"{self.path}: file too short")
+        file_magic, self.version, count, _ = HEADER.unpack_from(self._mmap, 0)
+        if file_magic != magic:
+            raise BinFileError(f"{self.path}: not a {magic!r} file")
+        if self.version not in versions:
+            raise BinFileError(f"{self.path}: unsupported version {self.version}")
+
+        self._sections: Dict[str, Tuple[int, int, int]] = {}
+        for i in range(count):
+            position = HEADER.size + i * SECTION.size
+            if position + SECTION.size > size:
+                raise BinFileError(f"{self.path}: truncated section table")
+            raw_name, offset, length, crc = SECTION.unpack_from(self._mmap, position)
+            if offset + length > size:
+                raise BinFileError(f"{self.path}: truncated file")
+            self._sections[raw_name.rstrip(b"\0").decode("utf-8")] = (offset, length, crc)
+
+    def names(self) -> List[str]:
+        return list(self._sections)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def section(self, name: str) -> memoryview:
+        """
+        取得段数据（不复制）
+
+        Raises:
+            KeyError: 段不存在
+            BinFileError: 校验和不符
+        """
+        offset, length, crc = self._sections[name]
+        view = memoryview(self._mmap)[offset:offset + length]
+        if name not in self._verified:
+            if zlib.crc32(view) != crc:
+                view.release()
+                raise BinFileError(f"{self.path}: checksum mismatch in section {name}")
+            self._verified.add(name)
+        return view
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有未释放的 memoryview（如 numpy 零拷贝数组），映射随其回收
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pack_records(records: Iterable[Tuple[bytes, bytes]]) -> bytes:
+    """把 (key, value) 字节对序列编码为一段：每条记录 key_len(u32) value_len(u32) key value"""
+    parts = []
+    for key, value in records:
+        parts.append(RECORD.pack(len(key), len(value)))
+        parts.append(key)
+        parts.append(value)
+    return b"".join(parts)
+
+
+def iter_records(view: memoryview) -> Iterator[Tuple[memoryview, memoryview]]:
+    """逐条解码 pack_records 编码的段，返回指向原数据的 memoryview"""
+    position, end = 0, view.nbytes
+    while position < end:
+        if position + RECORD.size > end:
+            raise BinFileError("truncated record")
+        key_len, value_len = RECORD.unpack_from(view, position)
+        position += RECORD.size
+        if position + key_len + value_len > end:
+            raise BinFileError("truncated record")
+        yield view[position:position + key_len], view[position + key_len:position + key_len + value_len]
+        position += key_len + value_len
@@ -0,0 +1,186 @@
+"""
+Bulk indexing service
+大批量导入时，把分块嵌入分摊到多个嵌入 worker 进程
+"""
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+from app.config import BULK_INDEX_WORKERS, BULK_INDEX_MEMORY_FRACTION, EMBEDDING_RUNTIME
+from services.embedding_service import create_embedding_service, get_embedding_service, get_embedding_cache
+from services.embedding_cache import text_digest
+
+logger = logging.getLogger(__name__)
+
+# 单条分块编码时的峰值内存估算（MiniLM，256 tokens，含注意力矩阵）
+BYTES_PER_TEXT_ESTIMATE = 4 * 1024 * 1024
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 256
+
+# worker 进程内的嵌入服务
+_worker_service = None
+
+
+def _worker_init(runtime: str):
+    """
+    worker 初始化：每个进程只加载一次模型
+
+    worker 由干净的 forkserver / spawn 进程创建，不继承父进程的锁和 SQLite 连接；
+    不使用嵌入缓存，缓存由父进程统一读写
+    """
+    global _worker_service
+    # 多进程并行时每个 worker 单线程推理，避免线程数超订
+    os.environ["OMP_NUM_THREADS"] = "1"
+    _worker_service = create_embedding_service(runtime, cache=False)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _worker_encode(batch: List[str]):
+    """在 worker 中编码一个批次"""
+    import numpy as np
+    started = time.perf_counter()
+    embeddings = np.asarray(_worker_service.embed_texts(batch), dtype=np.float32)
+    return embeddings, os.getpid(), time.perf_counter() - started
+
+
+def available_memory_bytes() -> Optional[int]:
+    """
+    当前可用内存
+
+    Returns:
+        字节数，无法获取时返回 None
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def adaptive_batch_size(workers: int, memory_fraction: float = BULK_INDEX_MEMORY_FRACTION) -> int:
+    """
+    根据可用内存计算每个 worker 的批大小
+
+    Args:
+        workers: worker 数量
+        memory_fraction: 允许嵌入占用的可用内存比例
+
+    Returns:
+        批大小
+    """
+    available = available_memory_bytes()
+    if available is None:
+        return 32
+    budget = available * memory_fraction / max(workers, 1)
+    return int(max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, budget // BYTES_PER_TEXT_ESTIMATE)))
+
+
+class BulkIndexer:
+    """多进程批量嵌入"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        runtime: str = EMBEDDING_RUNTIME
+    ):
+        """
+        初始化批量索引器
+
+        Args:
+            workers: worker 进程数，默认使用配置（0 表示 CPU 核数）
+            batch_size: 批大小，默认按可用内存自适应
+            runtime: 嵌入运行时 "torch" | "onnx"
+        """
+        workers = workers if workers is not None else BULK_INDEX_WORKERS
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size or adaptive_batch_size(self.workers)
+        self.runtime = runtime
+
+    def embed(self, texts: List[str]) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        并行嵌入所有文本，结果顺序与输入一致
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (嵌入矩阵列表（按顺序拼接即为全部结果）, 吞吐统计)
+        """
+        global _worker_service
+        import numpy as np
+
+        started = time.perf_counter()
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        cached = 0
+
+        if self.workers <= 1 or len(batches) <= 1:
+            # 父进程自己编码时才加载模型
+            _worker_service = get_embedding_service()
+            results = [_worker_encode(b) for b in batches]
+            matrices = [r[0] for r in results]
+        else:
+            # 父进程只打开嵌入缓存（不加载模型），查缓存、写缓存，只把未命中的文本分给 worker
+            cache = get_embedding_cache(self.runtime)
+            digests = [text_digest(t) for t in texts]
+            found = cache.get_many(list(dict.fromkeys(digests))) if cache is not None else {}
+            pending = {}
+            for digest, text in zip(digests, texts):
+                if digest not in found and digest not in pending:
+                    pending[digest] = text
+            cached = len(texts) - len(pending)
+            pending_texts = list(pending.values())
+            batches = [pending_texts[i:i + self.batch_size] for i in range(0, len(pending_texts), self.batch_size)]
+
+            results = []
+            if batches:
+                # 在请求线程中 fork 会继承其他线程持有的锁（嵌入缓存、日志等）和打开的 SQLite 连接，
+                # 因此从干净的 forkserver / spawn 进程创建 worker
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                with context.Pool(
+                    processes=min(self.workers, len(batches)),
+                    initializer=_worker_init,
+                    initargs=(self.runtime,)
+                ) as pool:
+                    results = pool.map(_worker_encode, batches, chunksize=1)
+
+            fresh = dict(zip(pending, (row for r in results for row in r[0])))
+            if cache is not None:
+                cache.put_many(fresh)
+            found.update(fresh)
+            matrices = [np.stack([found[d] for d in digests]).astype(np.float32, copy=False)]
+
+        elapsed = time.perf_counter() - started
+        per_worker = {}
+        for _, pid, seconds in results:
+            per_worker[pid] = per_worker.get(pid, 0.0) + seconds
+
+        stats = {
+            "chunks": len(texts),
+            "cached": cached,
+            "batches": len(batches),
+            "batch_size": self.batch_size,
+            "workers": len(per_worker),
+            "seconds": round(elapsed, 3),
+            # 各 worker 编码耗时之和
+            "encode_seconds": round(sum(per_worker.values()), 3),
+            "chunks_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info(
+            "Bulk embedding: %d chunks (%d cached), %d workers, batch=%d: %s chunks/s",
+            stats["chunks"], stats["cached"], stats["workers"], stats["batch_size"], stats["chunks_per_second"]
+        )
+        return matrices, stats
@@ -0,0 +1,166 @@
+"""
+Document bundles
+把一个已处理文档的解析文本、分页偏移、分块、嵌入向量（float16）、知识点和知识图谱打包为单个文件，
+在节点间复制时无需重新解析、嵌入和抽取。读取时内存映射，分块偏移与嵌入矩阵直接引用文件数据
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from services.binfile import BinFileError, SectionFile, write_sections
+from services.embedding_service import EMBEDDING_MODEL
+from app.config import EMBEDDING_MODEL_VERSION
+
+BUNDLE_MAGIC = b"SFBUNDLE"
+BUNDLE_VERSION = 1
+
+# 嵌入向量的来源模型；导入时不一致则丢弃向量，由目标节点重新嵌入
+EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL}@{EMBEDDING_MODEL_VERSION}"
+
+
+def write_bundle(
+    path: str,
+    document: Dict[str, Any],
+    chunks: Optional[List[str]] = None,
+    embeddings: Optional[Sequence[Sequence[float]]] = None,
+    knowledge: Optional[Dict[str, Any]] = None,
+    graph: Optional[Dict[str, Any]] = None
+):
+    """
+    写入文档包
+
+    Args:
+        path: 目标路径
+        document: documents_db 中的文档记录（含 content、page_offsets）
+        chunks: 向量存储中的分块文本，未建立索引时为 None
+        embeddings: 与分块一一对应的嵌入向量
+        knowledge: knowledge_db 中的知识点记录
+        graph: 知识图谱的节点与边
+    """
+    document = dict(document)
+    text = document.pop("content", "") or ""
+    page_offsets = np.asarray(document.pop("page_offsets", None) or [], dtype=np.int64)
+
+    sections = {
+        "text": text.encode("utf-8"),
+        "pages": page_offsets,
+    }
+    meta = {
+        "document": document,
+        "created_at": time.time(),
+        "chunk_count": 0,
+        "embedding_model": None,
+        "embedding_dim": 0,
+    }
+
+    if chunks is not None:
+        encoded = [c.encode("utf-8") for c in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        sections["chunk_offsets"] = offsets
+        sections["chunks"] = b"".join(encoded)
+        meta["chunk_count"] = len(encoded)
+        if embeddings is not None and len(encoded):
+            matrix = np.ascontiguousarray(embeddings, dtype=np.float16)
+            if matrix.ndim != 2 or matrix.shape[0] != len(encoded):
+                raise ValueError("embeddings must be a 2-D array with one row per chunk")
+            sections["embeddings"] = matrix
+            meta["embedding_model"] = EMBEDDING_MODEL_ID
+            meta["embedding_dim"] = int(matrix.shape[1])
+
+    if knowledge is not None:
+        sections["knowledge"] = json.dumps(knowledge, ensure_ascii=False).encode("utf-8")
+    if graph is not None:
+        sections["graph"] = json.dumps(graph, ensure_ascii=False).encode("utf-8")
+
+    sections["meta"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    write_sections(path, BUNDLE_MAGIC, BUNDLE_VERSION, sections)
+
+
+class DocumentBundle:
+    """
+    只读打开的文档包
+
+    page_offsets、chunk_offsets、embeddings 是指向映射文件的 numpy 数组（不复制），
+    在 close() 之前使用。
+    """
+
+    def __init__(self, path: str):
+        self._file = SectionFile(path, BUNDLE_MAGIC, (BUNDLE_VERSION,))
+        try:
+            self.meta = self._json("meta")
+            if self.meta is None:
+                raise BinFileError(f"{path}: missing meta section")
+        except Exception:
+            self._file.close()
+            raise
+
+    def _json(self, name: str) -> Optional[Any]:
+        if name not in self._file:
+            return None
+        view = self._file.section(name)
+        try:
+            return json.loads(str(view, "utf-8"))
+        finally:
+            view.release()
+
+    def _array(self, name: str, dtype) -> Optional[np.ndarray]:
+        if name not in self._file:
+            return None
+        return np.frombuffer(self._file.section(name), dtype=dtype)
+
+    @property
+    def document_id(self) -> str:
+        return self.meta["document"]["document_id"]
+
+    def document(self) -> Dict[str, Any]:
+        """还原 documents_db 中的文档记录"""
+        view = self._file.section("text")
+        try:
+            content = str(view, "utf-8")
+        finally:
+            view.release()
+        page_offsets = self._array("pages", np.int64)
+        return {
+            **self.meta["document"],
+            "page_offsets": page_offsets.tolist() if page_offsets is not None else [],
+            "content": content,
+        }
+
+    def chunks(self) -> Optional[List[str]]:
+        offsets = self._array("chunk_offsets", np.int64)
+        if offsets is None:
+            return None
+        blob = self._file.section("chunks")
+        return [str(blob[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+
+    def embeddings(self) -> Optional[np.ndarray]:
+        """
+        float16 嵌入矩阵（只读，不复制）
+
+        Returns:
+            (n, dim) 矩阵；包中没有向量或来源模型与当前配置不同时返回 None
+        """
+        if self.meta.get("embedding_model") != EMBEDDING_MODEL_ID:
+            return None
+        vector = self._array("embeddings", np.float16)
+        if vector is None:
+            return None
+        return vector.reshape(self.meta["chunk_count"], self.meta["embedding_dim"])
+
+    def knowledge(self) -> Optional[Dict[str, Any]]:
+        return self._json("knowledge")
+
+    def graph(self) -> Optional[Dict[str, Any]]:
+        return self._json("graph")
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+"""
+Circuit breaker
+提供商连续失败或连续慢调用时熔断，熔断期间快速失败，到期后半开放行探测请求
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from app.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_HALF_OPEN_PROBES,
+)
+from services.ai_provider import ProviderUnavailableError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """熔断器打开，请求未发出"""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(provider, f"{provider}: circuit open, retry in {retry_after:.0f}s", 503)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """单个提供商的熔断器"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES
+    ):
+        """
+        Args:
+            name: 提供商名称
+            failure_threshold: 连续失败（含慢调用）多少次后熔断
+            slow_call_seconds: 超过该耗时的成功调用也计为失败
+            open_seconds: 熔断持续时间，之后进入半开
+            half_open_probes: 半开状态放行的探测请求数，全部成功后闭合
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+        if state in (OPEN, HALF_OPEN):
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+        if state == CLOSED:
+            self.consecutive_failures = 0
+
+    def before_call(self):
+        """
+        请求前检查，熔断时快速失败
+
+        Raises:
+            CircuitOpenError: 熔断中或半开探测名额已满
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self.probes_in_flight += 1
+
+    def record_success(self, duration: float):
+        """记录成功调用；超过慢调用阈值按失败处理"""
+        if duration > self.slow_call_seconds:
+            logger.info("Circuit %s: slow call %.1fs", self.name, duration)
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+            else:
+                self.consecutive_failures = 0
+
+    def record_failure(self):
+        """记录失败调用"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self.consecutive_failures += 1
+            if self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def release_probe(self):
+        """半开探测以不计入健康度的方式结束（如 4xx 请求错误）时归还名额"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def is_open(self) -> bool:
+        """是否处于熔断中（不改变状态）"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self.opened_at + self.open_seconds
+
+    def status(self) -> Dict[str, Any]:
+        """熔断器状态"""
+        with self._lock:
+            status = {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+            if self.state == OPEN:
+                status["retry_after"] = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 1)
+            return status
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取提供商的熔断器（进程内单例）"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def all_circuit_breakers() -> Dict[str, CircuitBreaker]:
+    """所有已创建的熔断器"""
+    with _breakers_lock:
+        return dict(_breakers)
@@ -0,0 +1,173 @@
+"""
+Chunk deduplication service
+基于 SimHash 的分块近重复检测（页眉页脚、版权页、跨版本重复的习题等）
+"""
+import hashlib
+import re
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+SIMHASH_BITS = 64
+
+# 64 位签名切成 4 段 16 位：汉明距离 <= 3 的两个签名至少有一段完全相同（鸽巢原理）
+BAND_COUNT = 4
+BAND_BITS = SIMHASH_BITS // BAND_COUNT
+
+_WHITESPACE = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _normalize(text: str) -> str:
+    """归一化：小写、合并空白（数字保留：公式、习题数值不同的分块不是重复）"""
+    return _WHITESPACE.sub(" ", text.lower()).strip()
+
+
+def _numbers(text: str) -> str:
+    """分块中的全部数字（按出现顺序），近重复的分块必须完全一致"""
+    return " ".join(_DIGITS.findall(text))
+
+
+def _exact_key(text: str) -> str:
+    """合并空白后的文本哈希，相同时才复用对方的嵌入向量"""
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """
+    计算 64 位 SimHash 签名（字符 n-gram 特征，适用于中英文混排）
+
+    Args:
+        text: 分块文本
+        shingle: n-gram 长度
+
+    Returns:
+        64 位整数签名
+    """
+    normalized = _normalize(text)
+    if len(normalized) < shingle:
+        features = [normalized] if normalized else []
+    else:
+        features = [normalized[i:i + shingle] for i in range(len(normalized) - shingle + 1)]
+
+    weights = {}
+    for feature in features:
+        weights[feature] = weights.get(feature, 0) + 1
+    if not weights:
+        return 0
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little") for f in weights],
+        dtype=np.uint64
+    )
+    # (特征数, 64) 的比特矩阵，按权重对每一位投票
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = np.array(list(weights.values()), dtype=np.int64) @ (bits.astype(np.int64) * 2 - 1)
+    return int.from_bytes(np.packbits(votes > 0, bitorder="little").tobytes(), "little")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """两个签名的汉明距离"""
+    return bin(a ^ b).count("1")
+
+
+def _bands(signature: int) -> List[Tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(i, signature >> (i * BAND_BITS) & mask) for i in range(BAND_COUNT)]
+
+
+class ChunkDeduplicator:
+    """
+    分块去重索引
+
+    - 同一文档内的近重复分块：直接丢弃
+    - 与其他文档的分块近重复：保留（按文档检索时仍需要），但记录到规范分块的链接；
+      仅当两者合并空白后完全相同时，嵌入时复用规范分块已缓存的向量，不再调用模型
+    - 数字不同的分块（公式、习题数值、年份）不视为近重复
+
+    索引在进程内：多 worker 部署时各自独立，重启后为空（只影响去重率，不影响正确性）；
+    文档删除或导入替换时需调用 forget
+    """
+
+    def __init__(self, max_distance: int = 3):
+        """
+        Args:
+            max_distance: 判定为近重复的最大汉明距离（不超过 BAND_COUNT - 1）
+        """
+        self.max_distance = min(max_distance, BAND_COUNT - 1)
+        # (band 序号, band 值) -> [(document_id, 分块序号, 签名, 文本哈希, 数字, 合并空白后的文本哈希)]
+        self._bands = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _find(
+        self,
+        signature: int,
+        numbers: str,
+        document_id: Optional[str] = None,
+        exclude_document: Optional[str] = None
+    ):
+        """查找近重复（且数字完全一致）的已索引分块"""
+        for band in _bands(signature):
+            for entry in self._bands.get(band, ()):
+                if document_id is not None and entry[0] != document_id:
+                    continue
+                if exclude_document is not None and entry[0] == exclude_document:
+                    continue
+                if entry[4] == numbers and hamming_distance(signature, entry[2]) <= self.max_distance:
+                    return entry
+        return None
+
+    def _add(self, entry):
+        for band in _bands(entry[2]):
+            self._bands.setdefault(band, []).append(entry)
+        self._documents.setdefault(entry[0], []).append(entry)
+
+    def forget(self, document_id: str):
+        """移除文档的全部分块（文档删除、替换时调用）"""
+        with self._lock:
+            self._forget(document_id)
+
+    def _forget(self, document_id: str):
+        for entry in self._documents.pop(document_id, []):
+            for band in _bands(entry[2]):
+                bucket = self._bands.get(band)
+                if bucket:
+                    bucket.remove(entry)
+                    if not bucket:
+                        del self._bands[band]
+
+    def process(self, document_id: str, chunks: List[str], digests: List[str]) -> Dict[str, Any]:
+        """
+        对一个文档的分块去重
+
+        Args:
+            document_id: Document ID
+            chunks: 分块文本
+            digests: 分块文本哈希（与 chunks 一一对应）
+
+        Returns:
+            kept: 保留的分块序号
+            links: 保留分块序号 -> 规范分块 (document_id, 序号, 文本哈希, 合并空白后是否完全相同)，
+                仅跨文档重复
+            dropped: 丢弃的分块数
+        """
+        kept, links, dropped = [], {}, 0
+        with self._lock:
+            self._forget(document_id)
+            for i, (chunk, digest) in enumerate(zip(chunks, digests)):
+                signature, numbers = simhash(chunk), _numbers(chunk)
+                if self._find(signature, numbers, document_id=document_id) is not None:
+                    dropped += 1
+                    continue
+
+                kept.append(i)
+                exact = _exact_key(chunk)
+                canonical = self._find(signature, numbers, exclude_document=document_id)
+                if canonical is not None:
+                    links[i] = (canonical[0], canonical[1], canonical[3], canonical[5] == exact)
+                self._add((document_id, i, signature, digest, numbers, exact))
+
+        return {"kept": kept, "links": links, "dropped": dropped}
@@ -1,28 +1,47 @@
 """
 DeepSeek API service
 """
+import logging
 import json
-import traceback
-from typing import Optional, Dict, Any
-from openai import OpenAI
-from app.config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, MOCK_MODE
+import time
+from typing import Optional, Dict, Any, List
+from app.config import DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL, MOCK_MODE, LLM_TIMEOUT
+from services.ai_provider import AIProvider, ProviderError
+from services.provider_limits import get_provider_limiter, estimate_tokens
+from services.singleflight import get_singleflight, digest_key
+from services.metrics import record_llm_call, llm_outcome
 
+logger = logging.getLogger(__name__)
 
-class DeepSeekService:
+
+class DeepSeekService(AIProvider):
     """Service for interacting with DeepSeek API"""
 
     def __init__(self):
-        print(f"[DeepSeek] Initializing with API Key: {DEEPSEEK_API_KEY[:10]}..., MOCK_MODE: {MOCK_MODE}")
+        logger.info("Initializing DeepSeek client (api key configured: %s, mock mode: %s)", bool(DEEPSEEK_API_KEY), MOCK_MODE)
+        # openai SDK 导入较慢，首次创建客户端时才导入
+        from openai import OpenAI
+        # 重试由准入层统一处理，关闭 SDK 自带重试
         self.client = OpenAI(
             api_key=DEEPSEEK_API_KEY,
-            base_url=DEEPSEEK_BASE_URL
+            base_url=DEEPSEEK_BASE_URL,
+            timeout=LLM_TIMEOUT,
+            max_retries=0
         )
         self.mock_mode = MOCK_MODE
+        self.limiter = get_provider_limiter("deepseek")
+        self.inflight = get_singleflight("deepseek")
 
     @property
     def provider_name(self) -> str:
         return "deepseek"
 
+    def preconnect(self):
+        """请求免费的模型列表接口，建立并保留 HTTPS 连接"""
+        if self.mock_mode or not DEEPSEEK_API_KEY:
+            return
+        self.client.models.list()
+
     def chat(
         self,
         system_prompt: str,
@@ -39,29 +58,82 @@ class DeepSeekService:
 
         Returns:
             Model response
+
+        Raises:
+            ProviderError: API 调用失败（限流重试耗尽时为 ProviderUnavailableError）
+        """
+        return self.chat_messages(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=model
+        )
+
+    def chat_messages(self, messages: List[Dict[str, str]], model: str = "deepseek-chat", **kwargs) -> str:
         """
-        print(f"[DeepSeek] chat called, mock_mode: {self.mock_mode}")
+        多轮对话（AIProvider 接口）；消息前缀与上次请求相同时 DeepSeek 自动命中上下文缓存
 
+        Args:
+            messages: OpenAI 格式的消息列表
+            model: Model name
+
+        Returns:
+            Model response
+        """
         if self.mock_mode:
-            print("[DeepSeek] Using mock mode")
-            return self._get_mock_response(user_prompt)
+            return self._get_mock_response(messages[-1]["content"])
 
+        logger.debug("Calling API with model: %s", model)
+        # 相同提示词的并发请求只发一次
+        response = self.inflight.do(
+            (model, digest_key(*(m["role"] + "\n" + m["content"] for m in messages))),
+            lambda: self._create(model, messages)
+        )
+        result = response.choices[0].message.content
+        logger.debug("API response length: %d", len(result) if result else 0)
+        return result
+
+    def _create(self, model: str, messages: List[Dict[str, str]]):
+        """经准入层调用 chat completions，并记录延迟与令牌指标"""
+        started = time.perf_counter()
+        response, error = None, None
         try:
-            print(f"[DeepSeek] Calling API with model: {model}")
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
+            response = self.limiter.call(
+                lambda: self.client.chat.completions.create(model=model, messages=messages),
+                estimated_tokens=estimate_tokens(*(m["content"] for m in messages)) * 2,
+                usage=lambda r: r.usage.total_tokens if getattr(r, "usage", None) else 0
             )
-            result = response.choices[0].message.content
-            print(f"[DeepSeek] API response (first 200 chars): {result[:200] if result else 'None'}")
-            return result
+            return response
         except Exception as e:
-            print(f"[DeepSeek] API error: {e}")
-            traceback.print_exc()
-            return self._get_mock_response(user_prompt)
+            error = e
+            raise
+        finally:
+            usage = getattr(response, "usage", None)
+            record_llm_call(
+                "deepseek", model, llm_outcome(error), time.perf_counter() - started,
+                tokens_in=getattr(usage, "prompt_tokens", 0) or 0,
+                tokens_out=getattr(usage, "completion_tokens", 0) or 0,
+                tokens_cached=getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+            )
+
+    def generate_text(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        """生成文本（AIProvider 接口，等同于 chat）"""
+        return self.chat(system_prompt, user_prompt, model=kwargs.get("model", "deepseek-chat"))
+
+    def support_ocr(self) -> bool:
+        """DeepSeek 不支持 OCR"""
+        return False
+
+    def ocr_image(self, image_data: bytes, **kwargs) -> str:
+        raise NotImplementedError("DeepSeek does not support OCR")
+
+    def support_image_understanding(self) -> bool:
+        """DeepSeek 不支持图片理解"""
+        return False
+
+    def understand_image(self, image_data: bytes, prompt: str = "", **kwargs) -> str:
+        raise NotImplementedError("DeepSeek does not support image understanding")
 
     def answer_question(self, question: str, context: str, **kwargs) -> Dict[str, Any]:
         """
@@ -118,7 +190,7 @@ class DeepSeekService:
             "sources": []
         }
 
-    def extract_knowledge(self, text: str) -> Dict[str, Any]:
+    def extract_knowledge(self, text: str, **kwargs) -> Dict[str, Any]:
         """
         Extract structured knowledge from text
 
@@ -128,7 +200,7 @@ class DeepSeekService:
         Returns:
             Structured knowledge JSON
         """
-        print(f"[DeepSeek] extract_knowledge called with text length: {len(text)}")
+        logger.debug("extract_knowledge called with text length: %d", len(text))
 
         system_prompt = """你是一个专业的教育知识归纳专家，擅长将教材内容结构化提取。
 
@@ -146,12 +218,10 @@ class DeepSeekService:
         user_prompt = f"请对以下文本进行知识归纳：\n\n{text}"
 
         response = self.chat(system_prompt, user_prompt)
-        print(f"[DeepSeek] Response length: {len(response) if response else 0}")
 
         try:
             # Try to parse as JSON
             result = json.loads(response)
-            print(f"[DeepSeek] Successfully parsed JSON")
 
             # Normalize to our expected format
             # DeepSeek may return different structures, convert to chapters format
@@ -163,7 +233,7 @@ class DeepSeekService:
 
             return result
         except json.JSONDecodeError as e:
-            print(f"[DeepSeek] JSON parse error: {e}")
+            logger.debug("JSON parse error: %s", e)
             # Try to remove markdown code block markers
             clean_response = response.strip()
             if clean_response.startswith("```"):
@@ -171,19 +241,16 @@ class DeepSeekService:
                 lines = clean_response.split("\n")
                 clean_lines = [l for l in lines if not l.strip().startswith("```")]
                 clean_response = "\n".join(clean_lines).strip()
-                print(f"[DeepSeek] Attempting to parse cleaned response: {clean_response[:200]}...")
             try:
                 result = json.loads(clean_response)
-                print(f"[DeepSeek] Successfully parsed cleaned JSON")
-                # Try to normalize
-                normalized = self._normalize_knowledge_format(result)
-                if normalized:
-                    return normalized
-                return result
-            except:
-                print(f"[DeepSeek] Still failed to parse, using mock")
-                # Return mock structure if parsing fails
-                return self._get_mock_knowledge()
+            except json.JSONDecodeError:
+                logger.warning("Failed to parse knowledge JSON (%d chars)", len(clean_response))
+                raise ProviderError("deepseek", "DeepSeek returned invalid knowledge JSON")
+            # Try to normalize
+            normalized = self._normalize_knowledge_format(result)
+            if normalized:
+                return normalized
+            return result
 
     def _normalize_knowledge_format(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Normalize different API response formats to our chapters format"""
@@ -259,7 +326,7 @@ class DeepSeekService:
 
     def _get_mock_response(self, user_prompt: str) -> str:
         """Get mock response when API is unavailable"""
-        print("[DeepSeek] Using mock response")
+        logger.debug("Using mock response")
         return json.dumps(self._get_mock_knowledge())
 
     def _get_mock_knowledge(self) -> Dict[str, Any]:
@@ -1,15 +1,16 @@
 """
 Document parsing service
 """
-import PyPDF2
 from io import BytesIO
 from typing import Dict, Any
+from services.metrics import timed
 
 
 class DocumentService:
     """Service for parsing PDF documents"""
 
     @staticmethod
+    @timed("pdf_parse")
     def parse_pdf(file_content: bytes) -> Dict[str, Any]:
         """
         Parse PDF content and extract text
@@ -20,19 +21,24 @@ class DocumentService:
         Returns:
             Dict containing text and metadata
         """
+        import PyPDF2
+
         try:
             pdf_file = BytesIO(file_content)
             pdf_reader = PyPDF2.PdfReader(pdf_file)
 
-            text = ""
-            page_count = len(pdf_reader.pages)
+            pages = [page.extract_text() + "\n" for page in pdf_reader.pages]
+            text = "".join(pages)
 
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+            # 每页在 text 中的起始字符偏移，末尾为总长度（第 i 页为 text[offsets[i]:offsets[i + 1]]）
+            page_offsets = [0]
+            for page_text in pages:
+                page_offsets.append(page_offsets[-1] + len(page_text))
 
             return {
                 "text": text,
-                "page_count": page_count,
+                "page_count": len(pages),
+                "page_offsets": page_offsets,
                 "text_length": len(text),
                 "status": "completed"
             }
@@ -40,12 +46,14 @@ class DocumentService:
             return {
                 "text": "",
                 "page_count": 0,
+                "page_offsets": [],
                 "text_length": 0,
                 "status": "error",
                 "error": str(e)
             }
 
     @staticmethod
+    @timed("chunking")
     def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list:
         """
         Split text into chunks
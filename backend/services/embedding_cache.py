@@ -0,0 +1,147 @@
+"""
+Embedding cache
+按分块文本内容哈希缓存嵌入向量：内存 LRU + SQLite 磁盘两级
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def text_digest(text: str) -> str:
+    """文本内容哈希（缓存键的一部分）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    两级嵌入缓存
+
+    缓存键 = (namespace, 文本 sha256)，namespace 由模型名、模型版本和运行时组成，
+    升级模型或切换运行时后旧向量自然失效。磁盘层是单个 SQLite 文件，
+    多个 worker 进程可以共享。
+    """
+
+    def __init__(self, namespace: str, memory_items: int = 50000, disk_path: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            namespace: 模型命名空间，如 "all-MiniLM-L6-v2@1/torch"
+            memory_items: 内存 LRU 容量（条），0 表示不使用内存层
+            disk_path: SQLite 文件路径，None 表示不使用磁盘层
+        """
+        self.namespace = namespace
+        self.memory_items = memory_items
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _get_conn(self):
+        """打开 SQLite 连接；fork 后的子进程重新打开"""
+        if self.disk_path is None:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " namespace TEXT NOT NULL, digest TEXT NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (namespace, digest)) WITHOUT ROWID"
+            )
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, digest: str, vector):
+        if self.memory_items <= 0:
+            return
+        self._memory[digest] = vector
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, digests: List[str]) -> Dict[str, np.ndarray]:
+        """
+        批量查询
+
+        Args:
+            digests: 文本哈希列表
+
+        Returns:
+            命中的 digest -> 向量
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for digest in digests:
+                vector = self._memory.get(digest)
+                if vector is not None:
+                    self._memory.move_to_end(digest)
+                    found[digest] = vector
+                else:
+                    missing.append(digest)
+            self.hits_memory += len(found)
+
+            conn = self._get_conn()
+            if conn is not None and missing:
+                # SQLite 单条语句变量数有限，分批查询
+                for start in range(0, len(missing), 500):
+                    part = missing[start:start + 500]
+                    rows = conn.execute(
+                        f"SELECT digest, vector FROM embeddings WHERE namespace = ? "
+                        f"AND digest IN ({','.join('?' * len(part))})",
+                        [self.namespace, *part]
+                    ).fetchall()
+                    for digest, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[digest] = vector
+                        self._remember(digest, vector)
+                        self.hits_disk += 1
+
+            self.misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """
+        批量写入
+
+        Args:
+            items: digest -> 向量
+        """
+        if not items:
+            return
+        with self._lock:
+            rows = []
+            for digest, vector in items.items():
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(digest, vector)
+                rows.append((self.namespace, digest, vector.tobytes()))
+            conn = self._get_conn()
+            if conn is not None:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (namespace, digest, vector) VALUES (?, ?, ?)",
+                        rows
+                    )
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计"""
+        return {
+            "memory_items": len(self._memory),
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+        }
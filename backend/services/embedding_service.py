@@ -0,0 +1,279 @@
+"""
+Embedding service
+本地嵌入服务：PyTorch (sentence-transformers) 或 int8 量化 ONNX (onnxruntime)
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+from app.config import (
+    EMBEDDING_RUNTIME,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_THREADS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL_VERSION,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_PATH,
+)
+from services.embedding_cache import EmbeddingCache, text_digest
+from services import metrics
+from services.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# 嵌入模型 - 使用轻量级模型
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# all-MiniLM-L6-v2 的最大序列长度
+MAX_SEQ_LENGTH = 256
+
+# ONNX 模型目录中的文件名（由 scripts/export_onnx_embedding.py 生成）
+ONNX_MODEL_FILE = "model_quantized.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+
+
+class EmbeddingService:
+    """本地嵌入服务（PyTorch 运行时）"""
+
+    runtime = "torch"
+
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE, cache: bool = True):
+        """
+        Args:
+            batch_size: 编码批大小
+            cache: 是否使用进程内共享的嵌入缓存
+        """
+        self.batch_size = batch_size
+        # 最近批次的 (批大小, 耗时 ms)
+        self.batch_latencies = deque(maxlen=256)
+        self.cache = get_embedding_cache(self.runtime) if cache else None
+        self._load_model()
+
+    def _load_model(self):
+        logger.info("Loading embedding model: %s", EMBEDDING_MODEL)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(EMBEDDING_MODEL)
+        if EMBEDDING_THREADS > 0:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        logger.info("Embedding model loaded")
+
+    def _encode(self, texts: List[str]):
+        """编码一个批次，返回 numpy 矩阵"""
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    def _encode_batched(self, texts: List[str]):
+        """按 batch_size 分批编码并记录每批延迟"""
+        import numpy as np
+
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            began = time.perf_counter()
+            batches.append(self._encode(batch))
+            elapsed = time.perf_counter() - began
+            self.batch_latencies.append((len(batch), elapsed * 1000))
+            metrics.EMBEDDING_BATCH_SIZE.observe(len(batch), runtime=self.runtime)
+            metrics.EMBEDDING_BATCH_SECONDS.observe(elapsed, runtime=self.runtime)
+
+        if len(batches) > 1:
+            recent = list(self.batch_latencies)[-len(batches):]
+            avg_ms = sum(ms for _, ms in recent) / len(recent)
+            logger.debug("%s: %d texts in %d batches, avg %.1fms/batch", self.runtime, len(texts), len(batches), avg_ms)
+
+        return np.concatenate(batches)
+
+    @timed("embedding")
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """将文本转换为嵌入向量（先查缓存，只对未命中的文本调用模型）"""
+        import numpy as np
+
+        if not texts:
+            return []
+
+        if self.cache is None:
+            metrics.EMBEDDING_TEXTS.inc(len(texts), result="uncached")
+            return self._encode_batched(texts).tolist()
+
+        digests = [text_digest(t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(digests)))
+
+        # 同一批次内重复的文本只编码一次
+        pending = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found and digest not in pending:
+                pending[digest] = text
+
+        metrics.EMBEDDING_TEXTS.inc(len(texts) - len(pending), result="hit")
+        metrics.EMBEDDING_TEXTS.inc(len(pending), result="miss")
+        if pending:
+            encoded = self._encode_batched(list(pending.values()))
+            fresh = dict(zip(pending.keys(), encoded))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+
+        return np.stack([found[d] for d in digests]).tolist()
+
+    def get_cached(self, digest: str):
+        """
+        按文本哈希读取已缓存的向量
+
+        Args:
+            digest: text_digest() 结果
+
+        Returns:
+            向量，未缓存时返回 None
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get_many([digest]).get(digest)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        最近批次的延迟统计
+
+        Returns:
+            runtime、批次数、平均/最大批次延迟、缓存命中
+        """
+        recent = list(self.batch_latencies)
+        stats = {"runtime": self.runtime, "batches": len(recent)}
+        if recent:
+            latencies = [ms for _, ms in recent]
+            stats.update({
+                "avg_batch_ms": round(sum(latencies) / len(latencies), 2),
+                "max_batch_ms": round(max(latencies), 2),
+                "avg_batch_size": round(sum(n for n, _ in recent) / len(recent), 1),
+            })
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+class OnnxEmbeddingService(EmbeddingService):
+    """
+    本地嵌入服务（onnxruntime 运行时）
+
+    运行 int8 动态量化后的 all-MiniLM-L6-v2 ONNX 图，只依赖
+    onnxruntime + tokenizers，无需加载 PyTorch，适合无 GPU 的 CPU 节点。
+    池化方式与 sentence-transformers 一致：mean pooling + L2 归一化。
+    """
+
+    runtime = "onnx"
+
+    def __init__(
+        self,
+        model_dir: str = EMBEDDING_ONNX_DIR,
+        threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        cache: bool = True
+    ):
+        self.model_dir = model_dir
+        self.threads = threads
+        super().__init__(batch_size=batch_size, cache=cache)
+
+    def _load_model(self):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(self.model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"ONNX embedding model not found: {model_path}. "
+                "Run `python -m scripts.export_onnx_embedding` first."
+            )
+
+        logger.info("Loading ONNX embedding model: %s (threads=%s)", model_path, self.threads or "auto")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        logger.info("ONNX embedding model loaded")
+
+    def _encode(self, texts: List[str]):
+        import numpy as np
+
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encoded], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling（忽略 padding）+ L2 归一化
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = summed / counts
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled / norms
+
+
+# 全局嵌入服务实例
+_embedding_service = None
+_embedding_lock = threading.Lock()
+
+# 运行时 -> 嵌入缓存（不同运行时的向量不通用，命名空间分开）
+_embedding_caches: Dict[str, EmbeddingCache] = {}
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(runtime: str = EMBEDDING_RUNTIME) -> Optional[EmbeddingCache]:
+    """
+    获取运行时对应的嵌入缓存单例，不加载模型（批量索引的父进程只需读写缓存）
+
+    Args:
+        runtime: "torch" | "onnx"
+
+    Returns:
+        EmbeddingCache 实例，未启用缓存时返回 None
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        cache = _embedding_caches.get(runtime)
+        if cache is None:
+            cache = _embedding_caches[runtime] = EmbeddingCache(
+                namespace=f"{EMBEDDING_MODEL}@{EMBEDDING_MODEL_VERSION}/{runtime}",
+                memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+                disk_path=EMBEDDING_CACHE_PATH or None
+            )
+        return cache
+
+
+def create_embedding_service(runtime: str = EMBEDDING_RUNTIME, cache: bool = True) -> EmbeddingService:
+    """
+    按运行时创建嵌入服务
+
+    Args:
+        runtime: "torch" | "onnx"
+        cache: 是否使用嵌入缓存
+
+    Returns:
+        EmbeddingService 实例
+    """
+    if runtime == "onnx":
+        return OnnxEmbeddingService(cache=cache)
+    return EmbeddingService(cache=cache)
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取嵌入服务单例（后台预热与请求可能同时首次调用，加锁只加载一次模型）"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_lock:
+            if _embedding_service is None:
+                _embedding_service = create_embedding_service()
+    return _embedding_service
@@ -1,18 +1,23 @@
 """
 Knowledge graph service
 """
-import networkx as nx
-from typing import Dict, Any, List, Tuple
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 import json
+from services.metrics import timed
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 class GraphService:
-    """Service for building and querying knowledge graphs"""
+    """
+    Service for building and querying knowledge graphs
 
-    def __init__(self):
-        self.graph = nx.DiGraph()
+    无状态：图按请求构建并由调用方持有，多个请求 / worker 之间互不影响
+    """
 
-    def build_graph(self, knowledge: Dict[str, Any]) -> nx.DiGraph:
+    @timed("graph_build")
+    def build_graph(self, knowledge: Dict[str, Any]) -> "nx.DiGraph":
         """
         Build knowledge graph from structured knowledge
 
@@ -22,7 +27,9 @@ class GraphService:
         Returns:
             NetworkX graph
         """
-        self.graph = nx.DiGraph()
+        # networkx 导入较慢，首次构建图时才导入
+        import networkx as nx
+        graph = nx.DiGraph()
 
         chapters = knowledge.get("chapters", [])
 
@@ -31,7 +38,7 @@ class GraphService:
             chapter_title = chapter.get("title", "")
 
             # Add chapter node
-            self.graph.add_node(
+            graph.add_node(
                 chapter_id,
                 label=chapter_title,
                 type="chapter"
@@ -44,14 +51,14 @@ class GraphService:
                 topic_title = topic.get("title", "")
 
                 # Add topic node
-                self.graph.add_node(
+                graph.add_node(
                     topic_id,
                     label=topic_title,
                     type="topic"
                 )
 
                 # Add edge from chapter to topic
-                self.graph.add_edge(
+                graph.add_edge(
                     chapter_id,
                     topic_id,
                     relation="contains"
@@ -63,13 +70,13 @@ class GraphService:
                     formula_id = formula.get("id")
                     formula_content = formula.get("content", "")
 
-                    self.graph.add_node(
+                    graph.add_node(
                         formula_id,
                         label=formula_content,
                         type="formula"
                     )
 
-                    self.graph.add_edge(
+                    graph.add_edge(
                         topic_id,
                         formula_id,
                         relation="contains"
@@ -81,30 +88,34 @@ class GraphService:
                     example_id = example.get("id")
                     example_content = example.get("content", "")
 
-                    self.graph.add_node(
+                    graph.add_node(
                         example_id,
                         label=example_content,
                         type="example"
                     )
 
-                    self.graph.add_edge(
+                    graph.add_edge(
                         topic_id,
                         example_id,
                         relation="contains"
                     )
 
-        return self.graph
+        return graph
 
-    def get_nodes_and_edges(self) -> Dict[str, List]:
+    @timed("graph_serialize")
+    def get_nodes_and_edges(self, graph: "nx.DiGraph") -> Dict[str, List]:
         """
         Get nodes and edges for visualization
 
+        Args:
+            graph: Graph returned by build_graph
+
         Returns:
             Dict with nodes and edges lists
         """
         nodes = []
-        for node_id in self.graph.nodes:
-            node_data = self.graph.nodes[node_id]
+        for node_id in graph.nodes:
+            node_data = graph.nodes[node_id]
             nodes.append({
                 "id": node_id,
                 "label": node_data.get("label", node_id),
@@ -112,7 +123,7 @@ class GraphService:
             })
 
         edges = []
-        for source, target, data in self.graph.edges(data=True):
+        for source, target, data in graph.edges(data=True):
             edges.append({
                 "source": source,
                 "target": target,
@@ -124,37 +135,150 @@ class GraphService:
             "edges": edges
         }
 
-    def get_related_topics(self, topic_id: str) -> List[str]:
+    def build_index(self, graph_data: Dict[str, List]) -> Dict[str, Any]:
+        """
+        为分层浏览建立索引（节点按 id 查找、按父节点列出子节点）
+
+        Args:
+            graph_data: get_nodes_and_edges 的结果
+
+        Returns:
+            nodes: id -> 节点；children: id -> 子节点 id 列表；parents: id -> 父节点 id；
+            roots: 没有父节点的节点（章节）
+        """
+        nodes = {node["id"]: node for node in graph_data["nodes"]}
+        children: Dict[str, List[str]] = {}
+        parents: Dict[str, str] = {}
+        for edge in graph_data["edges"]:
+            children.setdefault(edge["source"], []).append(edge["target"])
+            parents.setdefault(edge["target"], edge["source"])
+        roots = [node_id for node_id in nodes if node_id not in parents]
+        return {"nodes": nodes, "children": children, "parents": parents, "roots": roots}
+
+    @staticmethod
+    def summarize_node(index: Dict[str, Any], node_id: str, label_length: int = 0) -> Dict[str, Any]:
+        """
+        节点摘要：标签按 label_length 截断（0 表示不截断），附带子节点数
+
+        Args:
+            index: build_index 的结果
+            node_id: Node ID
+            label_length: 标签最大字符数
+        """
+        node = index["nodes"][node_id]
+        label = str(node.get("label", node_id))
+        truncated = 0 < label_length < len(label)
+        return {
+            "id": node_id,
+            "label": label[:label_length] + "…" if truncated else label,
+            "type": node.get("type", "node"),
+            "child_count": len(index["children"].get(node_id, ())),
+            "truncated": truncated,
+        }
+
+    def get_children(
+        self,
+        index: Dict[str, Any],
+        parent_id: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+        label_length: int = 0
+    ) -> Dict[str, Any]:
+        """
+        分页列出某个节点的子节点（parent_id 为空时列出章节）
+
+        Args:
+            index: build_index 的结果
+            parent_id: 父节点 ID
+            offset: 起始位置
+            limit: 本页节点数
+            label_length: 标签最大字符数，0 表示不截断
+
+        Returns:
+            nodes、父节点到本页节点的 edges、total、下一页起始位置 next_offset（没有下一页时为 None）
+        """
+        if parent_id is None:
+            ids = index["roots"]
+        elif parent_id in index["nodes"]:
+            ids = index["children"].get(parent_id, [])
+        else:
+            raise KeyError(parent_id)
+
+        page = ids[offset:offset + limit]
+        end = offset + len(page)
+        return {
+            "nodes": [self.summarize_node(index, node_id, label_length) for node_id in page],
+            "edges": [
+                {"source": parent_id, "target": node_id, "label": "contains"} for node_id in page
+            ] if parent_id is not None else [],
+            "total": len(ids),
+            "next_offset": end if end < len(ids) else None,
+        }
+
+    @staticmethod
+    def _iter_items(knowledge: Dict[str, Any]):
+        """按 build_graph 的层级遍历知识结构中的条目"""
+        for chapter in knowledge.get("chapters", []):
+            yield chapter
+            for topic in chapter.get("topics", []):
+                yield topic
+                yield from topic.get("formulas", [])
+                yield from topic.get("examples", [])
+
+    def get_node_detail(self, index: Dict[str, Any], knowledge: Dict[str, Any], node_id: str) -> Dict[str, Any]:
+        """
+        节点详情：完整标签、父节点，以及知识点中对应条目的全部字段（不含下级列表）
+
+        Args:
+            index: build_index 的结果
+            knowledge: 构建该图的知识结构
+            node_id: Node ID
+        """
+        if node_id not in index["nodes"]:
+            raise KeyError(node_id)
+
+        item = next((x for x in self._iter_items(knowledge) if x.get("id") == node_id), None)
+
+        return {
+            **self.summarize_node(index, node_id),
+            "parent": index["parents"].get(node_id),
+            "data": {k: v for k, v in (item or {}).items() if k not in ("topics", "formulas", "examples")},
+        }
+
+    def get_related_topics(self, graph: "nx.DiGraph", topic_id: str) -> List[str]:
         """
         Get related topics for a given topic
 
         Args:
+            graph: Graph returned by build_graph
             topic_id: Topic ID
 
         Returns:
             List of related topic IDs
         """
-        if topic_id not in self.graph:
+        if topic_id not in graph:
             return []
 
         # Get predecessors and successors
-        related = list(self.graph.predecessors(topic_id))
-        related.extend(list(self.graph.successors(topic_id)))
+        related = list(graph.predecessors(topic_id))
+        related.extend(list(graph.successors(topic_id)))
 
         return list(set(related))
 
-    def get_path(self, source_id: str, target_id: str) -> List[str]:
+    def get_path(self, graph: "nx.DiGraph", source_id: str, target_id: str) -> List[str]:
         """
         Get path between two nodes
 
         Args:
+            graph: Graph returned by build_graph
             source_id: Source node ID
             target_id: Target node ID
 
         Returns:
             List of node IDs in path
         """
+        import networkx as nx
         try:
-            return nx.shortest_path(self.graph, source_id, target_id)
+            return nx.shortest_path(graph, source_id, target_id)
         except (nx.NetworkXNoPath, nx.NodeNotFound):
             return []
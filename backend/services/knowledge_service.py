@@ -2,13 +2,17 @@
 Knowledge extraction service
 支持 MiniMax 和 DeepSeek 并行
 """
+import logging
 from typing import Dict, Any, List, Optional
-from services.deepseek_service import DeepSeekService
-from services.minimax_service import MiniMaxService
 from services.document_service import DocumentService
-from services.ai_provider import AIServiceSelector
+from services.ai_provider import AIProvider
+from services.provider_registry import get_provider
+from services.singleflight import get_singleflight, digest_key
+from services.profiler import traced
 from app.config import AI_PROVIDER
 
+logger = logging.getLogger(__name__)
+
 
 class KnowledgeService:
     """Service for extracting knowledge from documents"""
@@ -18,31 +22,36 @@ class KnowledgeService:
         初始化知识服务
 
         Args:
-            provider: AI 提供商 "minimax" | "deepseek"，默认使用配置
+            provider: 默认 AI 提供商 "minimax" | "deepseek" | "both"，默认使用配置
         """
         self.provider = provider or AI_PROVIDER
-        self.selector = AIServiceSelector(self.provider)
-        self.ai_service = self.selector.get_service()
         self.document_service = DocumentService()
-        print(f"[KnowledgeService] Using AI provider: {self.provider}")
+        # 同一份文本的并发抽取只调用一次模型
+        self.inflight = get_singleflight("knowledge.extract")
+        logger.info("Using AI provider: %s", self.provider)
+
+    @property
+    def ai_service(self) -> AIProvider:
+        """默认提供商实例"""
+        return get_provider(self.provider)
 
     def set_provider(self, provider: str):
         """
-        切换 AI 提供商
+        切换默认 AI 提供商（未指定提供商的调用使用）
 
         Args:
-            provider: 新提供商 "minimax" | "deepseek"
+            provider: 新提供商 "minimax" | "deepseek" | "both"
         """
         self.provider = provider
-        self.selector.switch_provider(provider)
-        self.ai_service = self.selector.get_service()
-        print(f"[KnowledgeService] Switched to provider: {provider}")
+        logger.info("Switched to provider: %s", provider)
 
+    @traced("knowledge.extract")
     def extract_knowledge(
         self,
         document_id: str,
         text: str,
-        extraction_level: str = "chapter"
+        extraction_level: str = "chapter",
+        provider: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Extract knowledge from document text
@@ -51,6 +60,7 @@ class KnowledgeService:
             document_id: Document ID
             text: Document text
             extraction_level: Level of extraction (chapter/topic/formula/example)
+            provider: 本次调用使用的提供商，默认使用 self.provider
 
         Returns:
             Structured knowledge
@@ -59,12 +69,19 @@ class KnowledgeService:
         text_to_process = text[:8000] if len(text) > 8000 else text
 
         # Use configured AI service to extract knowledge
-        knowledge = self.ai_service.extract_knowledge(text_to_process)
-
-        # Add document ID
+        # 合并同一提供商、同一文本的进行中请求（如全班同时打开同一份讲义）
+        provider = provider or self.provider
+        ai_service = get_provider(provider)
+        knowledge = self.inflight.do(
+            (provider, digest_key(text_to_process)),
+            lambda: ai_service.extract_knowledge(text_to_process)
+        )
+
+        # Add document ID（结果可能被多个调用方共享，先复制再修改）
         if isinstance(knowledge, dict):
+            knowledge = dict(knowledge)
             knowledge["document_id"] = document_id
-            knowledge["provider"] = self.provider
+            knowledge["provider"] = provider
 
         return knowledge
 
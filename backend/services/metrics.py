@@ -0,0 +1,394 @@
+"""
+Metrics
+进程内计数器 / 直方图 / 仪表，按 Prometheus 文本格式（0.0.4）输出，供 /metrics 抓取
+"""
+import logging
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services import profiler
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认延迟桶（秒）：覆盖从毫秒级的向量检索到数十秒的 LLM 调用
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各桶计数（非累计）..., 总数, 总和]
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时记录耗时（秒），异常时同样记录"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+        lines = self._header()
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表：可直接设置，或在抓取时由回调函数给出 {标签值元组: 数值}"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None
+    ):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.callback is not None:
+            try:
+                values.update(self.callback())
+            except Exception as e:
+                logger.warning("Metric %s callback failed: %s", self.name, e)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class CounterFunc(Gauge):
+    """抓取时由回调给出数值的计数器（数据源自身已累计，如合并组统计）"""
+
+    kind = "counter"
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def gauge(name: str, help_text: str, labelnames: Iterable[str] = (), callback=None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labelnames, callback))
+
+
+@contextmanager
+def stage(name: str):
+    """记录流水线阶段耗时；请求开启剖析时同时记入 span 时间线"""
+    with profiler.span(name), STAGE_SECONDS.time(stage=name):
+        yield
+
+
+def observe_stage(name: str, started: float):
+    """记录从 started（perf_counter）到现在的阶段耗时"""
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(seconds, stage=name)
+    profiler.add_span(name, seconds)
+
+
+def timed(name: str):
+    """装饰器：把函数耗时记为流水线阶段 name"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== 应用指标 ====================
+
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# 流水线阶段：pdf_parse, chunking, embedding, vector_query, context_packing, graph_build, graph_serialize,
+# snapshot_save, snapshot_restore
+STAGE_SECONDS = histogram("pipeline_stage_duration_seconds", "Latency of each pipeline stage", ("stage",))
+
+EMBEDDING_BATCH_SIZE = histogram(
+    "embedding_batch_size", "Texts per embedding model batch", ("runtime",), buckets=SIZE_BUCKETS
+)
+EMBEDDING_BATCH_SECONDS = histogram(
+    "embedding_batch_duration_seconds", "Latency of one embedding model batch", ("runtime",)
+)
+EMBEDDING_TEXTS = counter("embedding_texts_total", "Texts requested for embedding by cache outcome", ("result",))
+
+# 问答会话的检索：reused（复用工作集）| queried（查询向量库）
+QA_SESSION_RETRIEVALS = counter("qa_session_retrievals_total", "Session QA turns by retrieval outcome", ("result",))
+
+LLM_REQUEST_SECONDS = histogram(
+    "llm_request_duration_seconds", "LLM provider call latency (including retries)",
+    ("provider", "model", "outcome")
+)
+LLM_TOKENS = counter("llm_tokens_total", "LLM tokens by direction", ("provider", "model", "direction"))
+
+
+def record_llm_call(
+    provider: str,
+    model: str,
+    outcome: str,
+    seconds: float,
+    tokens_in: int = 0,
+    tokens_out: int = 0,
+    tokens_cached: int = 0
+):
+    """
+    记录一次 LLM 调用
+
+    Args:
+        provider: "deepseek" | "minimax"
+        model: 模型名
+        outcome: "ok" | "error" | "unavailable" | "circuit_open"
+        seconds: 耗时（含重试）
+        tokens_in: 输入令牌数（提供商返回的 usage）
+        tokens_out: 输出令牌数
+        tokens_cached: 输入令牌中命中提供商上下文缓存的部分
+    """
+    LLM_REQUEST_SECONDS.observe(seconds, provider=provider, model=model, outcome=outcome)
+    profiler.add_span(f"llm.{provider}", seconds)
+    if tokens_in:
+        LLM_TOKENS.inc(tokens_in, provider=provider, model=model, direction="in")
+    if tokens_out:
+        LLM_TOKENS.inc(tokens_out, provider=provider, model=model, direction="out")
+    if tokens_cached:
+        LLM_TOKENS.inc(tokens_cached, provider=provider, model=model, direction="cached_in")
+
+
+def llm_outcome(error: Optional[BaseException]) -> str:
+    """按异常类型归类调用结果"""
+    if error is None:
+        return "ok"
+    name = type(error).__name__
+    if name == "CircuitOpenError":
+        return "circuit_open"
+    if name == "ProviderUnavailableError":
+        return "unavailable"
+    return "error"
+
+
+def _singleflight_values(field: str):
+    def collect():
+        from services.singleflight import singleflight_stats
+        return {(name,): stats[field] for name, stats in singleflight_stats().items()}
+    return collect
+
+
+def _circuit_values():
+    from services.circuit_breaker import all_circuit_breakers
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    return {(name,): states[b.status()["state"]] for name, b in all_circuit_breakers().items()}
+
+
+def _limiter_values():
+    from services.provider_limits import all_provider_limiters
+    return {(name,): limiter.in_flight for name, limiter in all_provider_limiters().items()}
+
+
+REGISTRY.register(CounterFunc(
+    "singleflight_executions_total", "Calls actually executed per coalescing group", ("group",),
+    callback=_singleflight_values("executions")
+))
+REGISTRY.register(CounterFunc(
+    "singleflight_coalesced_total", "Calls that shared an in-flight result per coalescing group", ("group",),
+    callback=_singleflight_values("coalesced")
+))
+gauge(
+    "provider_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("provider",),
+    callback=_circuit_values
+)
+gauge("provider_in_flight", "LLM requests in flight per provider", ("provider",), callback=_limiter_values)
+
+
+def _admission_values(field: str):
+    def collect():
+        from services.admission import all_admission_pools
+        return {(name,): getattr(pool, field) for name, pool in all_admission_pools().items()}
+    return collect
+
+
+def _admission_rejections():
+    from services.admission import all_admission_pools
+    return {
+        (name, reason): count
+        for name, pool in all_admission_pools().items()
+        for reason, count in pool.rejected.items()
+    }
+
+
+gauge("admission_active", "Requests executing per admission pool", ("pool",), callback=_admission_values("active"))
+gauge("admission_queued", "Requests waiting per admission pool", ("pool",), callback=_admission_values("queued"))
+REGISTRY.register(CounterFunc(
+    "admission_rejected_total", "Requests rejected by admission control", ("pool", "reason"),
+    callback=_admission_rejections
+))
+
+
+def _dropped_logs():
+    from app.logging_config import dropped_records
+    return {(): dropped_records()}
+
+
+REGISTRY.register(CounterFunc(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full",
+    callback=_dropped_logs
+))
+
+
+def render() -> str:
+    """所有已注册指标的 Prometheus 文本"""
+    return REGISTRY.render()
@@ -2,30 +2,141 @@
 MiniMax API service
 支持 OCR、图片理解、文本生成
 """
+import logging
 import json
-import traceback
+import time
 import base64
-from typing import Dict, Any, Optional
-import httpx
-from app.config import MINIMAX_API_KEY, MINIMAX_GROUP_ID, MINIMAX_MODEL, MINIMAX_BASE_URL, MOCK_MODE
-from services.ai_provider import AIProvider
+from typing import Dict, Any, List, Optional
+from app.config import (
+    MINIMAX_API_KEY, MINIMAX_GROUP_ID, MINIMAX_MODEL, MINIMAX_BASE_URL, MOCK_MODE,
+    LLM_TIMEOUT, PROVIDER_LIMITS
+)
+from services.ai_provider import AIProvider, ProviderError
+from services.provider_limits import get_provider_limiter, estimate_tokens
+from services.singleflight import get_singleflight, digest_key
+from services.metrics import record_llm_call, llm_outcome
+
+logger = logging.getLogger(__name__)
+
+# MiniMax base_resp 中表示限流（RPM / TPM）的状态码，按 429 处理
+MINIMAX_RATE_LIMIT_CODES = {1002, 1039}
+
+
+# 账户余额不足
+MINIMAX_BALANCE_CODES = {1008}
+
+
+class MiniMaxRateLimitError(Exception):
+    """MiniMax 在 base_resp 中返回的限流错误"""
+    status_code = 429
+
+
+class MiniMaxAPIError(Exception):
+    """MiniMax 在 base_resp 中返回的其他错误（不重试）；余额不足时 status_code 为 402"""
+
+    def __init__(self, code: int, message: str):
+        balance = code in MINIMAX_BALANCE_CODES or "balance" in message.lower()
+        if balance:
+            message = f"MiniMax 账户余额不足，请充值或切换到 DeepSeek: {message}"
+        super().__init__(f"{message} (code: {code})")
+        self.code = code
+        self.status_code = 402 if balance else None
 
 
 class MiniMaxService(AIProvider):
     """Service for interacting with MiniMax API"""
 
     def __init__(self):
-        print(f"[MiniMax] Initializing, MOCK_MODE: {MOCK_MODE}")
+        logger.info("Initializing MiniMax client (mock mode: %s)", MOCK_MODE)
         self.api_key = MINIMAX_API_KEY
         self.group_id = MINIMAX_GROUP_ID
         self.model = MINIMAX_MODEL
         self.base_url = MINIMAX_BASE_URL
         self.mock_mode = MOCK_MODE
+        self.limiter = get_provider_limiter("minimax")
+        self.inflight = get_singleflight("minimax")
+        import httpx
+        # 复用连接池，连接数与准入层并发上限一致
+        max_in_flight = PROVIDER_LIMITS["minimax"]["max_in_flight"]
+        self.http = httpx.Client(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        )
+
+    def _send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送一次 chatcompletion_v2 请求"""
+        url = f"{self.base_url}/text/chatcompletion_v2"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        response = self.http.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+        result = response.json()
+
+        base_resp = result.get("base_resp") or {}
+        status_code = base_resp.get("status_code")
+        if status_code in MINIMAX_RATE_LIMIT_CODES:
+            raise MiniMaxRateLimitError(base_resp.get("status_msg", "rate limited"))
+        if status_code:
+            raise MiniMaxAPIError(status_code, base_resp.get("status_msg", ""))
+        return result
+
+    def _post(self, payload: Dict[str, Any], prompt_text: str = "") -> Dict[str, Any]:
+        """
+        经准入层发送请求（并发/速率限制，429/5xx 退避重试），相同请求体的并发调用合并为一次
+
+        Args:
+            payload: 请求体
+            prompt_text: 用于估算令牌数的提示词文本
+
+        Returns:
+            响应 JSON（可能与其他调用方共享，只读）
+        """
+        key = digest_key(json.dumps(payload, sort_keys=True, ensure_ascii=False))
+        return self.inflight.do(key, lambda: self._call(payload, prompt_text))
+
+    def _call(self, payload: Dict[str, Any], prompt_text: str) -> Dict[str, Any]:
+        """经准入层发送一次请求，并记录延迟与令牌指标"""
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            result = self.limiter.call(
+                lambda: self._send(payload),
+                estimated_tokens=estimate_tokens(prompt_text) + payload.get("max_tokens", 1024),
+                usage=lambda r: (r.get("usage") or {}).get("total_tokens", 0)
+            )
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            usage = (result or {}).get("usage") or {}
+            record_llm_call(
+                "minimax", payload.get("model", self.model), llm_outcome(error), time.perf_counter() - started,
+                tokens_in=usage.get("prompt_tokens", 0),
+                tokens_out=usage.get("completion_tokens", 0)
+            )
+
+    @staticmethod
+    def _content(result: Dict[str, Any]) -> str:
+        """取第一条回复的文本，响应中没有回复时抛出 ProviderError"""
+        try:
+            return result["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            status_msg = (result.get("base_resp") or {}).get("status_msg", "Unknown error")
+            raise ProviderError("minimax", f"MiniMax API error: {status_msg}")
 
     @property
     def provider_name(self) -> str:
         return "minimax"
 
+    def preconnect(self):
+        """发送一个 HEAD 请求建立并保留 HTTPS 连接（不计费，响应状态无关紧要）"""
+        if self.mock_mode or not self.api_key:
+            return
+        self.http.head(self.base_url)
+
     def generate_text(
         self,
         system_prompt: str,
@@ -43,59 +154,40 @@ class MiniMaxService(AIProvider):
         Returns:
             生成的文本
         """
-        if self.mock_mode:
-            return self._get_mock_response(user_prompt)
-
-        try:
-            url = f"{self.base_url}/text/chatcompletion_v2"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.model,
-                "group_id": self.group_id,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": kwargs.get("temperature", 0.7),
-                "max_tokens": kwargs.get("max_tokens", 2048)
-            }
+        return self.chat_messages(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            **kwargs
+        )
+
+    def chat_messages(
+        self,
+        messages: List[Dict[str, str]],
+        **kwargs
+    ) -> str:
+        """
+        多轮对话
 
-            response = httpx.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            result = response.json()
-
-            # 检查 API 返回的错误
-            if "base_resp" in result:
-                status_code = result.get("base_resp", {}).get("status_code")
-                status_msg = result.get("base_resp", {}).get("status_msg", "")
-                if status_code or status_msg:
-                    error_msg = f"{status_msg} (code: {status_code})"
-                    # 检查余额不足
-                    if "insufficient" in error_msg.lower() or "balance" in error_msg.lower() or status_code == 1008:
-                        return "⚠️ MiniMax 账户余额不足，请充值或切换到 DeepSeek"
-                    raise Exception(f"MiniMax API error: {error_msg}")
-
-            # 检查响应是否有效
-            if result.get("choices") and len(result["choices"]) > 0:
-                return result["choices"][0]["message"]["content"]
-            else:
-                # API 返回了错误
-                status_msg = result.get("base_resp", {}).get("status_msg", "Unknown error")
-                raise Exception(f"MiniMax API error: {status_msg}")
+        Args:
+            messages: OpenAI 格式的消息列表
+            **kwargs: temperature、max_tokens
 
-        except Exception as e:
-            print(f"[MiniMax] API error: {e}")
-            # 检查是否是余额不足
-            error_msg = str(e)
-            if "insufficient balance" in error_msg or "1008" in error_msg or "balance" in error_msg.lower():
-                return "⚠️ MiniMax 账户余额不足，请充值或切换到 DeepSeek"
-            traceback.print_exc()
-            return self._get_mock_response(user_prompt)
+        Returns:
+            生成的文本
+        """
+        if self.mock_mode:
+            return self._get_mock_response(messages[-1]["content"])
+
+        payload = {
+            "model": self.model,
+            "group_id": self.group_id,
+            "messages": messages,
+            "temperature": kwargs.get("temperature", 0.7),
+            "max_tokens": kwargs.get("max_tokens", 2048)
+        }
+        return self._content(self._post(payload, "".join(m["content"] for m in messages)))
 
     def extract_knowledge(
         self,
@@ -146,12 +238,12 @@ class MiniMaxService(AIProvider):
                 clean_response = "\n".join(clean_lines).strip()
             try:
                 result = json.loads(clean_response)
-                normalized = self._normalize_knowledge_format(result)
-                if normalized:
-                    return normalized
-                return result
-            except:
-                return self._get_mock_knowledge()
+            except json.JSONDecodeError:
+                raise ProviderError("minimax", "MiniMax returned invalid knowledge JSON")
+            normalized = self._normalize_knowledge_format(result)
+            if normalized:
+                return normalized
+            return result
 
     def answer_question(
         self,
@@ -176,76 +268,19 @@ class MiniMaxService(AIProvider):
                 "sources": [{"content": context[:500] if context else ""}]
             }
 
-        try:
-            url = f"{self.base_url}/text/chatcompletion_v2"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            system_prompt = """你是一个智能助教，擅长根据提供的教材内容回答学生的问题。
+        system_prompt = """你是一个智能助教，擅长根据提供的教材内容回答学生的问题。
 
 请根据以下上下文内容回答用户的问题。
 如果上下文中没有相关信息，请说明"我没有在教材中找到相关内容"。"""
 
-            user_prompt = f"上下文：\n{context}\n\n问题：{question}"
+        user_prompt = f"上下文：\n{context}\n\n问题：{question}"
 
-            payload = {
-                "model": self.model,
-                "group_id": self.group_id,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 2048
-            }
-
-            response = httpx.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            result = response.json()
-
-            # 检查 API 返回的错误
-            if "base_resp" in result:
-                status_code = result.get("base_resp", {}).get("status_code")
-                status_msg = result.get("base_resp", {}).get("status_msg", "")
-                if status_code or status_msg:
-                    error_msg = f"{status_msg} (code: {status_code})"
-                    # 检查余额不足
-                    if "insufficient" in error_msg.lower() or "balance" in error_msg.lower() or status_code == 1008:
-                        return {
-                            "answer": "⚠️ MiniMax 账户余额不足 (insufficient balance)，请充值或切换到 DeepSeek",
-                            "sources": []
-                        }
-                    return {
-                        "answer": f"MiniMax API 错误: {error_msg}",
-                        "sources": []
-                    }
+        answer = self.generate_text(system_prompt, user_prompt, temperature=0.7, max_tokens=2048)
 
-            # 正常解析响应
-            answer = result["choices"][0]["message"]["content"]
-
-            return {
-                "answer": answer,
-                "sources": [{"content": context[:500] if context else ""}]
-            }
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"[MiniMax] answer_question error: {error_msg}")
-            traceback.print_exc()
-            # 检查是否是余额不足
-            if "insufficient balance" in error_msg.lower() or "1008" in error_msg or "balance" in error_msg.lower():
-                return {
-                    "answer": "⚠️ MiniMax 账户余额不足 (insufficient balance)，请充值或切换到 DeepSeek",
-                    "sources": []
-                }
-            # 检查是否是连接/API 错误
-            return {
-                "answer": f"⚠️ MiniMax 服务暂时不可用: {error_msg[:100]}",
-                "sources": []
-            }
+        return {
+            "answer": answer,
+            "sources": [{"content": context[:500] if context else ""}]
+        }
 
     def answer_question_without_context(self, question: str, **kwargs) -> Dict[str, Any]:
         """
@@ -263,14 +298,7 @@ class MiniMaxService(AIProvider):
                 "sources": []
             }
 
-        try:
-            url = f"{self.base_url}/text/chatcompletion_v2"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            system_prompt = """你是一个智能助教，擅长回答学生的学习问题。
+        system_prompt = """你是一个智能助教，擅长回答学生的学习问题。
 
 重要提示：
 1. 用户的问题没有在其上传的学习资料中找到相关内容
@@ -280,57 +308,14 @@ class MiniMaxService(AIProvider):
 
 请直接回答用户的问题，不要重复上述提示。"""
 
-            user_prompt = f"问题：{question}"
-
-            payload = {
-                "model": self.model,
-                "group_id": self.group_id,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 2048
-            }
-
-            response = httpx.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            result = response.json()
-
-            # 检查 API 返回的错误
-            if "base_resp" in result:
-                status_code = result.get("base_resp", {}).get("status_code")
-                status_msg = result.get("base_resp", {}).get("status_msg", "")
-                if status_code or status_msg:
-                    error_msg = f"{status_msg} (code: {status_code})"
-                    return {
-                        "answer": f"MiniMax API 错误: {error_msg}",
-                        "sources": []
-                    }
+        user_prompt = f"问题：{question}"
 
-            # 正常解析响应
-            answer = result["choices"][0]["message"]["content"]
+        answer = self.generate_text(system_prompt, user_prompt, temperature=0.7, max_tokens=2048)
 
-            return {
-                "answer": answer,
-                "sources": []
-            }
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"[MiniMax] answer_question_without_context error: {error_msg}")
-            # 检查是否是余额不足
-            if "insufficient balance" in error_msg.lower() or "1008" in error_msg or "balance" in error_msg.lower():
-                return {
-                    "answer": "⚠️ MiniMax 账户余额不足 (insufficient balance)，请充值或切换到 DeepSeek",
-                    "sources": []
-                }
-            # 检查是否是连接/API 错误
-            return {
-                "answer": f"⚠️ MiniMax 服务暂时不可用: {error_msg[:100]}",
-                "sources": []
-            }
+        return {
+            "answer": answer,
+            "sources": []
+        }
 
     def support_ocr(self) -> bool:
         """MiniMax 支持 OCR"""
@@ -358,12 +343,6 @@ class MiniMaxService(AIProvider):
             # 将图片转为 base64
             image_base64 = base64.b64encode(image_data).decode('utf-8')
 
-            url = f"{self.base_url}/text/chatcompletion_v2"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
             payload = {
                 "model": self.model,
                 "group_id": self.group_id,
@@ -387,16 +366,13 @@ class MiniMaxService(AIProvider):
                 "temperature": 0.3
             }
 
-            response = httpx.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            return self._content(self._post(payload))
 
+        except ProviderError:
+            raise
         except Exception as e:
-            print(f"[MiniMax] OCR error: {e}")
-            traceback.print_exc()
-            return ""
+            logger.exception("OCR error: %s", e)
+            raise ProviderError("minimax", f"MiniMax OCR failed: {e}") from e
 
     def support_image_understanding(self) -> bool:
         """MiniMax 支持图片理解"""
@@ -428,12 +404,6 @@ class MiniMaxService(AIProvider):
             if not prompt:
                 prompt = "请详细描述这张图片的内容。"
 
-            url = f"{self.base_url}/text/chatcompletion_v2"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
             payload = {
                 "model": self.model,
                 "group_id": self.group_id,
@@ -457,16 +427,13 @@ class MiniMaxService(AIProvider):
                 "temperature": 0.7
             }
 
-            response = httpx.post(url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            return self._content(self._post(payload, prompt))
 
+        except ProviderError:
+            raise
         except Exception as e:
-            print(f"[MiniMax] Image understanding error: {e}")
-            traceback.print_exc()
-            return ""
+            logger.exception("Image understanding error: %s", e)
+            raise ProviderError("minimax", f"MiniMax image understanding failed: {e}") from e
 
     def _normalize_knowledge_format(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """规范化不同格式的响应到统一格式"""
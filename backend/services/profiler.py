@@ -0,0 +1,254 @@
+"""
+Request profiler
+按需对单个请求做采样剖析：后台线程定时采集正在执行该请求 span 的线程调用栈（折叠栈格式，可直接生成火焰图），
+同时记录各阶段 span 时间线（Chrome trace 格式，可在 chrome://tracing 或 Perfetto 中查看）
+"""
+import logging
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import PROFILING_INTERVAL_MS, PROFILING_DIR, PROFILING_KEEP
+
+logger = logging.getLogger(__name__)
+
+FOLDED_SUFFIX = ".folded"
+TRACE_SUFFIX = ".trace.json"
+
+_current = ContextVar("request_profile", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    """把调用栈转换为折叠栈的一行（根在前，以 ; 分隔）"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class RequestProfile:
+    """单个请求的采样剖析与 span 时间线"""
+
+    def __init__(self, method: str, path: str, interval_ms: float = PROFILING_INTERVAL_MS):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.interval = interval_ms / 1000
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.duration = None
+        # 正在执行该请求 span 的线程 -> 嵌套 span 数；只采样这些线程，
+        # 线程池线程转去处理其他请求、事件循环线程处理其他协程时不计入本请求
+        self.threads: Dict[int, int] = {}
+        # (名称, 线程 id, 开始, 结束)，时间为 perf_counter 秒
+        self.spans = []
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    def attach(self):
+        """把当前线程加入采样范围（span 开始）"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.threads[thread_id] = self.threads.get(thread_id, 0) + 1
+
+    def detach(self):
+        """span 结束：当前线程不再有该请求的 span 时移出采样范围"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            depth = self.threads.get(thread_id, 0) - 1
+            if depth > 0:
+                self.threads[thread_id] = depth
+            else:
+                self.threads.pop(thread_id, None)
+
+    def add_span(self, name: str, start: float, end: float):
+        with self._lock:
+            self.spans.append((name, threading.get_ident(), start, end))
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            with self._lock:
+                threads = list(self.threads)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                self.stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+        self._sampler.join()
+
+    def finish(self):
+        """停止采样并写盘（阻塞，在线程池中调用）"""
+        self.stop()
+        try:
+            self.write()
+        except OSError as e:
+            logger.warning("Failed to write profile %s: %s", self.id, e)
+
+    def write(self, directory: str = PROFILING_DIR) -> Dict[str, str]:
+        """
+        写出折叠栈与时间线文件
+
+        Returns:
+            {"folded": 路径, "trace": 路径}
+        """
+        os.makedirs(directory, exist_ok=True)
+        folded_path = os.path.join(directory, self.id + FOLDED_SUFFIX)
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        events = [{
+            "name": f"{self.method} {self.path}", "ph": "X", "pid": 1, "tid": 0,
+            "ts": 0, "dur": round(self.duration * 1e6),
+        }]
+        with self._lock:
+            spans = list(self.spans)
+        for name, thread_id, start, end in spans:
+            events.append({
+                "name": name, "ph": "X", "pid": 1, "tid": thread_id,
+                "ts": round((start - self.started) * 1e6), "dur": round((end - start) * 1e6),
+            })
+        trace = {
+            "traceEvents": events,
+            "metadata": {
+                "profile_id": self.id,
+                "method": self.method,
+                "path": self.path,
+                "started_at": self.wall_started,
+                "duration_ms": round(self.duration * 1000, 2),
+                "samples": self.samples,
+                "interval_ms": self.interval * 1000,
+            },
+        }
+        trace_path = os.path.join(directory, self.id + TRACE_SUFFIX)
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+
+        _prune(directory)
+        return {"folded": folded_path, "trace": trace_path}
+
+
+def _prune(directory: str, keep: int = PROFILING_KEEP):
+    """只保留最近 keep 个剖析结果"""
+    traces = sorted(f for f in os.listdir(directory) if f.endswith(TRACE_SUFFIX))
+    for name in traces[:-keep] if keep > 0 else []:
+        profile_id = name[:-len(TRACE_SUFFIX)]
+        for suffix in (TRACE_SUFFIX, FOLDED_SUFFIX):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+@asynccontextmanager
+async def profile_request(method: str, path: str):
+    """
+    剖析上下文：进入时开始采样，退出时停止并写盘
+
+    停止采样线程（join）、写盘和清理旧结果在线程池中执行，不阻塞事件循环
+
+    Yields:
+        RequestProfile
+    """
+    profile = RequestProfile(method, path)
+    token = _current.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        await run_in_threadpool(profile.finish)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """记录一个阶段 span；当前请求未开启剖析时几乎无开销"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.attach()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, started, time.perf_counter())
+        profile.detach()
+
+
+def add_span(name: str, seconds: float):
+    """补记一个刚结束、耗时 seconds 的 span"""
+    profile = _current.get()
+    if profile is not None:
+        end = time.perf_counter()
+        profile.add_span(name, end - seconds, end)
+
+
+def traced(name: str):
+    """装饰器：把函数调用记为 span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def list_profiles(directory: str = PROFILING_DIR) -> List[Dict[str, Any]]:
+    """已保存的剖析结果（新的在前）"""
+    if not os.path.isdir(directory):
+        return []
+    result = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(TRACE_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                result.append(json.load(f)["metadata"])
+        except (OSError, ValueError, KeyError):
+            continue
+    return result
+
+
+def profile_path(profile_id: str, suffix: str, directory: str = PROFILING_DIR) -> Optional[str]:
+    """剖析文件路径；ID 非法或文件不存在时返回 None"""
+    if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+        return None
+    path = os.path.join(directory, profile_id + suffix)
+    return path if os.path.isfile(path) else None
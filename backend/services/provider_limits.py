@@ -0,0 +1,270 @@
+"""
+Provider admission control
+每个 AI 提供商一个准入层：最大并发数、每分钟请求数/令牌数令牌桶、429/5xx 抖动指数退避重试
+"""
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.config import (
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_QUEUE_TIMEOUT,
+    PROVIDER_LIMITS,
+)
+from services.ai_provider import ProviderError, ProviderUnavailableError
+from services.circuit_breaker import get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def estimate_tokens(*texts: str) -> int:
+    """粗略估算令牌数（中文约 1 字 1 token，英文约 4 字符 1 token，取折中）"""
+    return max(1, sum(len(t) for t in texts if t) // 2)
+
+
+def status_code_of(error: Exception) -> Optional[int]:
+    """从 openai / httpx 异常中取 HTTP 状态码"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """
+    连接失败或超时：openai.APIConnectionError（含 APITimeoutError）、httpx.TransportError（含各类 Timeout）
+
+    只检查已导入的模块：异常来自某个 SDK 时该 SDK 必然已导入，启动时无需为此导入 openai
+    """
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """每分钟补充 rate_per_minute 个令牌的令牌桶；rate 为 0 表示不限"""
+
+    def __init__(self, rate_per_minute: int):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_minute / 60.0)
+        self.updated = now
+
+    def acquire(self, amount: float, timeout: float) -> bool:
+        """
+        取走 amount 个令牌，不足时等待
+
+        Args:
+            amount: 令牌数（超过桶容量时按容量计）
+            timeout: 最长等待秒数
+
+        Returns:
+            是否在超时前取得
+        """
+        if self.rate_per_minute <= 0:
+            return True
+        amount = min(amount, self.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return True
+                wait = (amount - self.tokens) * 60.0 / self.rate_per_minute
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, delta: float):
+        """按实际用量修正（正数为追加扣除，可透支）"""
+        if self.rate_per_minute <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens -= delta
+
+
+class ProviderLimiter:
+    """单个提供商的准入层"""
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int = 8,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_retries: int = LLM_MAX_RETRIES,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.breaker = get_circuit_breaker(name)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _admit(self, estimated_tokens: int):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise ProviderUnavailableError(self.name, f"{self.name}: too many requests in flight")
+        if not (self.requests.acquire(1, self.queue_timeout) and
+                self.tokens.acquire(estimated_tokens, self.queue_timeout)):
+            self._slots.release()
+            self.rejected += 1
+            raise ProviderUnavailableError(self.name, f"{self.name}: local rate limit exceeded")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 1, usage: Optional[Callable[[Any], int]] = None):
+        """
+        在准入控制下调用提供商，429/5xx/连接错误按抖动指数退避重试
+
+        Args:
+            fn: 实际发起请求的函数
+            estimated_tokens: 预估令牌数（输入 + 输出）
+            usage: 从返回值中读取实际令牌数的函数，用于修正 TPM 令牌桶
+
+        Returns:
+            fn 的返回值
+
+        Raises:
+            CircuitOpenError: 提供商熔断中
+            ProviderUnavailableError: 排队超时或重试耗尽
+            ProviderError: 不可重试的错误
+        """
+        # 熔断时直接失败，不占用并发槽和配额
+        self.breaker.before_call()
+        try:
+            result, elapsed = self._call_with_retries(fn, estimated_tokens)
+        except ProviderUnavailableError as e:
+            if e.status_code is None and e.__cause__ is None:
+                # 本地排队超时，与提供商健康度无关
+                self.breaker.release_probe()
+            else:
+                self.breaker.record_failure()
+            raise
+        except ProviderError as e:
+            if e.status_code is not None and e.status_code < 500:
+                self.breaker.release_probe()
+            else:
+                self.breaker.record_failure()
+            raise
+        self.breaker.record_success(elapsed)
+
+        if usage is not None:
+            actual = usage(result)
+            if actual:
+                self.tokens.adjust(actual - estimated_tokens)
+        return result
+
+    def _call_with_retries(self, fn: Callable[[], Any], estimated_tokens: int):
+        """返回 (结果, 成功那次请求的耗时)"""
+        for attempt in range(self.max_retries + 1):
+            self._admit(estimated_tokens)
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                status = status_code_of(e)
+                retryable = status in RETRYABLE_STATUS or _is_connection_error(e)
+                if not retryable:
+                    raise ProviderError(self.name, f"{self.name} request failed: {e}", status) from e
+                if attempt >= self.max_retries:
+                    raise ProviderUnavailableError(
+                        self.name,
+                        f"{self.name} unavailable after {attempt + 1} attempts: {e}",
+                        status
+                    ) from e
+                delay = _retry_after(e) or min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)  # jitter
+                self.retries += 1
+                logger.info(
+                    "%s: %s, retry %d/%d in %.2fs",
+                    self.name, status or type(e).__name__, attempt + 1, self.max_retries, delay
+                )
+                time.sleep(delay)
+                continue
+            finally:
+                self._release()
+            return result, time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        """当前并发与累计重试/拒绝次数"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "circuit": self.breaker.status(),
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_provider_limiter(name: str) -> ProviderLimiter:
+    """
+    获取提供商的准入层（进程内单例）
+
+    Args:
+        name: "deepseek" | "minimax"
+
+    Returns:
+        ProviderLimiter
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            limits = PROVIDER_LIMITS.get(name, {})
+            _limiters[name] = ProviderLimiter(
+                name,
+                max_in_flight=limits.get("max_in_flight", 8),
+                requests_per_minute=limits.get("rpm", 0),
+                tokens_per_minute=limits.get("tpm", 0),
+            )
+        return _limiters[name]
+
+
+def all_provider_limiters() -> Dict[str, ProviderLimiter]:
+    """所有已创建的准入层"""
+    with _limiters_lock:
+        return dict(_limiters)
@@ -0,0 +1,98 @@
+"""
+Provider registry
+预先初始化并长期持有各 AI 提供商实例（客户端与连接池复用），
+调用方按请求 / 租户选择提供商，不修改任何全局状态，也不重复初始化
+"""
+import logging
+import threading
+from typing import Dict, Iterable, List
+
+from services.ai_provider import AIProvider
+
+logger = logging.getLogger(__name__)
+
+# 可选提供商："both" 为按延迟与健康状况在两者之间路由
+PROVIDERS = ("minimax", "deepseek", "both")
+
+
+class ProviderRegistry:
+    """按名称缓存提供商实例；"both" 复用已注册的单个提供商实例"""
+
+    def __init__(self):
+        self._instances: Dict[str, AIProvider] = {}
+        self._lock = threading.RLock()
+
+    def _create(self, name: str) -> AIProvider:
+        if name == "minimax":
+            from services.minimax_service import MiniMaxService
+            return MiniMaxService()
+        if name == "deepseek":
+            from services.deepseek_service import DeepSeekService
+            return DeepSeekService()
+        if name == "both":
+            from services.routing_provider import RoutingProvider
+            return RoutingProvider({"deepseek": self.get("deepseek"), "minimax": self.get("minimax")})
+        raise ValueError(f"Unknown provider: {name}. Allowed: {list(PROVIDERS)}")
+
+    def get(self, name: str) -> AIProvider:
+        """
+        获取提供商实例，首次使用时创建
+
+        Args:
+            name: "minimax" | "deepseek" | "both"
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._instances[name] = self._create(name)
+                logger.info("Provider %s initialized", name)
+            return instance
+
+    def warm(self, names: Iterable[str], preconnect: bool = False) -> List[str]:
+        """
+        预先初始化提供商；失败（如缺少密钥）只记录日志，实际使用时再报错
+
+        Args:
+            names: 提供商名称
+            preconnect: 是否同时预先建立连接（连接失败不影响结果）
+
+        Returns:
+            初始化成功的提供商
+        """
+        ready = []
+        for name in names:
+            try:
+                instance = self.get(name)
+            except Exception as e:
+                logger.warning("Provider %s warm-up failed: %s", name, e)
+                continue
+            ready.append(name)
+            if preconnect:
+                try:
+                    instance.preconnect()
+                except Exception as e:
+                    logger.warning("Provider %s pre-connect failed: %s", name, e)
+        return ready
+
+    def initialized(self) -> List[str]:
+        with self._lock:
+            return list(self._instances)
+
+
+_registry = ProviderRegistry()
+
+
+def get_provider(name: str) -> AIProvider:
+    """从全局注册表获取提供商实例"""
+    return _registry.get(name)
+
+
+def warm_providers(names: Iterable[str], preconnect: bool = False) -> List[str]:
+    return _registry.warm(names, preconnect)
+
+
+def initialized_providers() -> List[str]:
+    return _registry.initialized()
@@ -0,0 +1,289 @@
+"""
+QA sessions
+多轮问答会话：保留已检索分块组成的工作集、最近几轮对话和更早对话的摘要。
+追问与上次检索的问题足够相似时直接复用工作集，不再查询向量库；
+提示词按“固定系统提示词 → 参考资料 → 摘要 → 最近对话 → 问题”排列，参考资料只追加不重排，
+连续提问的消息前缀保持不变，可命中提供商侧的上下文缓存
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services import metrics
+from services.provider_registry import get_provider
+from services.rag_service import RAGService, RELEVANCE_MAX_DISTANCE
+from app.config import (
+    QA_SESSION_WORKING_SET, QA_SESSION_RECENT_TURNS, QA_SESSION_SUMMARY_MAX_CHARS,
+    QA_SESSION_REUSE_SIMILARITY, QA_SESSION_IDLE_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# 会话内不变，作为每次请求的第一段前缀
+SYSTEM_PROMPT = """你是一个智能助教，擅长根据提供的教材内容回答学生的问题，并能结合之前的对话理解追问。
+
+请优先根据参考资料回答。
+如果参考资料中没有相关信息，请基于自己的知识回答，并明确说明这个答案来自 AI 自身的知识库，而非用户的资料。"""
+
+SUMMARY_PROMPT = """你负责压缩师生问答记录。请把已有摘要和新增对话合并为一段简洁的中文摘要，
+保留学生关心的概念、已经给出的结论和尚未解决的问题，不要添加新内容，直接输出摘要。"""
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / denominator if denominator else 0.0
+
+
+class QASession:
+    """
+    单个文档上的多轮问答会话
+
+    同一会话的提问串行执行（WebSocket 逐条处理消息，重连时由锁保证）
+    """
+
+    def __init__(
+        self,
+        document_id: str,
+        rag: RAGService,
+        provider: str,
+        session_id: Optional[str] = None,
+        working_set_size: int = QA_SESSION_WORKING_SET,
+        recent_turns: int = QA_SESSION_RECENT_TURNS,
+        reuse_similarity: float = QA_SESSION_REUSE_SIMILARITY
+    ):
+        """
+        Args:
+            document_id: 问答的文档
+            rag: 检索使用的 RAG 服务
+            provider: 提供商名称
+            session_id: 会话 ID，默认随机生成
+            working_set_size: 工作集最多保留的分块数
+            recent_turns: 原样保留的最近对话轮数
+            reuse_similarity: 复用工作集的最低余弦相似度
+        """
+        self.session_id = session_id or uuid.uuid4().hex
+        self.document_id = document_id
+        self.rag = rag
+        self.provider = provider
+        self.working_set_size = working_set_size
+        self.recent_turns = recent_turns
+        self.reuse_similarity = reuse_similarity
+
+        # chunk_id -> 分块（插入顺序即提示词中的顺序）
+        self.working_set: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # chunk_id -> 最近一次命中的轮次，用于淘汰
+        self._last_hit: Dict[str, int] = {}
+        self.summary = ""
+        self.turns: List[Tuple[str, str]] = []
+        self.turn = 0
+        # 上次查询向量库所用的问题向量及其命中的分块
+        self._retrieval_embedding: Optional[np.ndarray] = None
+        self._retrieval_hits: List[str] = []
+
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+        # 后台压缩进行中；reset 后递增，丢弃过期的压缩结果
+        self._compacting = False
+        self._epoch = 0
+
+    def reset(self):
+        """清空工作集与对话历史"""
+        with self.lock:
+            self._epoch += 1
+            self.working_set.clear()
+            self._last_hit.clear()
+            self.summary = ""
+            self.turns = []
+            self._retrieval_embedding = None
+            self._retrieval_hits = []
+
+    def retrieve(self, question: str, top_k: int = 3) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        为问题准备参考资料：追问相似时复用上次的检索结果，否则查询向量库并把新分块加入工作集
+
+        Args:
+            question: 问题
+            top_k: 查询向量库时返回的分块数
+
+        Returns:
+            (本轮命中的分块, 是否复用了工作集)
+        """
+        embedding = np.asarray(self.rag.embed_query(question), dtype=np.float32)
+
+        if (
+            self._retrieval_embedding is not None
+            and self._retrieval_hits
+            and _cosine(embedding, self._retrieval_embedding) >= self.reuse_similarity
+        ):
+            hits = [chunk_id for chunk_id in self._retrieval_hits if chunk_id in self.working_set]
+            if hits:
+                metrics.QA_SESSION_RETRIEVALS.inc(result="reused")
+                for chunk_id in hits:
+                    self._last_hit[chunk_id] = self.turn
+                return [self.working_set[chunk_id] for chunk_id in hits], True
+
+        metrics.QA_SESSION_RETRIEVALS.inc(result="queried")
+        sources = self.rag.search_by_embedding(self.document_id, embedding, top_k)
+        relevant = [s for s in sources if s.get("distance", 2) < RELEVANCE_MAX_DISTANCE]
+        for source in relevant:
+            if source["chunk_id"] not in self.working_set:
+                self.working_set[source["chunk_id"]] = source
+            self._last_hit[source["chunk_id"]] = self.turn
+        self._evict()
+
+        self._retrieval_embedding = embedding
+        self._retrieval_hits = [s["chunk_id"] for s in relevant]
+        return relevant, False
+
+    def _evict(self):
+        """工作集超出上限时淘汰最久未命中的分块（本轮命中的分块不淘汰）"""
+        while len(self.working_set) > self.working_set_size:
+            oldest = min(self.working_set, key=lambda chunk_id: self._last_hit.get(chunk_id, -1))
+            if self._last_hit.get(oldest) == self.turn:
+                break
+            del self.working_set[oldest]
+            self._last_hit.pop(oldest, None)
+
+    def build_messages(self, question: str) -> List[Dict[str, str]]:
+        """按前缀稳定的顺序组装消息"""
+        system = SYSTEM_PROMPT
+        if self.working_set:
+            system += "\n\n参考资料：\n" + "\n\n".join(s["content"] for s in self.working_set.values())
+        messages = [{"role": "system", "content": system}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"此前对话摘要：\n{self.summary}"})
+        for asked, answered in self.turns:
+            messages.append({"role": "user", "content": asked})
+            messages.append({"role": "assistant", "content": answered})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def ask(self, question: str, top_k: int = 3) -> Dict[str, Any]:
+        """
+        回答一个问题（阻塞，在线程池中调用）
+
+        Args:
+            question: 问题
+            top_k: 查询向量库时返回的分块数
+
+        Returns:
+            答案、本轮参考的分块、是否复用检索结果、工作集大小
+        """
+        with self.lock:
+            self.last_active = time.monotonic()
+            self.turn += 1
+            sources, reused = self.retrieve(question, top_k)
+
+            with metrics.stage("context_packing"):
+                messages = self.build_messages(question)
+            answer = get_provider(self.provider).chat_messages(messages)
+
+            self.turns.append((question, answer))
+            self.last_active = time.monotonic()
+            return {
+                "answer": answer,
+                "sources": sources,
+                "provider": self.provider,
+                "source_type": "knowledge_base" if sources else "ai_knowledge",
+                "reused_retrieval": reused,
+                "working_set": len(self.working_set),
+                "turn": self.turn,
+            }
+
+    def needs_compaction(self) -> bool:
+        """
+        对话是否达到压缩阈值
+
+        攒够 2 × recent_turns 轮才压缩一次，两次压缩之间摘要不变，
+        “参考资料 → 摘要 → 对话”前缀只追加，提供商缓存可持续命中
+        """
+        return not self._compacting and len(self.turns) >= 2 * max(self.recent_turns, 1)
+
+    def compact(self):
+        """
+        把最近 recent_turns 轮之前的对话并入摘要（后台调用，不占用提问延迟）
+
+        摘要模型调用期间不持有会话锁，追问可以照常进行；摘要调用失败时退化为截断拼接
+        """
+        with self.lock:
+            if not self.needs_compaction():
+                return
+            self._compacting = True
+            epoch = self._epoch
+            folded = self.turns[:len(self.turns) - self.recent_turns]
+            previous = self.summary
+
+        transcript = "\n".join(f"问：{q}\n答：{a}" for q, a in folded)
+        try:
+            summary = get_provider(self.provider).generate_text(
+                SUMMARY_PROMPT,
+                f"已有摘要：\n{previous or '（无）'}\n\n新增对话：\n{transcript}"
+            )
+        except Exception as e:
+            logger.warning("QA session %s summary failed: %s", self.session_id, e)
+            summary = f"{previous}\n{transcript}".strip()
+
+        with self.lock:
+            self._compacting = False
+            # 压缩期间会话被重置：丢弃结果
+            if epoch != self._epoch:
+                return
+            # 压缩期间新增的对话保留在 turns 末尾
+            self.turns = self.turns[len(folded):]
+            self.summary = summary[-QA_SESSION_SUMMARY_MAX_CHARS:]
+
+
+class QASessionRegistry:
+    """进程内的会话表：连接断开后会话保留 idle_timeout 秒，期间可凭 session_id 继续"""
+
+    def __init__(self, idle_timeout: float = QA_SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, QASession] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        deadline = time.monotonic() - self.idle_timeout
+        for session_id in [k for k, s in self._sessions.items() if s.last_active < deadline]:
+            del self._sessions[session_id]
+
+    def open(
+        self,
+        document_id: str,
+        rag: RAGService,
+        provider: str,
+        session_id: Optional[str] = None
+    ) -> QASession:
+        """
+        继续已有会话或新建会话
+
+        Args:
+            document_id: 问答的文档
+            rag: 检索使用的 RAG 服务
+            provider: 提供商名称
+            session_id: 要继续的会话；不存在、已过期或属于其他文档时新建
+
+        Returns:
+            会话
+        """
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None or session.document_id != document_id:
+                session = QASession(document_id, rag, provider)
+                self._sessions[session.session_id] = session
+            session.provider = provider
+            session.last_active = time.monotonic()
+            return session
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
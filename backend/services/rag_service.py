@@ -1,98 +1,72 @@
 """
 RAG (Retrieval-Augmented Generation) service
 """
-import chromadb
-from chromadb.config import Settings
+import logging
+import time
 from typing import List, Dict, Any, Optional
-from services.deepseek_service import DeepSeekService
-from services.minimax_service import MiniMaxService
 from services.document_service import DocumentService
-from services.ai_provider import AIServiceSelector
-from app.config import AI_PROVIDER
+from services.ai_provider import AIProvider
+from services.provider_registry import get_provider
+from services.vector_store import get_vector_store
+from services.embedding_service import get_embedding_service, get_embedding_cache
+from services.bulk_indexer import BulkIndexer
+from services.dedup_service import ChunkDeduplicator
+from services.embedding_cache import text_digest
+from services.singleflight import get_singleflight
+from services import metrics
+from services.profiler import traced
+from app.config import AI_PROVIDER, VECTOR_BACKEND, NUMPY_VECTOR_DIR, CHUNK_DEDUP_ENABLED, CHUNK_DEDUP_MAX_DISTANCE
 
-# 嵌入模型 - 使用轻量级模型
-EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+logger = logging.getLogger(__name__)
 
-
-class EmbeddingService:
-    """本地嵌入服务"""
-
-    def __init__(self):
-        print(f"[Embedding] Loading model: {EMBEDDING_MODEL}...")
-        from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
-        print("[Embedding] Model loaded!")
-
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """将文本转换为嵌入向量"""
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
-
-
-# 全局嵌入服务实例
-_embedding_service = None
-
-
-def get_embedding_service() -> EmbeddingService:
-    """获取嵌入服务单例"""
-    global _embedding_service
-    if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-    return _embedding_service
+# 余弦距离低于该值的分块视为与问题相关（ChromaDB: 0 = 相同, 2 = 相反；实测相关 1.78、无关 1.91）
+RELEVANCE_MAX_DISTANCE = 1.85
 
 
 class RAGService:
     """Service for RAG-based question answering"""
 
-    def __init__(self, provider: Optional[str] = None, persist_directory: str = "./data/chroma"):
+    def __init__(
+        self,
+        provider: Optional[str] = None,
+        persist_directory: str = "./data/chroma",
+        vector_backend: Optional[str] = None
+    ):
         """
         初始化 RAG 服务
 
         Args:
-            provider: AI 提供商 "minimax" | "deepseek"，默认使用配置
+            provider: AI 提供商 "minimax" | "deepseek" | "both"，默认使用配置
             persist_directory: ChromaDB 持久化目录
+            vector_backend: 向量存储 "chroma" | "numpy"，默认使用配置
         """
         self.provider = provider or AI_PROVIDER
-        self.selector = AIServiceSelector(self.provider)
-        self.ai_service = self.selector.get_service()
         self.document_service = DocumentService()
-        self.persist_directory = persist_directory
-        self.client = None
-        self.collections = {}
-        print(f"[RAGService] Using AI provider: {self.provider}")
+        self.vector_backend = vector_backend or VECTOR_BACKEND
+        self.persist_directory = NUMPY_VECTOR_DIR if self.vector_backend == "numpy" else persist_directory
+        self.vector_store = get_vector_store(self.vector_backend, self.persist_directory)
+        self.deduplicator = ChunkDeduplicator(CHUNK_DEDUP_MAX_DISTANCE) if CHUNK_DEDUP_ENABLED else None
+        # 累计去重统计
+        self.dedup_totals = {"chunks": 0, "dropped": 0, "linked": 0, "reused_embeddings": 0, "embedding_ms_saved": 0.0}
+        # 同一文档的并发索引、相同问题的并发查询嵌入只执行一次
+        self.index_inflight = get_singleflight("rag.index")
+        self.query_inflight = get_singleflight("embedding.query")
+        logger.info("Using AI provider: %s, vector backend: %s", self.provider, self.vector_backend)
+
+    @property
+    def ai_service(self) -> AIProvider:
+        """默认提供商实例"""
+        return get_provider(self.provider)
 
     def set_provider(self, provider: str):
         """
-        切换 AI 提供商
+        切换默认 AI 提供商（未指定提供商的调用使用）
 
         Args:
-            provider: 新提供商 "minimax" | "deepseek"
+            provider: 新提供商 "minimax" | "deepseek" | "both"
         """
         self.provider = provider
-        self.selector.switch_provider(provider)
-        self.ai_service = self.selector.get_service()
-        print(f"[RAGService] Switched to provider: {provider}")
-
-    def _get_client(self):
-        """Get or create ChromaDB client"""
-        if self.client is None:
-            self.client = chromadb.PersistentClient(
-                path=self.persist_directory
-            )
-        return self.client
-
-    def create_collection(self, document_id: str):
-        """
-        Create a collection for a document
-
-        Args:
-            document_id: Document ID
-        """
-        client = self._get_client()
-        collection_name = f"doc_{document_id}"
-        collection = client.get_or_create_collection(name=collection_name)
-        self.collections[document_id] = collection
-        return collection
+        logger.info("Switched to provider: %s", provider)
 
     def add_document(
         self,
@@ -109,25 +83,175 @@ class RAGService:
             text: Document text
             chunk_size: Size of text chunks
             overlap: Overlap between chunks
-        """
-        # Create collection if not exists
-        if document_id not in self.collections:
-            self.create_collection(document_id)
 
+        Returns:
+            去重统计（丢弃/链接的分块数、节省的嵌入时间）
+        """
         # Chunk text
         chunks = self.document_service.chunk_text(text, chunk_size, overlap)
 
+        # 去重：丢弃文档内近重复分块，跨文档重复的分块复用已缓存的向量
+        chunks, reused, dedup_stats = self._dedup_chunks(document_id, chunks)
+
         # 生成真实嵌入向量
         embedding_service = get_embedding_service()
-        embeddings = embedding_service.embed_texts(chunks)
-
-        # Add to collection
-        collection = self.collections[document_id]
-        collection.add(
-            documents=chunks,
-            embeddings=embeddings,
-            ids=[f"chunk_{i}" for i in range(len(chunks))]
-        )
+        to_encode = [i for i in range(len(chunks)) if i not in reused]
+        encoded = iter(embedding_service.embed_texts([chunks[i] for i in to_encode]))
+        embeddings = [reused[i] if i in reused else next(encoded) for i in range(len(chunks))]
+
+        # Add to vector store
+        self.vector_store.add(document_id, chunks, embeddings)
+
+        timing = embedding_service.stats()
+        per_chunk_ms = timing["avg_batch_ms"] / timing["avg_batch_size"] if timing.get("avg_batch_size") else 0.0
+        return self._report_dedup(document_id, dedup_stats, per_chunk_ms)
+
+    @traced("rag.ensure_document")
+    def ensure_document(self, document_id: str, text: str) -> bool:
+        """
+        文档未索引时建立索引，并发请求同一文档只索引一次
+
+        Args:
+            document_id: Document ID
+            text: Document text
+
+        Returns:
+            本次调用是否新建了索引
+        """
+        if self.vector_store.has_document(document_id):
+            return False
+
+        def index():
+            if self.vector_store.has_document(document_id):
+                return False
+            self.add_document(document_id, text)
+            return True
+
+        return self.index_inflight.do(document_id, index)
+
+    def _dedup_chunks(self, document_id: str, chunks: List[str]):
+        """
+        分块去重
+
+        Returns:
+            (保留的分块, 可复用向量 {保留后序号: 向量}, 统计)
+        """
+        stats = {"chunks": len(chunks), "dropped": 0, "linked": 0, "reused_embeddings": 0}
+        if self.deduplicator is None:
+            return chunks, {}, stats
+
+        # 只读缓存，不加载模型（批量索引时父进程不编码）
+        cache = get_embedding_cache()
+        result = self.deduplicator.process(document_id, chunks, [text_digest(c) for c in chunks])
+
+        kept_chunks, reused = [], {}
+        for position, index in enumerate(result["kept"]):
+            kept_chunks.append(chunks[index])
+            link = result["links"].get(index)
+            # 只复用文本（合并空白后）完全相同的分块的向量，近重复但不同的分块重新编码
+            if link is not None and link[3] and cache is not None:
+                vector = cache.get_many([link[2]]).get(link[2])
+                if vector is not None:
+                    reused[position] = vector
+
+        stats.update({
+            "dropped": result["dropped"],
+            "linked": len(result["links"]),
+            "reused_embeddings": len(reused),
+        })
+        return kept_chunks, reused, stats
+
+    def _report_dedup(self, document_id: str, stats: Dict[str, Any], per_chunk_ms: float) -> Dict[str, Any]:
+        """按单条分块的平均编码耗时估算节省的嵌入时间，并累计统计"""
+        stats["embedding_ms_saved"] = round((stats["dropped"] + stats["reused_embeddings"]) * per_chunk_ms, 1)
+
+        for key in self.dedup_totals:
+            self.dedup_totals[key] += stats[key]
+        if stats["dropped"] or stats["linked"]:
+            logger.info(
+                "Dedup %s: %d chunks, dropped %d, linked %d (reused %d), ~%sms embedding saved",
+                document_id, stats["chunks"], stats["dropped"], stats["linked"],
+                stats["reused_embeddings"], stats["embedding_ms_saved"]
+            )
+        return stats
+
+    def bulk_add_documents(
+        self,
+        documents: Dict[str, str],
+        chunk_size: int = 500,
+        overlap: int = 50,
+        workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        批量导入：所有文档的分块在多个嵌入 worker 进程间分片编码
+
+        Args:
+            documents: document_id -> 文档文本
+            chunk_size: Size of text chunks
+            overlap: Overlap between chunks
+            workers: worker 进程数，默认使用配置
+
+        Returns:
+            吞吐统计（chunks_per_second 等）及去重统计
+        """
+        import numpy as np
+
+        doc_chunks, doc_reused, doc_stats = {}, {}, {}
+        for document_id, text in documents.items():
+            chunks = self.document_service.chunk_text(text, chunk_size, overlap)
+            doc_chunks[document_id], doc_reused[document_id], doc_stats[document_id] = \
+                self._dedup_chunks(document_id, chunks)
+
+        to_encode = [
+            chunk
+            for document_id, chunks in doc_chunks.items()
+            for i, chunk in enumerate(chunks) if i not in doc_reused[document_id]
+        ]
+
+        indexer = BulkIndexer(workers=workers)
+        batches, stats = indexer.embed(to_encode)
+        encoded = iter(np.concatenate(batches) if batches else [])
+
+        # 父进程不加载模型，用本次各 worker 的编码耗时估算单条分块耗时
+        encoded_count = stats["chunks"] - stats["cached"]
+        per_chunk_ms = stats["encode_seconds"] * 1000 / encoded_count if encoded_count else 0.0
+        dedup = {"dropped": 0, "linked": 0, "reused_embeddings": 0, "embedding_ms_saved": 0.0}
+        for document_id, chunks in doc_chunks.items():
+            reused = doc_reused[document_id]
+            embeddings = [reused[i] if i in reused else next(encoded) for i in range(len(chunks))]
+            self.vector_store.add(document_id, chunks, embeddings)
+            report = self._report_dedup(document_id, doc_stats[document_id], per_chunk_ms)
+            for key in dedup:
+                dedup[key] += report[key]
+
+        stats["documents"] = len(doc_chunks)
+        stats["dedup"] = dedup
+        return stats
+
+    def import_vectors(self, document_id: str, chunks: List[str], embeddings):
+        """
+        写入预先计算的分块与向量（文档包导入），替换文档已有的索引
+
+        Args:
+            document_id: Document ID
+            chunks: 文本分块
+            embeddings: 与分块一一对应的嵌入向量
+        """
+        self.vector_store.add(document_id, chunks, embeddings)
+        # 旧分块的去重条目不再对应存储中的内容
+        if self.deduplicator is not None:
+            self.deduplicator.forget(document_id)
+
+    def delete_document(self, document_id: str):
+        """
+        删除文档的向量及其去重索引条目
+
+        Args:
+            document_id: Document ID
+        """
+        self.vector_store.delete(document_id)
+        if self.deduplicator is not None:
+            self.deduplicator.forget(document_id)
 
     def search(
         self,
@@ -146,37 +270,45 @@ class RAGService:
         Returns:
             List of relevant chunks
         """
-        if document_id not in self.collections:
+        if not self.vector_store.has_document(document_id):
             return []
+        return self.search_by_embedding(document_id, self.embed_query(query), top_k)
 
-        collection = self.collections[document_id]
-
-        # 生成查询嵌入向量
+    def embed_query(self, query: str):
+        """生成查询嵌入向量，相同问题的并发请求只编码一次"""
         embedding_service = get_embedding_service()
-        query_embedding = embedding_service.embed_texts([query])[0]
-
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
+        return self.query_inflight.do(
+            text_digest(query),
+            lambda: embedding_service.embed_texts([query])[0]
         )
 
-        # Format results
-        formatted_results = []
-        if results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                formatted_results.append({
-                    "chunk_id": results["ids"][0][i],
-                    "content": doc,
-                    "distance": results["distances"][0][i] if "distances" in results else 0
-                })
+    def search_by_embedding(
+        self,
+        document_id: str,
+        query_embedding,
+        top_k: int = 3
+    ) -> List[Dict[str, Any]]:
+        """
+        用已编码的查询向量检索
+
+        Args:
+            document_id: Document ID
+            query_embedding: 查询嵌入向量
+            top_k: Number of results
 
-        return formatted_results
+        Returns:
+            List of relevant chunks
+        """
+        with metrics.stage("vector_query"):
+            return self.vector_store.query(document_id, [query_embedding], top_k)[0]
 
+    @traced("rag.answer_question")
     def answer_question(
         self,
         question: str,
         document_id: str,
-        top_k: int = 3
+        top_k: int = 3,
+        provider: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Answer a question using RAG
@@ -185,22 +317,28 @@ class RAGService:
             question: Question string
             document_id: Document ID
             top_k: Number of chunks to retrieve
+            provider: 本次调用使用的提供商，默认使用 self.provider
 
         Returns:
             Answer and sources
         """
+        provider = provider or self.provider
+        ai_service = get_provider(provider)
+
         # Retrieve relevant chunks
         sources = self.search(document_id, question, top_k)
 
         # DEBUG: Log search results
-        print(f"[RAG] Search sources: {len(sources)} found")
-        for s in sources:
-            print(f"  - distance={s.get('distance')}, content={s.get('content', '')[:50]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Search sources: %d found, distances=%s",
+                len(sources), [round(s.get("distance", 0), 3) for s in sources]
+            )
+
+        packing_started = time.perf_counter()
 
         # Use distance threshold to determine if content is relevant
-        # For cosine distance in ChromaDB: 0 = identical, 2 = opposite
-        # Distance < 1.85 allows more content through (tested: related=1.78, unrelated=1.91)
-        relevant_sources = [s for s in sources if s.get("distance", 2) < 1.85]
+        relevant_sources = [s for s in sources if s.get("distance", 2) < RELEVANCE_MAX_DISTANCE]
 
         # Extract page numbers from relevant sources only
         page_numbers = []
@@ -217,22 +355,24 @@ class RAGService:
 
         # If no relevant content found in knowledge base, still call AI but with different prompt
         if not relevant_sources:
+            metrics.observe_stage("context_packing", packing_started)
             # Call AI with prompt indicating no relevant content in knowledge base
-            result = self.ai_service.answer_question_without_context(question)
+            result = ai_service.answer_question_without_context(question)
             # Do NOT append reference info when no relevant content found
             return {
                 "answer": result.get("answer", ""),
                 "sources": [],
-                "provider": self.provider,
+                "provider": provider,
                 "source_type": "ai_knowledge",  # Mark as from AI's own knowledge
                 "page_numbers": []
             }
 
         # Combine sources into context
         context = "\n\n".join([s["content"] for s in relevant_sources])
+        metrics.observe_stage("context_packing", packing_started)
 
         # Generate answer with configured AI service
-        result = self.ai_service.answer_question(question, context)
+        result = ai_service.answer_question(question, context)
 
         # Append source information to answer only when relevant content found
         answer = result.get("answer", "")
@@ -244,7 +384,7 @@ class RAGService:
         return {
             "answer": answer,
             "sources": relevant_sources,
-            "provider": self.provider,
+            "provider": provider,
             "source_type": "knowledge_base",
             "page_numbers": page_numbers
         }
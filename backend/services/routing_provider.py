@@ -0,0 +1,254 @@
+"""
+Routing AI provider
+AI_PROVIDER="both" 时使用：按滚动延迟和错误率把请求路由到最快的健康提供商，
+问答可选对冲请求（hedged request）
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional
+
+from app.config import (
+    ADMISSION_LIMITS,
+    ROUTING_WINDOW_SIZE,
+    ROUTING_WINDOW_SECONDS,
+    ROUTING_MAX_ERROR_RATE,
+    ROUTING_HEDGE_QA,
+    ROUTING_HEDGE_MIN_DELAY_MS,
+)
+from services.ai_provider import AIProvider
+from services.circuit_breaker import get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+# 统计窗口内样本数不足时不判定为不健康
+MIN_SAMPLES = 5
+# 对冲线程池：每个并发问答最多占用两个线程（主请求 + 对冲 / 故障转移）
+HEDGE_WORKERS = 2 * (ADMISSION_LIMITS["qa"]["max_concurrent"] or 16)
+
+
+class ProviderProfile:
+    """单个提供商某类操作的滚动延迟/错误统计"""
+
+    def __init__(self, window_size: int = ROUTING_WINDOW_SIZE, window_seconds: float = ROUTING_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        # (时间戳, 延迟秒数, 是否成功)
+        self.samples = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.samples.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            return [s for s in self.samples if s[0] >= cutoff]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前窗口统计
+
+        Returns:
+            samples、error_rate、p50/p95 延迟（秒，仅统计成功请求）、healthy
+        """
+        recent = self._recent()
+        latencies = sorted(s[1] for s in recent if s[2])
+        errors = sum(1 for s in recent if not s[2])
+        error_rate = errors / len(recent) if recent else 0.0
+        return {
+            "samples": len(recent),
+            "error_rate": round(error_rate, 3),
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "healthy": len(recent) < MIN_SAMPLES or error_rate <= ROUTING_MAX_ERROR_RATE,
+        }
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 4)
+
+
+class RoutingProvider(AIProvider):
+    """
+    多提供商路由
+
+    - 每次调用选择当前最快（p50 最低）的健康提供商；没有样本的提供商优先试探
+    - 熔断中的提供商排在最后（轮到时快速失败，不发出请求）
+    - 调用失败时依次故障转移到下一个提供商
+    - 问答开启对冲时：主提供商超过其 p95 延迟仍未返回，则同时请求第二个提供商，取先返回者
+    """
+
+    def __init__(self, providers: Dict[str, Any], hedge_qa: bool = ROUTING_HEDGE_QA):
+        """
+        Args:
+            providers: 名称 -> 提供商实例
+            hedge_qa: 问答是否启用对冲请求
+        """
+        self.providers = providers
+        self.hedge_qa = hedge_qa
+        self.profiles = {}
+        self._profiles_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="router")
+
+    @property
+    def provider_name(self) -> str:
+        return "both"
+
+    def preconnect(self):
+        for provider in self.providers.values():
+            provider.preconnect()
+
+    def _profile(self, name: str, operation: str) -> ProviderProfile:
+        key = (name, operation)
+        with self._profiles_lock:
+            if key not in self.profiles:
+                self.profiles[key] = ProviderProfile()
+            return self.profiles[key]
+
+    def _ranked(self, operation: str, candidates: Optional[List[str]] = None) -> List[str]:
+        """按熔断状态、健康状况和 p50 延迟排序"""
+        names = candidates if candidates is not None else list(self.providers)
+
+        def sort_key(name):
+            stats = self._profile(name, operation).snapshot()
+            p50 = stats["p50"] if stats["p50"] is not None else 0.0
+            return (
+                get_circuit_breaker(name).is_open(),
+                not stats["healthy"],
+                stats["error_rate"] if not stats["healthy"] else 0.0,
+                p50
+            )
+
+        return sorted(names, key=sort_key)
+
+    def _invoke(self, name: str, operation: str, *args, **kwargs):
+        """调用单个提供商并记录延迟与结果"""
+        profile = self._profile(name, operation)
+        started = time.perf_counter()
+        try:
+            result = getattr(self.providers[name], operation)(*args, **kwargs)
+        except Exception:
+            profile.record(time.perf_counter() - started, ok=False)
+            raise
+        profile.record(time.perf_counter() - started, ok=True)
+        return result
+
+    def _route(self, operation: str, *args, candidates: Optional[List[str]] = None, **kwargs):
+        """按排序依次尝试，失败则故障转移"""
+        last_error = None
+        for name in self._ranked(operation, candidates):
+            try:
+                return self._invoke(name, operation, *args, **kwargs)
+            except Exception as e:
+                logger.warning("%s.%s failed: %s", name, operation, e)
+                last_error = e
+        raise last_error or RuntimeError(f"No provider available for {operation}")
+
+    def _submit(self, started: Optional[threading.Event], name: str, operation: str, *args, **kwargs):
+        """在对冲线程池中调用提供商，沿用调用方的上下文（request_id、剖析）"""
+        context = contextvars.copy_context()
+
+        def run():
+            if started is not None:
+                started.set()
+            return context.run(self._invoke, name, operation, *args, **kwargs)
+
+        return self._executor.submit(run)
+
+    def _hedged(self, operation: str, *args, **kwargs):
+        """对冲请求：主提供商超过 p95 延迟后并发请求备用提供商，取先成功者"""
+        ranked = self._ranked(operation)
+        if len(ranked) < 2:
+            return self._route(operation, *args, **kwargs)
+
+        primary, secondary = ranked[0], ranked[1]
+        p95 = self._profile(primary, operation).snapshot()["p95"]
+        delay = max(p95 or 0.0, ROUTING_HEDGE_MIN_DELAY_MS / 1000)
+
+        started = threading.Event()
+        first = self._submit(started, primary, operation, *args, **kwargs)
+        futures = {first: primary}
+        # 从主请求开始执行时计时，线程池排队时间不计入对冲延迟；
+        # 线程池饱和、排队超过对冲延迟时撤回主请求，在当前线程按路由顺序直接调用
+        if not started.wait(timeout=delay) and first.cancel():
+            logger.info("Hedge pool saturated, calling %s inline", operation)
+            return self._route(operation, *args, **kwargs)
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            logger.info("%s.%s slower than %.2fs, hedging with %s", primary, operation, delay, secondary)
+            futures[self._submit(None, secondary, operation, *args, **kwargs)] = secondary
+
+        last_error = None
+        hedged = len(futures) > 1
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+                logger.warning("%s.%s failed: %s", futures[future], operation, last_error)
+                if not hedged:
+                    # 主提供商在对冲前就失败：立即在当前线程调用备用提供商，不再排队
+                    return self._invoke(secondary, operation, *args, **kwargs)
+        raise last_error
+
+    def profile(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各提供商各操作的滚动统计
+
+        Returns:
+            {provider: {operation: 统计}}
+        """
+        with self._profiles_lock:
+            keys = list(self.profiles)
+        result = {}
+        for name, operation in keys:
+            result.setdefault(name, {})[operation] = self._profile(name, operation).snapshot()
+        return result
+
+    def generate_text(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        return self._route("generate_text", system_prompt, user_prompt, **kwargs)
+
+    def chat_messages(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        if self.hedge_qa:
+            return self._hedged("chat_messages", messages, **kwargs)
+        return self._route("chat_messages", messages, **kwargs)
+
+    def extract_knowledge(self, content: str, **kwargs) -> Dict[str, Any]:
+        return self._route("extract_knowledge", content, **kwargs)
+
+    def answer_question(self, question: str, context: str, **kwargs) -> Dict[str, Any]:
+        if self.hedge_qa:
+            return self._hedged("answer_question", question, context, **kwargs)
+        return self._route("answer_question", question, context, **kwargs)
+
+    def answer_question_without_context(self, question: str, **kwargs) -> Dict[str, Any]:
+        if self.hedge_qa:
+            return self._hedged("answer_question_without_context", question, **kwargs)
+        return self._route("answer_question_without_context", question, **kwargs)
+
+    def _supporting(self, capability: str) -> List[str]:
+        return [name for name, p in self.providers.items() if getattr(p, capability)()]
+
+    def support_ocr(self) -> bool:
+        return bool(self._supporting("support_ocr"))
+
+    def ocr_image(self, image_data: bytes, **kwargs) -> str:
+        return self._route("ocr_image", image_data, candidates=self._supporting("support_ocr"), **kwargs)
+
+    def support_image_understanding(self) -> bool:
+        return bool(self._supporting("support_image_understanding"))
+
+    def understand_image(self, image_data: bytes, prompt: str = "", **kwargs) -> str:
+        return self._route(
+            "understand_image", image_data, prompt,
+            candidates=self._supporting("support_image_understanding"), **kwargs
+        )
@@ -0,0 +1,108 @@
+"""
+Singleflight request coalescing
+相同 key 的并发调用只执行一次，其余调用等待并共享同一个结果（或异常）
+"""
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """一次正在执行的调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按 key 合并进行中的调用"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        执行 fn；若相同 key 的调用正在进行，则等待其结果
+
+        Args:
+            key: 合并键（应包含影响结果的全部参数）
+            fn: 实际执行的函数
+
+        Returns:
+            fn 的返回值（合并的调用方拿到同一个对象，修改前需自行复制）
+
+        Raises:
+            fn 抛出的异常（所有等待者都会收到）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再唤醒：结果返回后到达的新调用会重新执行，不会拿到过期结果
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """累计执行次数、被合并的调用数、当前进行中的 key 数"""
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    """获取命名的合并组（进程内单例）"""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def singleflight_stats() -> Dict[str, Dict[str, int]]:
+    """所有合并组的统计"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
+
+
+def digest_key(*parts: str) -> str:
+    """把较长的参数（提示词、文档文本）压缩成合并键"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
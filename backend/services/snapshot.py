@@ -0,0 +1,157 @@
+"""
+State snapshots
+把文档、知识点、知识图谱等状态定期写入一个紧凑的二进制快照文件，正常关闭时再写一次；
+启动时内存映射快照并恢复到空的存储中，重启或新节点无需重新处理全部文档即可恢复服务
+"""
+import json
+import logging
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from services.binfile import BinFileError, SectionFile, iter_records, pack_records, write_sections
+from services.metrics import timed
+from services.state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SFSNAPSH"
+SNAPSHOT_VERSION = 1
+
+
+class Snapshotter:
+    """
+    状态快照：每个命名空间一段，每条记录为 (key, JSON 值)
+
+    多个 worker 写同一路径是安全的（原子替换），最后写入的快照生效。
+    """
+
+    def __init__(self, stores: Dict[str, StateStore], path: str, interval: float = 300):
+        """
+        Args:
+            stores: 命名空间 -> 存储
+            path: 快照文件路径
+            interval: 定期写入的间隔（秒），0 表示只在关闭时写入
+        """
+        self.stores = stores
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_fingerprint = None
+
+    @timed("snapshot_save")
+    def save(self) -> Dict[str, Any]:
+        """
+        写入快照；内容与上次写入相同时跳过
+
+        Returns:
+            各命名空间的记录数、文件字节数、是否实际写入
+        """
+        with self._lock:
+            sections = {}
+            counts = {}
+            for namespace, store in self.stores.items():
+                items = store.items()
+                counts[namespace] = len(items)
+                sections[namespace] = pack_records(
+                    (key.encode("utf-8"), json.dumps(value, ensure_ascii=False).encode("utf-8"))
+                    for key, value in items
+                )
+
+            fingerprint = tuple((name, zlib.crc32(data)) for name, data in sections.items())
+            written = fingerprint != self._last_fingerprint
+            if written:
+                sections["meta"] = json.dumps({"created_at": time.time(), "counts": counts}).encode("utf-8")
+                write_sections(self.path, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sections)
+                self._last_fingerprint = fingerprint
+                logger.info("Snapshot written to %s: %s", self.path, counts)
+
+        return {
+            "path": self.path,
+            "written": written,
+            "counts": counts,
+            "bytes": sum(len(data) for data in sections.values()),
+        }
+
+    @timed("snapshot_restore")
+    def restore(self, only_empty: bool = True) -> Dict[str, int]:
+        """
+        从快照恢复；快照不存在或损坏时只记录日志
+
+        Args:
+            only_empty: 只恢复当前为空的命名空间（共享存储中已有数据时不覆盖）
+
+        Returns:
+            命名空间 -> 恢复的记录数
+        """
+        restored = {}
+        try:
+            snapshot = SectionFile(self.path, SNAPSHOT_MAGIC, (SNAPSHOT_VERSION,))
+        except FileNotFoundError:
+            return restored
+        except (BinFileError, OSError) as e:
+            logger.warning("Snapshot %s not restored: %s", self.path, e)
+            return restored
+
+        started = time.perf_counter()
+        with snapshot:
+            for namespace, store in self.stores.items():
+                if namespace not in snapshot:
+                    continue
+                if only_empty and len(store) > 0:
+                    continue
+                try:
+                    view = snapshot.section(namespace)
+                    try:
+                        items = [
+                            (str(key, "utf-8"), json.loads(str(value, "utf-8")))
+                            for key, value in iter_records(view)
+                        ]
+                    finally:
+                        view.release()
+                except (BinFileError, ValueError) as e:
+                    logger.warning("Snapshot section %s not restored: %s", namespace, e)
+                    continue
+                store.set_many(items)
+                restored[namespace] = len(items)
+
+        logger.info(
+            "Restored %s from snapshot %s in %dms",
+            restored, self.path, (time.perf_counter() - started) * 1000
+        )
+        return restored
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning("Snapshot failed: %s", e)
+
+    def start(self):
+        """启动定期写入线程（interval 为 0 时不启动）"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True):
+        """
+        停止定期写入
+
+        Args:
+            flush: 是否在停止后写入最后一次快照
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning("Final snapshot failed: %s", e)
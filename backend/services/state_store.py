@@ -0,0 +1,277 @@
+"""
+Shared state store
+文档、知识点、当前提供商等应用状态的键值存储。值按 JSON 序列化；
+SQLite 后端可在同一台机器的多个 worker 进程间共享，Redis 后端可跨多个节点共享
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import STATE_BACKEND, STATE_PATH, REDIS_URL, STATE_KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(MutableMapping, ABC):
+    """
+    一个命名空间内的键值存储（如 "documents"、"knowledge"）
+
+    读取返回的是反序列化后的副本：修改返回值不会影响存储，需要重新写入。
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    @abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any):
+        pass
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]):
+        """批量写入（后端支持时在一次事务 / 往返中完成）"""
+        for key, value in items:
+            self.set(key, value)
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """删除键，返回键是否存在"""
+        pass
+
+    @abstractmethod
+    def keys(self) -> List[str]:
+        pass
+
+    def values(self) -> List[Any]:
+        return [self[k] for k in self.keys() if k in self]
+
+    def items(self) -> List[tuple]:
+        return [(k, v) for k, v in ((k, self.get(k)) for k in self.keys()) if v is not None]
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.set(key, value)
+
+    def __delitem__(self, key: str):
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+
+class MemoryStateStore(StateStore):
+    """进程内存储（单 worker / 测试用）"""
+
+    def __init__(self, namespace: str):
+        super().__init__(namespace)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            raw = self._data.get(key)
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, key, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._data[key] = raw
+
+    def set_many(self, items):
+        raw = {key: json.dumps(value, ensure_ascii=False) for key, value in items}
+        with self._lock:
+            self._data.update(raw)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite 存储（WAL 模式）
+
+    同一文件可被多个 worker 进程同时读写；所有命名空间共用一张表。
+    """
+
+    def __init__(self, namespace: str, path: str = STATE_PATH):
+        super().__init__(namespace)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _get_conn(self):
+        """打开 SQLite 连接；fork 后的子进程重新打开"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            conn = self._get_conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                    (self.namespace, key, raw)
+                )
+
+    def set_many(self, items):
+        rows = [(self.namespace, key, json.dumps(value, ensure_ascii=False)) for key, value in items]
+        with self._lock:
+            conn = self._get_conn()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)", rows)
+
+    def delete(self, key):
+        with self._lock:
+            conn = self._get_conn()
+            with conn:
+                cursor = conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (self.namespace, key))
+        return cursor.rowcount > 0
+
+    def keys(self):
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT key FROM state WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def __contains__(self, key):
+        if not isinstance(key, str):
+            return False
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT 1 FROM state WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+        return row is not None
+
+    def values(self):
+        # 单条查询取出全部值，避免逐键读取
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT value FROM state WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def items(self):
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT key, value FROM state WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+
+class RedisStateStore(StateStore):
+    """
+    Redis 存储（或任何兼容 Redis 协议的服务），每个命名空间对应一个哈希
+
+    需要安装 redis 包；多节点部署时使用。
+    """
+
+    def __init__(self, namespace: str, url: str = REDIS_URL, prefix: str = STATE_KEY_PREFIX):
+        super().__init__(namespace)
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.hash_key = f"{prefix}:{namespace}"
+
+    def get(self, key, default=None):
+        raw = self.client.hget(self.hash_key, key)
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, key, value):
+        self.client.hset(self.hash_key, key, json.dumps(value, ensure_ascii=False))
+
+    def set_many(self, items):
+        mapping = {key: json.dumps(value, ensure_ascii=False) for key, value in items}
+        if mapping:
+            self.client.hset(self.hash_key, mapping=mapping)
+
+    def delete(self, key):
+        return self.client.hdel(self.hash_key, key) > 0
+
+    def keys(self):
+        return [k.decode("utf-8") for k in self.client.hkeys(self.hash_key)]
+
+    def values(self):
+        return [json.loads(v) for v in self.client.hvals(self.hash_key)]
+
+    def items(self):
+        return [(k.decode("utf-8"), json.loads(v)) for k, v in self.client.hgetall(self.hash_key).items()]
+
+    def __contains__(self, key):
+        return isinstance(key, str) and bool(self.client.hexists(self.hash_key, key))
+
+
+_stores: Dict[str, StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def create_state_store(namespace: str, backend: Optional[str] = None) -> StateStore:
+    """
+    创建存储实例
+
+    Args:
+        namespace: 命名空间
+        backend: "memory" | "sqlite" | "redis"，默认使用配置
+    """
+    backend = backend or STATE_BACKEND
+    if backend == "memory":
+        return MemoryStateStore(namespace)
+    if backend == "sqlite":
+        return SQLiteStateStore(namespace)
+    if backend == "redis":
+        return RedisStateStore(namespace)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+def get_state_store(namespace: str) -> StateStore:
+    """按命名空间获取（进程内共享的）存储实例"""
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is None:
+            store = _stores[namespace] = create_state_store(namespace)
+            logger.info("State store %s: %s", namespace, type(store).__name__)
+        return store
@@ -0,0 +1,391 @@
+"""
+Vector store backends
+RAGService 使用的向量存储：ChromaDB 或进程内 NumPy（float16 内存映射矩阵）
+"""
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 单次矩阵乘法处理的行数（float16 -> float32 上转换的缓冲区大小，保持在 CPU 缓存内）
+QUERY_BLOCK_ROWS = 4096
+
+# ChromaDB 单次 add 的最大条数（超过 SQLite 变量上限会报错）
+CHROMA_ADD_BATCH = 5000
+
+
+class VectorStore(ABC):
+    """向量存储抽象基类"""
+
+    @abstractmethod
+    def add(
+        self,
+        document_id: str,
+        chunks: List[str],
+        embeddings: Sequence[Sequence[float]]
+    ):
+        """
+        写入文档的全部分块及其嵌入向量，替换该文档已有的内容
+
+        Args:
+            document_id: Document ID
+            chunks: 文本分块
+            embeddings: 与分块一一对应的嵌入向量
+        """
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        document_id: str,
+        query_embeddings: Sequence[Sequence[float]],
+        top_k: int = 3
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索
+
+        Args:
+            document_id: Document ID
+            query_embeddings: 查询向量（可多条）
+            top_k: 每条查询返回的结果数
+
+        Returns:
+            每条查询对应的结果列表，元素包含 chunk_id、content、distance
+        """
+        pass
+
+    @abstractmethod
+    def has_document(self, document_id: str) -> bool:
+        """文档是否已写入向量存储"""
+        pass
+
+    @abstractmethod
+    def delete(self, document_id: str):
+        """删除文档的全部分块，文档未写入时不做任何事"""
+        pass
+
+    @abstractmethod
+    def export(self, document_id: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        """
+        读出文档的全部分块及其嵌入向量（按 chunk 编号排序）
+
+        Returns:
+            (分块文本, 嵌入矩阵 (n, dim))，文档未写入时返回 None
+        """
+        pass
+
+    def warm_up(self):
+        """预先完成耗时的初始化（如打开客户端），默认不做任何事"""
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB 持久化存储（默认后端）"""
+
+    def __init__(self, persist_directory: str = "./data/chroma"):
+        self.persist_directory = persist_directory
+        self.client = None
+        self.collections = {}
+
+    def _get_client(self):
+        """Get or create ChromaDB client"""
+        if self.client is None:
+            import chromadb
+            self.client = chromadb.PersistentClient(
+                path=self.persist_directory
+            )
+        return self.client
+
+    def create_collection(self, document_id: str):
+        """
+        Create a collection for a document
+
+        Args:
+            document_id: Document ID
+        """
+        client = self._get_client()
+        collection_name = f"doc_{document_id}"
+        collection = client.get_or_create_collection(name=collection_name)
+        self.collections[document_id] = collection
+        return collection
+
+    def warm_up(self):
+        self._get_client()
+
+    def _get_collection(self, document_id: str):
+        """已存在的集合；其他 worker 进程创建的集合从持久化目录中查找"""
+        collection = self.collections.get(document_id)
+        if collection is None:
+            try:
+                collection = self._get_client().get_collection(name=f"doc_{document_id}")
+            except ValueError:
+                return None
+            self.collections[document_id] = collection
+        return collection
+
+    def add(self, document_id, chunks, embeddings):
+        collection = self._get_collection(document_id) or self.create_collection(document_id)
+        # upsert 覆盖同名分块（add 会跳过已存在的 id），再删除超出新分块数的旧分块；
+        # 不先删集合，替换期间查询仍能命中
+        for start in range(0, len(chunks), CHROMA_ADD_BATCH):
+            end = start + CHROMA_ADD_BATCH
+            collection.upsert(
+                documents=chunks[start:end],
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                ids=[f"chunk_{i}" for i in range(start, min(end, len(chunks)))]
+            )
+        stale = [
+            chunk_id for chunk_id in collection.get(include=[])["ids"]
+            if int(chunk_id.rsplit("_", 1)[1]) >= len(chunks)
+        ]
+        for start in range(0, len(stale), CHROMA_ADD_BATCH):
+            collection.delete(ids=stale[start:start + CHROMA_ADD_BATCH])
+
+    def delete(self, document_id):
+        self.collections.pop(document_id, None)
+        try:
+            self._get_client().delete_collection(name=f"doc_{document_id}")
+        except ValueError:
+            pass
+
+    def query(self, document_id, query_embeddings, top_k=3):
+        collection = self._get_collection(document_id)
+        if collection is None:
+            return [[] for _ in query_embeddings]
+
+        results = collection.query(
+            query_embeddings=[list(map(float, q)) for q in query_embeddings],
+            n_results=top_k
+        )
+
+        formatted = []
+        for q in range(len(query_embeddings)):
+            rows = []
+            if results["documents"]:
+                for i, doc in enumerate(results["documents"][q]):
+                    rows.append({
+                        "chunk_id": results["ids"][q][i],
+                        "content": doc,
+                        "distance": results["distances"][q][i] if "distances" in results else 0
+                    })
+            formatted.append(rows)
+        return formatted
+
+    def has_document(self, document_id):
+        return self._get_collection(document_id) is not None
+
+    def export(self, document_id):
+        collection = self._get_collection(document_id)
+        if collection is None:
+            return None
+        result = collection.get(include=["documents", "embeddings"])
+        order = sorted(range(len(result["ids"])), key=lambda i: int(result["ids"][i].rsplit("_", 1)[1]))
+        chunks = [result["documents"][i] for i in order]
+        embeddings = np.asarray([result["embeddings"][i] for i in order], dtype=np.float32)
+        return chunks, embeddings
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    进程内 NumPy 向量存储
+
+    每个文档一个目录，嵌入向量保存为连续的 float16 矩阵（.npy），
+    查询时以只读方式内存映射，多个 worker 进程共享同一份页缓存。
+    写入采用"新版本目录 + CURRENT 指针"的方式，读者不会看到半写入的数据。
+
+    目录结构:
+        {root}/{document_id}/CURRENT          当前版本目录名
+        {root}/{document_id}/{gen}/embeddings.npy  float16 (n, dim)
+        {root}/{document_id}/{gen}/norms.npy       float32 (n,) 平方范数
+        {root}/{document_id}/{gen}/offsets.npy     int64 (n+1,) 分块文本偏移
+        {root}/{document_id}/{gen}/chunks.bin      UTF-8 分块文本
+    """
+
+    def __init__(self, persist_directory: str = "./data/vectors"):
+        self.persist_directory = persist_directory
+        self._root = os.path.abspath(persist_directory)
+        # document_id -> (CURRENT mtime_ns, 已映射的数组)
+        self._mapped = {}
+
+    def _doc_dir(self, document_id: str) -> str:
+        """文档目录；document_id 解析到存储根目录之外（如含 ".."）时拒绝"""
+        doc_dir = os.path.normpath(os.path.join(self._root, document_id))
+        if os.path.dirname(doc_dir) != self._root:
+            raise ValueError(f"Invalid document id: {document_id!r}")
+        return doc_dir
+
+    def add(self, document_id, chunks, embeddings):
+        doc_dir = self._doc_dir(document_id)
+        generation = uuid.uuid4().hex[:12]
+        gen_dir = os.path.join(doc_dir, generation)
+        os.makedirs(gen_dir, exist_ok=True)
+
+        # float16 输入（如从文档包导入）直接写入，不经过 float32 中转
+        matrix = np.asarray(embeddings)
+        if matrix.dtype != np.float16:
+            matrix = matrix.astype(np.float32, copy=False)
+        if matrix.ndim != 2 or matrix.shape[0] != len(chunks):
+            raise ValueError("embeddings must be a 2-D array with one row per chunk")
+
+        encoded = [c.encode("utf-8") for c in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+        np.save(os.path.join(gen_dir, "embeddings.npy"), matrix.astype(np.float16, copy=False))
+        np.save(os.path.join(gen_dir, "norms.npy"), np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32))
+        np.save(os.path.join(gen_dir, "offsets.npy"), offsets)
+        with open(os.path.join(gen_dir, "chunks.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+
+        # 原子切换 CURRENT 指针
+        previous = self._read_current(doc_dir)
+        tmp_pointer = os.path.join(doc_dir, f"CURRENT.{generation}")
+        with open(tmp_pointer, "w") as f:
+            f.write(generation)
+        os.replace(tmp_pointer, os.path.join(doc_dir, "CURRENT"))
+
+        # 旧版本可直接删除：已映射的读者仍持有文件句柄
+        if previous and previous != generation:
+            self._remove_generation(os.path.join(doc_dir, previous))
+        self._mapped.pop(document_id, None)
+
+    def delete(self, document_id):
+        doc_dir = self._doc_dir(document_id)
+        current = self._read_current(doc_dir)
+        try:
+            os.remove(os.path.join(doc_dir, "CURRENT"))
+        except FileNotFoundError:
+            pass
+        if current:
+            self._remove_generation(os.path.join(doc_dir, current))
+        try:
+            os.rmdir(doc_dir)
+        except OSError:
+            pass
+        self._mapped.pop(document_id, None)
+
+    @staticmethod
+    def _read_current(doc_dir: str):
+        try:
+            with open(os.path.join(doc_dir, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove_generation(gen_dir: str):
+        for name in ("embeddings.npy", "norms.npy", "offsets.npy", "chunks.bin"):
+            try:
+                os.remove(os.path.join(gen_dir, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(gen_dir)
+        except OSError:
+            pass
+
+    def _load(self, document_id: str):
+        """内存映射文档矩阵；CURRENT 变化（其他 worker 写入）时重新映射"""
+        doc_dir = self._doc_dir(document_id)
+        for _ in range(3):
+            try:
+                st = os.stat(os.path.join(doc_dir, "CURRENT"))
+            except FileNotFoundError:
+                self._mapped.pop(document_id, None)
+                return None
+            stamp = (st.st_ino, st.st_mtime_ns)
+
+            cached = self._mapped.get(document_id)
+            if cached and cached[0] == stamp:
+                return cached[1]
+
+            gen_dir = os.path.join(doc_dir, self._read_current(doc_dir) or "")
+            try:
+                chunks_path = os.path.join(gen_dir, "chunks.bin")
+                blob = np.memmap(chunks_path, dtype=np.uint8, mode="r") if os.path.getsize(chunks_path) else b""
+                mapped = {
+                    "embeddings": np.load(os.path.join(gen_dir, "embeddings.npy"), mmap_mode="r"),
+                    "norms": np.load(os.path.join(gen_dir, "norms.npy"), mmap_mode="r"),
+                    "offsets": np.load(os.path.join(gen_dir, "offsets.npy")),
+                    "chunks": blob,
+                }
+            except FileNotFoundError:
+                # 其他 worker 正在切换版本，重读 CURRENT
+                continue
+            self._mapped[document_id] = (stamp, mapped)
+            return mapped
+        return None
+
+    def query(self, document_id, query_embeddings, top_k=3):
+        mapped = self._load(document_id)
+        if mapped is None:
+            return [[] for _ in query_embeddings]
+
+        matrix = mapped["embeddings"]
+        norms = mapped["norms"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        n = matrix.shape[0]
+        k = min(top_k, n)
+        if k == 0:
+            return [[] for _ in query_embeddings]
+
+        # 平方 L2 距离，与 ChromaDB 默认 "l2" 空间一致，RAG 的距离阈值无需调整
+        dots = np.empty((queries.shape[0], n), dtype=np.float32)
+        buffer = np.empty((min(QUERY_BLOCK_ROWS, n), matrix.shape[1]), dtype=np.float32)
+        for start in range(0, n, QUERY_BLOCK_ROWS):
+            rows = min(QUERY_BLOCK_ROWS, n - start)
+            np.copyto(buffer[:rows], matrix[start:start + rows])
+            np.matmul(queries, buffer[:rows].T, out=dots[:, start:start + rows])
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        distances = norms[None, :] + q_norms[:, None] - 2.0 * dots
+
+        if k < n:
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n), (queries.shape[0], 1))
+
+        offsets = mapped["offsets"]
+        blob = mapped["chunks"]
+        formatted = []
+        for q in range(queries.shape[0]):
+            order = top[q][np.argsort(distances[q, top[q]])]
+            rows = []
+            for i in order:
+                rows.append({
+                    "chunk_id": f"chunk_{i}",
+                    "content": bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8"),
+                    "distance": float(max(distances[q, i], 0.0))
+                })
+            formatted.append(rows)
+        return formatted
+
+    def has_document(self, document_id):
+        return os.path.exists(os.path.join(self._doc_dir(document_id), "CURRENT"))
+
+    def export(self, document_id):
+        mapped = self._load(document_id)
+        if mapped is None:
+            return None
+        offsets = mapped["offsets"]
+        blob = mapped["chunks"]
+        chunks = [bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(len(offsets) - 1)]
+        # 直接返回只读映射的 float16 矩阵，不复制
+        return chunks, mapped["embeddings"]
+
+
+def get_vector_store(backend: str, persist_directory: str) -> VectorStore:
+    """
+    根据配置创建向量存储
+
+    Args:
+        backend: "chroma" | "numpy"
+        persist_directory: 持久化目录
+
+    Returns:
+        VectorStore 实现类
+    """
+    if backend == "numpy":
+        return NumpyVectorStore(persist_directory)
+    return ChromaVectorStore(persist_directory)
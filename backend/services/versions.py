@@ -0,0 +1,79 @@
+"""
+Resource versions
+为文档、文档列表、知识图谱等资源维护内容版本：写入时更新版本，读取时直接比较，
+条件请求（If-None-Match / If-Modified-Since）无需重新构建或序列化响应即可返回 304
+"""
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from services.state_store import StateStore
+
+
+class ResourceVersions:
+    """
+    资源名 -> {"etag", "modified"}
+
+    资源名约定: "documents"（文档列表）、"document:{id}"、"map:{document_id}"。
+    写入方先写数据、再更新版本；读取方先读版本、再读数据，
+    这样客户端缓存的内容不会比它持有的 ETag 更旧。
+    """
+
+    def __init__(self, store: StateStore):
+        self.store = store
+
+    def bump(self, *resources: str) -> Dict[str, Any]:
+        """资源内容已变化：生成新版本"""
+        version = {"etag": uuid.uuid4().hex[:16], "modified": time.time()}
+        self.store.set_many((resource, version) for resource in resources)
+        return version
+
+    def peek(self, resource: str) -> Optional[Dict[str, Any]]:
+        """当前版本，尚未记录时返回 None"""
+        return self.store.get(resource)
+
+    def ensure(self, resource: str) -> Dict[str, Any]:
+        """当前版本，尚未记录（如版本功能上线前已存在的数据）时创建"""
+        return self.peek(resource) or self.bump(resource)
+
+
+def validators(version: Dict[str, Any]) -> Dict[str, str]:
+    """
+    版本对应的响应头
+
+    使用弱 ETag：同一版本的 gzip / brotli / 未压缩表示共用一个 ETag
+    """
+    return {
+        "ETag": f'W/"{version["etag"]}"',
+        "Last-Modified": formatdate(version["modified"], usegmt=True),
+        # 每次使用缓存前都向服务器确认（轮询场景下返回 304）
+        "Cache-Control": "no-cache",
+    }
+
+
+def is_not_modified(headers: Mapping[str, str], version: Dict[str, Any]) -> bool:
+    """
+    条件请求是否命中当前版本；有 If-None-Match 时忽略 If-Modified-Since
+
+    Args:
+        headers: 请求头
+        version: 资源当前版本
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # 弱比较：忽略 W/ 前缀
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return f'"{version["etag"]}"' in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP 日期精确到秒
+        return int(version["modified"]) <= since
+    return False
@@ -0,0 +1,81 @@
+"""
+Background warm-up
+服务启动后在后台线程中执行耗时的初始化（加载嵌入模型、打开向量库、预连接提供商），
+进程无需等待即可接受连接；/ready 据此报告预热进度
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Warmup:
+    """预热步骤集合：各步骤在独立的后台线程中并行执行"""
+
+    def __init__(self):
+        self._steps: Dict[str, Callable[[], Any]] = {}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.started_at = None
+
+    def add(self, name: str, fn: Callable[[], Any]):
+        """注册预热步骤（start 之前调用）"""
+        self._steps[name] = fn
+        self._state[name] = {"state": PENDING}
+
+    def _run(self, name: str, fn: Callable[[], Any]):
+        started = time.perf_counter()
+        self._set(name, state=RUNNING)
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            self._set(name, state=FAILED, error=str(e), duration_ms=round((time.perf_counter() - started) * 1000))
+            return
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        self._set(name, state=DONE, duration_ms=duration_ms)
+        logger.info("Warm-up step %s done in %dms", name, duration_ms)
+
+    def _set(self, name: str, **fields):
+        with self._lock:
+            self._state[name] = fields
+
+    def start(self, enabled: bool = True):
+        """
+        启动后台预热（重复调用无副作用）
+
+        Args:
+            enabled: False 时所有步骤标记为跳过，首次使用时再初始化
+        """
+        with self._lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.time()
+        for name, fn in self._steps.items():
+            if not enabled:
+                self._set(name, state=SKIPPED)
+                continue
+            threading.Thread(target=self._run, args=(name, fn), name=f"warmup-{name}", daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        预热进度
+
+        Returns:
+            ready（所有步骤完成或跳过，且没有失败）、各步骤状态与耗时
+        """
+        with self._lock:
+            steps = {name: dict(state) for name, state in self._state.items()}
+        return {
+            "ready": self.started_at is not None and all(s["state"] in (DONE, SKIPPED) for s in steps.values()),
+            "started_at": self.started_at,
+            "steps": steps,
+        }
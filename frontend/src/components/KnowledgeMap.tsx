@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react'
+import { useCallback, useEffect, useRef, useState } from 'react'
 import CytoscapeComponent_ from 'react-cytoscapejs'
 const CytoscapeComponent = CytoscapeComponent_ as any
 import api from '../api/client'
@@ -11,6 +11,8 @@ interface Node {
   id: string
   label: string
   type: string
+  child_count: number
+  truncated: boolean
 }
 
 interface Edge {
@@ -19,6 +21,18 @@ interface Edge {
   label?: string
 }
 
+interface NodePage {
+  nodes: Node[]
+  edges: Edge[]
+  total: number
+  next_cursor: string | null
+}
+
+interface NodeDetail extends Node {
+  parent: string | null
+  data: Record<string, unknown>
+}
+
 interface CyElement {
   data: {
     id: string
@@ -29,42 +43,56 @@ interface CyElement {
   }
 }
 
+// 根节点（章节）在 cursors 中的键
+const ROOT = ''
+
 export default function KnowledgeMap({ documentId }: KnowledgeMapProps) {
   const [elements, setElements] = useState<CyElement[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
-  const [selectedNode, setSelectedNode] = useState<Node | null>(null)
+  const [selectedNode, setSelectedNode] = useState<NodeDetail | null>(null)
+  // 已展开的节点 -> 下一页游标（null 表示已全部加载）
+  const [cursors, setCursors] = useState<Record<string, string | null>>({})
+  const cyRef = useRef<any>(null)
+  const tapRef = useRef<(id: string) => void>(() => {})
+
+  // 按需加载：先只加载章节，点击节点时再加载其子节点
+  const loadChildren = useCallback(async (parent: string, cursor?: string | null) => {
+    const response = await api.get<NodePage>('/knowledge/map/nodes', {
+      params: { document_id: documentId, parent: parent || undefined, cursor: cursor || undefined },
+    })
+    const { nodes, edges, next_cursor } = response.data
+
+    setElements(prev => {
+      const known = new Set(prev.map(el => el.data.id))
+      const added: CyElement[] = [
+        ...nodes.map(node => ({ data: { id: node.id, label: node.label, type: node.type } })),
+        ...edges.map(edge => ({
+          data: {
+            id: `${edge.source}-${edge.target}`,
+            source: edge.source,
+            target: edge.target,
+            label: edge.label,
+          },
+        })),
+      ].filter(el => !known.has(el.data.id))
+      return [...prev, ...added]
+    })
+    setCursors(prev => ({ ...prev, [parent]: next_cursor }))
+  }, [documentId])
 
   useEffect(() => {
     const fetchKnowledgeMap = async () => {
       try {
         setLoading(true)
-        const response = await api.get(`/knowledge/map?document_id=${documentId}`)
-        const { nodes, edges } = response.data
-
-        // Convert to Cytoscape format
-        const cyElements: CyElement[] = [
-          ...nodes.map((node: Node) => ({
-            data: {
-              id: node.id,
-              label: node.label,
-              type: node.type,
-            },
-          })),
-          ...edges.map((edge: Edge) => ({
-            data: {
-              id: `${edge.source}-${edge.target}`,
-              source: edge.source,
-              target: edge.target,
-              label: edge.label,
-            },
-          })),
-        ]
-
-        setElements(cyElements)
-      } catch (err) {
+        setError(null)
+        setElements([])
+        setCursors({})
+        setSelectedNode(null)
+        await loadChildren(ROOT)
+      } catch (err: any) {
         console.error('Failed to fetch knowledge map:', err)
-        setError('加载知识地图失败')
+        setError(err.response?.status === 404 ? '尚未提取知识点' : '加载知识地图失败')
       } finally {
         setLoading(false)
       }
@@ -73,7 +101,22 @@ export default function KnowledgeMap({ documentId }: KnowledgeMapProps) {
     if (documentId) {
       fetchKnowledgeMap()
     }
-  }, [documentId])
+  }, [documentId, loadChildren])
+
+  const handleNodeTap = async (id: string) => {
+    try {
+      const response = await api.get<NodeDetail>(`/knowledge/map/nodes/${encodeURIComponent(id)}`, {
+        params: { document_id: documentId },
+      })
+      setSelectedNode(response.data)
+      if (response.data.child_count > 0 && !(id in cursors)) {
+        await loadChildren(id)
+      }
+    } catch (err) {
+      console.error('Failed to fetch knowledge node:', err)
+    }
+  }
+  tapRef.current = handleNodeTap
 
   const stylesheet = [
     {
@@ -153,7 +196,17 @@ export default function KnowledgeMap({ documentId }: KnowledgeMapProps) {
     <div className="flex gap-4">
       {/* Knowledge Map */}
       <div className="flex-1 bg-white rounded-lg shadow-sm border p-4">
-        <h2 className="text-lg font-semibold mb-4">知识地图</h2>
+        <div className="flex items-center justify-between mb-4">
+          <h2 className="text-lg font-semibold">知识地图</h2>
+          {cursors[ROOT] && (
+            <button
+              onClick={() => loadChildren(ROOT, cursors[ROOT])}
+              className="text-sm text-blue-600 hover:text-blue-800"
+            >
+              加载更多章节
+            </button>
+          )}
+        </div>
         <div className="h-[600px]">
           <CytoscapeComponent
             elements={elements as any}
@@ -161,14 +214,10 @@ export default function KnowledgeMap({ documentId }: KnowledgeMapProps) {
             layout={layout}
             style={{ width: '100%', height: '100%' }}
             cy={(cy: any) => {
-              cy.on('tap', 'node', (evt: any) => {
-                const node = evt.target
-                setSelectedNode({
-                  id: node.id(),
-                  label: node.data('label'),
-                  type: node.data('type'),
-                })
-              })
+              // 每次渲染都会调用：只注册一次事件
+              if (cyRef.current === cy) return
+              cyRef.current = cy
+              cy.on('tap', 'node', (evt: any) => tapRef.current(evt.target.id()))
             }}
           />
         </div>
@@ -180,8 +229,22 @@ export default function KnowledgeMap({ documentId }: KnowledgeMapProps) {
           <h3 className="font-semibold mb-2">节点信息</h3>
           <div className="space-y-2">
             <p><span className="font-medium">类型：</span>{selectedNode.type}</p>
-            <p><span className="font-medium">名称：</span>{selectedNode.label}</p>
+            <p className="break-words"><span className="font-medium">名称：</span>{selectedNode.label}</p>
+            {typeof selectedNode.data.content === 'string' && selectedNode.data.content && (
+              <p className="break-words text-sm text-gray-600">{selectedNode.data.content}</p>
+            )}
+            {selectedNode.child_count > 0 && (
+              <p className="text-sm text-gray-500">子节点：{selectedNode.child_count}</p>
+            )}
           </div>
+          {cursors[selectedNode.id] && (
+            <button
+              onClick={() => loadChildren(selectedNode.id, cursors[selectedNode.id])}
+              className="mt-4 mr-4 text-sm text-blue-600 hover:text-blue-800"
+            >
+              加载更多
+            </button>
+          )}
           <button
             onClick={() => setSelectedNode(null)}
             className="mt-4 text-sm text-gray-500 hover:text-gray-700"
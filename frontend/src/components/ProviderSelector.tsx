@@ -43,7 +43,8 @@ export default function ProviderSelector({ onProviderChange }: ProviderSelectorP
 
   const providerLabels: Record<string, string> = {
     deepseek: 'DeepSeek',
-    minimax: 'MiniMax'
+    minimax: 'MiniMax',
+    both: '自动路由'
   }
 
   return (